@@ -0,0 +1,135 @@
+"""
+Result cache - Cache kết quả đọc, đồng bộ giữa nhiều worker
+
+Mỗi process (worker uvicorn/gunicorn) giữ cache riêng trong bộ nhớ. Để cache
+không bị cũ khi worker khác ghi, mỗi lần đọc cache ta hỏi SQLite
+`PRAGMA data_version` trên một kết nối riêng của cache: giá trị này thay đổi
+mỗi khi một kết nối KHÁC (cùng hay khác process) commit vào file database.
+Khi giá trị đổi, toàn bộ cache bị xóa. Chi phí kiểm tra là một PRAGMA đọc
+header trong bộ nhớ dùng chung, không quét bảng nào.
+
+Mọi đường ghi trong app đều đi qua pool của SQLAlchemy (không dùng kết nối của
+cache), nên cả ghi trong cùng process cũng làm đổi data_version.
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from app.core import config
+from app.core.database import DATABASE_PATH
+
+
+class DataVersionWatcher:
+    """
+    Đọc `PRAGMA data_version` của một file SQLite
+
+    Args:
+        database_path: File database cần theo dõi
+    """
+
+    def __init__(self, database_path: str):
+        self._database_path = database_path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        """Giá trị data_version hiện tại (đổi khi kết nối khác commit)"""
+        with self._lock:
+            if self._connection is None:
+                self._connection = sqlite3.connect(
+                    self._database_path,
+                    timeout=config.SQLITE_BUSY_TIMEOUT,
+                    check_same_thread=False,
+                    isolation_level=None,
+                )
+            return self._connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class ResultCache:
+    """
+    Cache LRU, bị xóa toàn bộ khi database thay đổi
+
+    Args:
+        watcher: Nguồn data_version (None: không cache, luôn tính lại)
+        max_entries: Số kết quả tối đa giữ trong cache
+    """
+
+    def __init__(self, watcher: Optional[DataVersionWatcher], max_entries: int = 256):
+        self._watcher = watcher
+        self._max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._watcher is not None
+
+    def _sync_version(self) -> None:
+        """Xóa cache nếu database đã thay đổi kể từ lần kiểm tra trước"""
+        version = self._watcher.current()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def get_or_set(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Lấy kết quả từ cache, hoặc tính và lưu lại
+
+        Kết quả trả về được dùng chung giữa các request: người gọi không được
+        sửa nó. Exception từ compute() không được cache.
+
+        Args:
+            key: Khóa (phải gồm mọi tham số ảnh hưởng đến kết quả)
+            compute: Hàm tính kết quả khi cache không có
+
+        Returns:
+            Kết quả
+        """
+        if not self.enabled:
+            return compute()
+
+        self._sync_version()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            version = self._version
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            # Database đổi trong lúc tính: không lưu kết quả có thể đã cũ
+            if self._version == version:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+
+def _create_result_cache() -> ResultCache:
+    """Cache chỉ bật trên SQLite dạng file (data_version là PRAGMA của SQLite)"""
+    if not config.RESULT_CACHE_ENABLED or DATABASE_PATH is None:
+        return ResultCache(None)
+    return ResultCache(DataVersionWatcher(DATABASE_PATH), max_entries=config.RESULT_CACHE_MAX_ENTRIES)
+
+
+result_cache = _create_result_cache()
@@ -0,0 +1,53 @@
+"""
+Clock - Ngày "hôm nay" của nghiệp vụ (cộng dồn lãi, trạng thái kỳ, nợ phải thu)
+
+Mọi code tính theo lịch thanh toán lấy ngày hiện tại qua today() thay vì gọi
+date.today() trực tiếp, nên có thể cố định ngày:
+- Cả tiến trình: biến môi trường CLOCK_TODAY=YYYY-MM-DD (môi trường thử)
+- Một đoạn code: with frozen_today(date(...)): ... (script, chạy bù)
+
+Ngày cố định bằng frozen_today nằm trong một ContextVar nên đi theo thao tác
+ghi sang writer thread (xem app.core.writer) và không ảnh hưởng request khác.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date
+from typing import Iterator, Optional
+
+from app.core import config
+
+
+_frozen: ContextVar[Optional[date]] = ContextVar("clock_today", default=None)
+
+
+def _configured_today() -> Optional[date]:
+    return date.fromisoformat(config.CLOCK_TODAY) if config.CLOCK_TODAY else None
+
+
+def today() -> date:
+    """
+    Ngày hiện tại của nghiệp vụ
+
+    Returns:
+        Ngày đặt bởi frozen_today, nếu không thì CLOCK_TODAY, nếu không thì
+        ngày hệ thống
+    """
+    return _frozen.get() or _configured_today() or date.today()
+
+
+@contextmanager
+def frozen_today(value: date) -> Iterator[date]:
+    """
+    Cố định today() trong một đoạn code
+
+    Args:
+        value: Ngày dùng làm hôm nay
+
+    Yields:
+        value
+    """
+    token = _frozen.set(value)
+    try:
+        yield value
+    finally:
+        _frozen.reset(token)
@@ -0,0 +1,87 @@
+"""
+Application settings
+
+Các giá trị cấu hình được đọc từ biến môi trường, có giá trị mặc định
+phù hợp cho chạy local.
+"""
+import os
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean environment variable (1/0, true/false, yes/no, on/off)"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer environment variable"""
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float environment variable"""
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+# Database
+# Mặc định: SQLite credit_app.sqlite3 ở thư mục gốc. Database server chạy được API
+# nhưng tắt các tính năng chỉ có trên SQLite (xem database.SQLITE_ONLY_FEATURES)
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)  # Số kết nối giữ trong pool
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)  # Số kết nối mở thêm khi pool hết
+DB_POOL_TIMEOUT = _env_float("DB_POOL_TIMEOUT", 30.0)  # Giây chờ lấy kết nối từ pool
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)  # Giây trước khi mở lại kết nối (-1: không giới hạn)
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)  # Kiểm tra kết nối trước khi dùng (database server)
+DB_ECHO = _env_bool("DB_ECHO", False)  # In câu SQL ra console
+
+# SQLite
+SQLITE_BUSY_TIMEOUT = _env_float("SQLITE_BUSY_TIMEOUT", 30.0)  # Giây chờ khi database đang bị khóa
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")  # WAL: đọc không chặn ghi
+
+# Single-writer queue (group commit)
+WRITE_QUEUE_ENABLED = _env_bool("WRITE_QUEUE_ENABLED", True)
+WRITE_QUEUE_MAX_BATCH = _env_int("WRITE_QUEUE_MAX_BATCH", 64)  # Số thao tác ghi tối đa mỗi transaction
+WRITE_QUEUE_MAX_WAIT_MS = _env_float("WRITE_QUEUE_MAX_WAIT_MS", 1.0)  # Thời gian gom thêm thao tác ghi
+
+# Tạo lịch sử trả lãi ở nền khi tạo hợp đồng (async_schedule=true)
+SCHEDULE_WORKER_ENABLED = _env_bool("SCHEDULE_WORKER_ENABLED", True)
+SCHEDULE_WORKER_POLL_SECONDS = _env_float("SCHEDULE_WORKER_POLL_SECONDS", 5.0)  # Giây giữa hai lần quét job đang chờ
+SCHEDULE_WORKER_BATCH_SIZE = _env_int("SCHEDULE_WORKER_BATCH_SIZE", 20)  # Số job mỗi lần quét
+SCHEDULE_JOB_MAX_ATTEMPTS = _env_int("SCHEDULE_JOB_MAX_ATTEMPTS", 3)  # Số lần thử trước khi đánh dấu lỗi
+
+# Idempotency-Key (thanh toán / tất toán gửi lại)
+IDEMPOTENCY_TTL_HOURS = _env_float("IDEMPOTENCY_TTL_HOURS", 24.0)  # Giờ giữ kết quả trước khi khóa được dùng lại
+
+# Clock
+CLOCK_TODAY = os.getenv("CLOCK_TODAY", "")  # Cố định ngày hôm nay (YYYY-MM-DD, môi trường thử); rỗng: ngày hệ thống
+
+# Responses
+FAST_RESPONSES = _env_bool("FAST_RESPONSES", True)  # Trả thẳng JSON (orjson) cho response danh sách, bỏ validate lại
+
+# Lưu trữ hợp đồng đã tất toán (python manage.py archive)
+ARCHIVE_AFTER_DAYS = _env_int("ARCHIVE_AFTER_DAYS", 180)  # Số ngày sau kỳ cuối cùng trước khi lưu trữ
+ARCHIVE_BATCH_SIZE = _env_int("ARCHIVE_BATCH_SIZE", 200)  # Số hợp đồng mỗi transaction
+
+# Analytics replica (snapshot bằng SQLite online backup API)
+ANALYTICS_REPLICA_ENABLED = _env_bool("ANALYTICS_REPLICA_ENABLED", False)
+ANALYTICS_REPLICA_PATH = os.getenv("ANALYTICS_REPLICA_PATH", "")  # Mặc định: <database>.replica.sqlite3
+ANALYTICS_REPLICA_INTERVAL = _env_float("ANALYTICS_REPLICA_INTERVAL", 60.0)  # Giây giữa hai lần snapshot
+ANALYTICS_REPLICA_MAX_STALENESS = _env_float("ANALYTICS_REPLICA_MAX_STALENESS", 600.0)  # Cũ hơn thì đọc database chính
+
+# Result cache (dashboard, danh sách hợp đồng) - đồng bộ qua PRAGMA data_version
+RESULT_CACHE_ENABLED = _env_bool("RESULT_CACHE_ENABLED", True)
+RESULT_CACHE_MAX_ENTRIES = _env_int("RESULT_CACHE_MAX_ENTRIES", 256)
+
+# Slow-query log (JSON lines, xoay vòng theo dung lượng)
+SLOW_QUERY_LOG_ENABLED = _env_bool("SLOW_QUERY_LOG_ENABLED", True)
+SLOW_QUERY_MS = _env_float("SLOW_QUERY_MS", 200.0)  # Ngưỡng ghi log (mili giây)
+SLOW_QUERY_LOG_PATH = os.getenv(
+    "SLOW_QUERY_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "logs", "slow_queries.log"),
+)
+SLOW_QUERY_LOG_MAX_BYTES = _env_int("SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024)
+SLOW_QUERY_LOG_BACKUPS = _env_int("SLOW_QUERY_LOG_BACKUPS", 5)
@@ -42,10 +42,79 @@ class TimePeriod(str, Enum):
         """Trả về danh sách tất cả các giá trị"""
         return [period.value for period in cls]
 
+class HistoryMode(str, Enum):
+    """Mức nhúng lịch sử trả lãi trong response hợp đồng"""
+    NONE = "none"        # Không trả lịch sử
+    SUMMARY = "summary"  # Chỉ trả tóm tắt (số kỳ, tổng tiền, ...)
+    LAST_N = "last_n"    # N kỳ gần nhất
+    ALL = "all"          # Toàn bộ lịch sử
+
+    @classmethod
+    def list_values(cls):
+        """Trả về danh sách tất cả các giá trị"""
+        return [mode.value for mode in cls]
+
+
+class AgingBucket(str, Enum):
+    """Nhóm tuổi nợ quá hạn (số ngày quá hạn tính đến ngày báo cáo)"""
+    D1_30 = "1-30"
+    D31_60 = "31-60"
+    D61_90 = "61-90"
+    D90_PLUS = "90+"
+
+    @classmethod
+    def list_values(cls):
+        """Trả về danh sách tất cả các giá trị"""
+        return [bucket.value for bucket in cls]
+
+
+class ForecastGroupBy(str, Enum):
+    """Cách gom kết quả dự báo số tiền đến hạn"""
+    DAY = "day"
+    WEEK = "week"      # Tuần bắt đầu từ thứ Hai
+    MONTH = "month"
+
+    @classmethod
+    def list_values(cls):
+        """Trả về danh sách tất cả các giá trị"""
+        return [group_by.value for group_by in cls]
+
+
+class NguonThanhToan(str, Enum):
+    """Đường ghi nhận một khoản thu (cột Nguon của payment_ledger)"""
+    PAY = "pay"                # Thanh toán một kỳ
+    PAY_BATCH = "pay_batch"    # Thanh toán hàng loạt
+    TAT_TOAN = "tat_toan"      # Tất toán: điền đủ các kỳ còn lại
+    TRA_GOC = "tra_goc"        # Trả gốc Tín chấp (không gắn kỳ nào)
+    DIEU_CHINH = "dieu_chinh"  # Sửa TienDaTra trực tiếp (phần chênh lệch)
+    SO_DU_DAU = "so_du_dau"    # Số đã trả có sẵn khi tạo sổ (database cũ)
+
+    @classmethod
+    def list_values(cls):
+        """Trả về danh sách tất cả các giá trị"""
+        return [nguon.value for nguon in cls]
+
+
+class TrangThaiTaoLichSu(str, Enum):
+    """Trạng thái job tạo lịch sử trả lãi ở nền (bảng schedule_job)"""
+    CHO = "pending"    # Chờ worker tạo (hoặc chờ thử lại sau lỗi)
+    XONG = "ready"     # Lịch sử đã được tạo
+    LOI = "failed"     # Hết số lần thử, xem cột Loi
+
+    @classmethod
+    def list_values(cls):
+        """Trả về danh sách tất cả các giá trị"""
+        return [trang_thai.value for trang_thai in cls]
+
 # Export all enums
 __all__ = [
     "TrangThaiThanhToan", 
     "TrangThaiNgayThanhToan",
     "TimePeriod",
+    "HistoryMode",
+    "AgingBucket",
+    "ForecastGroupBy",
+    "NguonThanhToan",
+    "TrangThaiTaoLichSu",
 ]
 
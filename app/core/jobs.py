@@ -0,0 +1,72 @@
+"""
+Background job worker - một thread nền xử lý job lưu trong database
+
+Worker không giữ job trong bộ nhớ: mỗi vòng gọi hàm `process` để lấy và xử lý
+các job đang chờ trong bảng job, nên job không mất khi process khởi động lại.
+Sau khi thêm job, gọi notify() để worker chạy ngay thay vì chờ tới lần quét
+định kỳ tiếp theo.
+"""
+import logging
+import threading
+from typing import Callable, Optional
+
+
+logger = logging.getLogger("api_app_credit.jobs")
+
+
+class JobWorker:
+    """
+    Thread nền xử lý job theo từng lô
+
+    Args:
+        name: Tên thread
+        process: Hàm xử lý một lô job đang chờ, trả về True nếu có thể còn job
+            (lô đầy) để chạy tiếp ngay
+        poll_interval: Giây giữa hai lần quét khi không được notify()
+    """
+
+    def __init__(self, name: str, process: Callable[[], bool], poll_interval: float = 5.0):
+        self._name = name
+        self._process = process
+        self._poll_interval = max(0.01, poll_interval)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Khởi động thread nền (xử lý luôn các job còn chờ từ lần chạy trước)"""
+        if self.is_running:
+            return
+        self._stopping.clear()
+        self._wake.set()
+        self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """Dừng thread nền sau lô đang xử lý; job chưa xử lý vẫn nằm trong database"""
+        if not self.is_running:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def notify(self) -> None:
+        """Báo có job mới"""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self._poll_interval)
+            self._wake.clear()
+            if self._stopping.is_set():
+                return
+            try:
+                while self._process() and not self._stopping.is_set():
+                    pass
+            except Exception:
+                logger.exception("Job worker %s failed", self._name)
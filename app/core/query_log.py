@@ -0,0 +1,181 @@
+"""
+Slow-query log - Ghi lại các câu SQL chạy lâu hơn ngưỡng
+
+Mỗi câu SQL chậm được ghi thành một dòng JSON (file xoay vòng theo dung
+lượng) gồm:
+- statement: câu SQL (không có giá trị tham số)
+- params: kiểu của từng tham số (không ghi giá trị: tránh lộ dữ liệu khách hàng)
+- duration_ms, rows (số dòng trả về / bị ảnh hưởng)
+- call_site: hàm app.crud.* (hoặc app.services.*) đã phát ra câu SQL
+- route: route HTTP đang xử lý (xem app.core.request_context)
+
+Thời gian được đo bằng event before/after_cursor_execute của engine. Với
+truy vấn ORM, số dòng trả về chỉ biết được sau khi đọc hết kết quả, nên
+entry của câu SQL chậm được giữ lại tới khi hook do_orm_execute đếm xong
+(kết quả được freeze rồi trả lại nguyên vẹn). Câu SQL nhanh không bị đụng tới.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from app.core import config
+from app.core.request_context import current_route
+
+
+logger = logging.getLogger("api_app_credit.slow_query")
+
+# Module được coi là "nơi gọi" của câu SQL (theo thứ tự ưu tiên khi dò stack)
+_CALL_SITE_PREFIXES = ("app.crud.", "app.services.", "app.utils.", "app.routers.")
+
+# Entry đang chờ đếm số dòng (đặt khi đang trong một lần thực thi ORM)
+_pending: ContextVar[Optional[list]] = ContextVar("slow_query_pending", default=None)
+
+_START_KEY = "slow_query_start"
+
+
+def _param_shape(value) -> str:
+    return type(value).__name__
+
+
+def parameter_shapes(parameters, executemany: bool = False):
+    """
+    Kiểu của các tham số, không có giá trị
+
+    Args:
+        parameters: Tham số DBAPI (tuple, list hoặc dict)
+        executemany: True nếu parameters là danh sách các bộ tham số
+
+    Returns:
+        list / dict tên kiểu; với executemany: {"count": n, "first": ...}
+    """
+    if executemany:
+        rows = list(parameters or ())
+        return {"count": len(rows), "first": parameter_shapes(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: _param_shape(value) for key, value in parameters.items()}
+    return [_param_shape(value) for value in (parameters or ())]
+
+
+def find_call_site() -> Optional[str]:
+    """
+    Hàm của app đã phát ra câu SQL hiện tại, vd. "app.crud.tin_chap.get_tin_chaps:241"
+
+    Dò stack từ trong ra ngoài, lấy frame đầu tiên thuộc app.crud (ưu tiên),
+    rồi app.services, app.utils, app.routers.
+    """
+    frame = sys._getframe(1)
+    found = {}
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        for prefix in _CALL_SITE_PREFIXES:
+            if module.startswith(prefix) and prefix not in found:
+                found[prefix] = f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    for prefix in _CALL_SITE_PREFIXES:
+        if prefix in found:
+            return found[prefix]
+    return None
+
+
+def _emit(entry: dict) -> None:
+    logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info[_START_KEY].pop()
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms < config.SLOW_QUERY_MS:
+        return
+
+    entry = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "duration_ms": round(duration_ms, 3),
+        "statement": " ".join(statement.split()),
+        "params": parameter_shapes(parameters, executemany),
+        # Câu SQL trả về dòng (SELECT, RETURNING): rowcount chưa có ý nghĩa trước khi đọc
+        "rows": cursor.rowcount if cursor.description is None and cursor.rowcount >= 0 else None,
+        "call_site": find_call_site(),
+        "route": current_route(),
+    }
+    pending = _pending.get()
+    if pending is not None and cursor.description is not None:
+        # Truy vấn ORM trả về dòng: chờ do_orm_execute đếm số dòng
+        pending.append(entry)
+    else:
+        _emit(entry)
+
+
+def _handle_error(exception_context):
+    # Câu SQL lỗi không có after_cursor_execute: bỏ mốc thời gian của nó
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(_START_KEY):
+        connection.info[_START_KEY].pop()
+
+
+def _count_orm_rows(orm_execute_state: ORMExecuteState):
+    """Đếm số dòng trả về của truy vấn ORM chậm, rồi ghi log"""
+    if not orm_execute_state.is_select or orm_execute_state.execution_options.get("yield_per"):
+        # Kết quả dạng stream: không freeze (sẽ đọc hết vào bộ nhớ)
+        return None
+    pending: list = []
+    token = _pending.set(pending)
+    try:
+        result = orm_execute_state.invoke_statement()
+    finally:
+        _pending.reset(token)
+    if not pending:
+        return result
+
+    frozen = result.freeze()
+    for entry in pending:
+        entry["rows"] = len(frozen.data)
+        _emit(entry)
+    return frozen()
+
+
+def _configure_logger() -> None:
+    if logger.handlers:
+        return
+    directory = os.path.dirname(config.SLOW_QUERY_LOG_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = RotatingFileHandler(
+        config.SLOW_QUERY_LOG_PATH,
+        maxBytes=config.SLOW_QUERY_LOG_MAX_BYTES,
+        backupCount=config.SLOW_QUERY_LOG_BACKUPS,
+        encoding="utf-8",
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.WARNING)
+    logger.propagate = False
+
+
+def install_slow_query_log(target_engine: Engine) -> None:
+    """
+    Bật log truy vấn chậm cho engine (gọi lại nhiều lần không sao)
+
+    Args:
+        target_engine: Engine cần theo dõi
+    """
+    _configure_logger()
+    if not event.contains(target_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(target_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(target_engine, "handle_error", _handle_error)
+    if not event.contains(Session, "do_orm_execute", _count_orm_rows):
+        event.listen(Session, "do_orm_execute", _count_orm_rows)
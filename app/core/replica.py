@@ -0,0 +1,206 @@
+"""
+Analytics replica - bản sao chỉ đọc cho các API báo cáo
+
+Một thread nền (Snapshotter) định kỳ chép database chính sang file replica
+bằng SQLite online backup API, một lần trong một transaction đọc: ở chế độ
+WAL transaction đọc không chặn writer, và bản sao là đúng snapshot của
+transaction đó. (Backup nhiều bước bị SQLite chép lại từ đầu mỗi khi kết nối
+khác commit, nên khi thanh toán ghi liên tục có thể không bao giờ xong.) Bản
+sao được ghi ra file tạm rồi os.replace() sang file replica (thay file nguyên
+tử, người đọc không thấy file dở dang).
+
+Thời điểm dữ liệu (as-of) là lúc transaction đọc bắt đầu, được lưu làm mtime
+của file replica, nên mọi process (nhiều worker uvicorn) đều đọc được độ cũ
+của replica.
+
+Các API báo cáo dùng get_analytics_db(): đọc từ replica khi replica đủ mới,
+nếu không thì đọc database chính. Response có header X-Data-Source,
+X-Data-As-Of và X-Data-Staleness.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import Response
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app.core import config
+from app.core.database import DATABASE_PATH, SessionLocal
+
+
+logger = logging.getLogger("api_app_credit.replica")
+
+
+def default_replica_path(database_path: str) -> str:
+    """credit_app.sqlite3 -> credit_app.replica.sqlite3"""
+    root, ext = os.path.splitext(database_path)
+    return f"{root}.replica{ext or '.sqlite3'}"
+
+
+# Replica chỉ dùng được khi database chính là file SQLite
+REPLICA_ENABLED = config.ANALYTICS_REPLICA_ENABLED and DATABASE_PATH is not None
+REPLICA_PATH = config.ANALYTICS_REPLICA_PATH or (default_replica_path(DATABASE_PATH) if DATABASE_PATH else "")
+
+
+def snapshot_database(source_path: str, replica_path: str) -> float:
+    """
+    Chép database sang file replica bằng online backup API
+
+    Bản sao được chép một lần trong một transaction đọc trên database chính.
+    Ở chế độ WAL writer vẫn ghi được trong lúc chép; với rollback journal
+    (SQLITE_JOURNAL_MODE khác WAL) writer phải chờ tới khi chép xong.
+
+    Args:
+        source_path: File database chính
+        replica_path: File replica
+
+    Returns:
+        Thời điểm dữ liệu của bản sao (epoch seconds): lúc transaction đọc bắt đầu
+    """
+    tmp_path = f"{replica_path}.{os.getpid()}.tmp"
+    source = sqlite3.connect(source_path, timeout=config.SQLITE_BUSY_TIMEOUT, isolation_level=None)
+    target = sqlite3.connect(tmp_path)
+    try:
+        # Câu đọc đầu tiên cố định snapshot; backup trên cùng kết nối chép đúng snapshot đó
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        as_of = time.time()
+        source.backup(target, pages=-1)
+        source.execute("COMMIT")
+        # Bản sao ở chế độ rollback journal: mở read-only không cần file -wal/-shm
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+
+    os.utime(tmp_path, (as_of, as_of))
+    os.replace(tmp_path, replica_path)
+    return as_of
+
+
+def replica_as_of(replica_path: str = REPLICA_PATH) -> Optional[float]:
+    """Thời điểm dữ liệu của replica (epoch seconds), None nếu chưa có replica"""
+    try:
+        return os.path.getmtime(replica_path)
+    except OSError:
+        return None
+
+
+class Snapshotter:
+    """
+    Thread nền làm mới replica theo chu kỳ
+
+    Args:
+        source_path: File database chính
+        replica_path: File replica
+        interval: Giây giữa hai lần snapshot
+    """
+
+    def __init__(self, source_path: str, replica_path: str, interval: float = 60.0):
+        self._source_path = source_path
+        self._replica_path = replica_path
+        self._interval = max(1.0, interval)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Khởi động thread snapshot"""
+        if self.is_running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="replica-snapshotter", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """Dừng thread snapshot (snapshot đang chạy được làm xong)"""
+        if not self.is_running:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def snapshot(self) -> float:
+        """Làm mới replica ngay"""
+        started = time.monotonic()
+        as_of = snapshot_database(self._source_path, self._replica_path)
+        logger.info("Analytics replica refreshed in %.2fs", time.monotonic() - started)
+        return as_of
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.snapshot()
+            except Exception:
+                logger.exception("Analytics replica snapshot failed")
+            self._stop.wait(self._interval)
+
+
+snapshotter = Snapshotter(
+    DATABASE_PATH,
+    REPLICA_PATH,
+    interval=config.ANALYTICS_REPLICA_INTERVAL,
+)
+
+
+def create_replica_engine(replica_path: str = REPLICA_PATH) -> Engine:
+    """
+    Engine chỉ đọc cho file replica
+
+    NullPool: mỗi session mở kết nối mới, nên luôn đọc file replica mới nhất
+    sau khi snapshotter thay file. immutable=1: file không bao giờ bị sửa tại
+    chỗ nên SQLite không cần khóa.
+    """
+    return create_engine(
+        f"sqlite:///file:{replica_path}?mode=ro&immutable=1&uri=true",
+        poolclass=NullPool,
+    )
+
+
+replica_engine = create_replica_engine()
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+
+def _format_as_of(as_of: float) -> str:
+    return datetime.fromtimestamp(as_of, tz=timezone.utc).isoformat(timespec="seconds")
+
+
+def get_analytics_db(response: Response):
+    """
+    Session cho các API báo cáo
+
+    Dùng replica khi đã bật ANALYTICS_REPLICA_ENABLED (database chính là
+    SQLite) và replica không cũ hơn ANALYTICS_REPLICA_MAX_STALENESS; nếu
+    không thì dùng database chính.
+
+    Yields:
+        Session: Database session
+    """
+    as_of = replica_as_of() if REPLICA_ENABLED else None
+    now = time.time()
+    use_replica = as_of is not None and now - as_of <= config.ANALYTICS_REPLICA_MAX_STALENESS
+
+    if use_replica:
+        db = ReplicaSessionLocal()
+        response.headers["X-Data-Source"] = "replica"
+        response.headers["X-Data-As-Of"] = _format_as_of(as_of)
+        response.headers["X-Data-Staleness"] = f"{max(0.0, now - as_of):.1f}"
+    else:
+        db = SessionLocal()
+        response.headers["X-Data-Source"] = "primary"
+        response.headers["X-Data-As-Of"] = _format_as_of(now)
+        response.headers["X-Data-Staleness"] = "0.0"
+    try:
+        yield db
+    finally:
+        db.close()
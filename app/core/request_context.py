@@ -0,0 +1,47 @@
+"""
+Request context - Request HTTP đang được xử lý (dùng cho log)
+
+RequestContextMiddleware lưu scope ASGI của request vào một ContextVar, nên
+code ở tầng dưới (log truy vấn chậm...) biết mình đang chạy cho route nào mà
+không cần truyền Request qua các hàm CRUD.
+"""
+from contextvars import ContextVar
+from typing import Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+_current_scope: ContextVar[Optional[Scope]] = ContextVar("current_request_scope", default=None)
+
+
+class RequestContextMiddleware:
+    """Middleware ASGI đặt request hiện tại cho mỗi request HTTP"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
+
+
+def current_route() -> Optional[str]:
+    """
+    Route của request hiện tại, vd. "GET /tin-chap/{ma_hd}"
+
+    Returns:
+        Method + đường dẫn mẫu của route (đường dẫn thật nếu chưa/không khớp
+        route nào), hoặc None nếu không chạy trong một request
+    """
+    scope = _current_scope.get()
+    if scope is None:
+        return None
+    # Router ghi route đã khớp vào scope (cùng dict) trước khi gọi endpoint
+    path = getattr(scope.get("route"), "path", None) or scope.get("path", "")
+    return f"{scope.get('method', '')} {path}"
@@ -0,0 +1,90 @@
+"""
+Fast JSON responses
+
+FastJSONResponse dùng orjson (dependency trong pyproject.toml); môi trường
+cài thiếu orjson vẫn chạy được bằng json của thư viện chuẩn. Khi router trả
+thẳng một Response, FastAPI không validate lại dữ liệu theo response_model -
+chỉ dùng cho dữ liệu tin cậy do CRUD dựng từ database (bật/tắt bằng
+FAST_RESPONSES).
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Optional
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # cài thiếu orjson: dùng json chuẩn
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Encode các kiểu json chuẩn không hỗ trợ"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content sang JSON bytes (orjson nếu có)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialize bằng orjson (hoặc json chuẩn nếu không có orjson)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# Header của response được inject không được chép sang response trả thẳng
+_SKIP_HEADERS = {"content-length", "content-type"}
+
+
+def success_json_response(
+    data: Any,
+    message: str = "Success",
+    response: Optional[Response] = None,
+    status_code: int = 200,
+) -> FastJSONResponse:
+    """
+    Tạo response thành công (cùng cấu trúc ApiResponse) không qua Pydantic
+
+    Args:
+        data: Dữ liệu đã ở dạng dict/list (tin cậy, không validate lại)
+        message: Thông báo
+        response: Response được FastAPI inject vào endpoint; header đã đặt
+            trên đó (vd: ETag) được chép sang response trả về
+        status_code: HTTP status code
+
+    Returns:
+        FastJSONResponse
+    """
+    result = FastJSONResponse(
+        {"success": True, "data": data, "message": message, "error": None},
+        status_code=status_code,
+    )
+    if response is not None:
+        for key, value in response.headers.items():
+            if key not in _SKIP_HEADERS:
+                result.headers[key] = value
+    return result
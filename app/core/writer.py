@@ -0,0 +1,312 @@
+"""
+Single-writer queue with group commit
+
+Tất cả thao tác ghi từ API được đưa vào một hàng đợi và thực hiện bởi một
+thread ghi duy nhất. Thread này gom nhiều thao tác (micro-batch) vào cùng một
+transaction và commit một lần (group commit), nên SQLite chỉ fsync một lần cho
+cả nhóm thay vì một lần cho mỗi thanh toán, và các request không còn tranh
+khóa ghi với nhau ("database is locked").
+
+Mỗi thao tác chạy trong SAVEPOINT riêng: thao tác lỗi chỉ hủy phần của nó,
+các thao tác khác trong nhóm vẫn được commit. Future của từng thao tác chỉ
+được trả kết quả sau khi transaction đã commit xong.
+
+Hàm CRUD hiện có được dùng nguyên vẹn: trong writer, db.commit() chỉ flush
+và db.rollback() chỉ hủy SAVEPOINT của thao tác hiện tại.
+"""
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy.orm import Session, SessionTransaction, sessionmaker
+
+from app.core import config
+from app.core.database import engine
+
+
+logger = logging.getLogger("api_app_credit.writer")
+
+
+class GroupCommitSession(Session):
+    """
+    Session dùng trong writer
+
+    - commit(): chỉ flush, transaction thật được commit một lần cho cả nhóm
+    - rollback(): chỉ hủy SAVEPOINT của thao tác đang chạy
+    """
+    _intent_savepoint: Optional[SessionTransaction] = None
+
+    def commit(self) -> None:
+        self.flush()
+
+    def rollback(self) -> None:
+        savepoint = self._intent_savepoint
+        if savepoint is not None and savepoint.is_active:
+            savepoint.rollback()
+
+    def commit_group(self) -> None:
+        """Commit transaction thật của cả nhóm"""
+        Session.commit(self)
+
+    def rollback_group(self) -> None:
+        """Rollback transaction thật của cả nhóm"""
+        Session.rollback(self)
+
+
+class _WriteIntent:
+    """Một thao tác ghi đang chờ trong hàng đợi"""
+    __slots__ = ("fn", "args", "kwargs", "future", "context")
+
+    def __init__(self, fn: Callable, args: tuple, kwargs: dict):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        # Context của request gửi thao tác (route cho log truy vấn chậm...)
+        self.context = contextvars.copy_context()
+
+
+_STOP = object()
+
+
+class WriteQueue:
+    """
+    Hàng đợi ghi với một thread ghi duy nhất
+
+    Args:
+        session_factory: sessionmaker tạo GroupCommitSession (expire_on_commit=False)
+        max_batch: Số thao tác tối đa trong một transaction
+        max_wait: Thời gian (giây) chờ gom thêm thao tác sau thao tác đầu tiên
+    """
+
+    def __init__(self, session_factory: sessionmaker, max_batch: int = 64, max_wait: float = 0.001):
+        self._session_factory = session_factory
+        self._max_batch = max(1, max_batch)
+        self._max_wait = max(0.0, max_wait)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._batches = 0
+        self._intents = 0
+        self._max_batch_seen = 0
+        self._busy_seconds = 0.0
+        self._commit_seconds = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def stats(self) -> dict:
+        """
+        Thống kê các nhóm đã commit
+
+        batches/intents: số transaction và số thao tác; avg_batch/max_batch: cỡ
+        nhóm; busy_seconds: thời gian thread ghi xử lý nhóm, trong đó
+        commit_seconds là thời gian COMMIT (fsync).
+        """
+        return {
+            "batches": self._batches,
+            "intents": self._intents,
+            "avg_batch": self._intents / self._batches if self._batches else 0.0,
+            "max_batch": self._max_batch_seen,
+            "busy_seconds": self._busy_seconds,
+            "commit_seconds": self._commit_seconds,
+        }
+
+    def start(self) -> None:
+        """Khởi động thread ghi"""
+        if self.is_running:
+            return
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """Dừng thread ghi sau khi xử lý hết các thao tác đang chờ"""
+        if not self.is_running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        """
+        Đưa một thao tác ghi vào hàng đợi
+
+        Args:
+            fn: Hàm ghi, được gọi dạng fn(db, *args, **kwargs)
+
+        Returns:
+            Future nhận kết quả (hoặc exception) của fn sau khi đã commit
+        """
+        intent = _WriteIntent(fn, args, kwargs)
+        self._queue.put(intent)
+        return intent.future
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Phiên bản async của submit(): chờ kết quả mà không chặn event loop"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def apply(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        Chạy một thao tác ghi ngay trên thread hiện tại (không qua hàng đợi)
+
+        Thao tác có cùng ngữ nghĩa như trong writer: db.commit() của hàm CRUD
+        chỉ flush, cả thao tác được commit một lần trong một transaction.
+
+        Args:
+            fn: Hàm ghi, được gọi dạng fn(db, *args, **kwargs)
+
+        Returns:
+            Kết quả của fn sau khi đã commit
+        """
+        intent = _WriteIntent(fn, args, kwargs)
+        self._apply_batch([intent])
+        return intent.future.result()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            batch = [first]
+            stop_requested = False
+            deadline = time.monotonic() + self._max_wait
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop_requested = True
+                    break
+                batch.append(item)
+
+            self._apply_batch(batch)
+            if stop_requested:
+                return
+
+    def _apply_batch(self, batch: List[_WriteIntent]) -> None:
+        """Chạy một nhóm thao tác trong một transaction và commit một lần"""
+        outcomes = []
+        started = time.perf_counter()
+        session = self._session_factory()
+        try:
+            for intent in batch:
+                savepoint = session.begin_nested()
+                session._intent_savepoint = savepoint
+                try:
+                    result = intent.context.run(intent.fn, session, *intent.args, **intent.kwargs)
+                    if savepoint.is_active:
+                        session.flush()
+                        savepoint.commit()
+                    outcomes.append((intent, result, None))
+                except BaseException as exc:
+                    if savepoint.is_active:
+                        savepoint.rollback()
+                    outcomes.append((intent, None, exc))
+                finally:
+                    session._intent_savepoint = None
+
+            commit_started = time.perf_counter()
+            session.commit_group()
+            finished = time.perf_counter()
+            self._batches += 1
+            self._intents += len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._busy_seconds += finished - started
+            self._commit_seconds += finished - commit_started
+        except BaseException as exc:
+            logger.exception("Group commit failed for %d write(s)", len(batch))
+            session.rollback_group()
+            for intent in batch:
+                intent.future.set_exception(exc)
+            return
+        finally:
+            session.close()
+
+        for intent, result, exc in outcomes:
+            if exc is not None:
+                intent.future.set_exception(exc)
+            else:
+                intent.future.set_result(result)
+
+
+def create_write_queue(bind) -> WriteQueue:
+    """
+    Tạo WriteQueue cho engine đã cho (theo cấu hình trong app.core.config)
+
+    Với SQLite, transaction của writer bắt đầu bằng BEGIN IMMEDIATE để giữ
+    khóa ghi ngay từ đầu thay vì nâng cấp khóa giữa chừng.
+    """
+    if bind.dialect.name == "sqlite":
+        bind = bind.execution_options(sqlite_begin="IMMEDIATE")
+    session_factory = sessionmaker(
+        class_=GroupCommitSession,
+        bind=bind,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+    return WriteQueue(
+        session_factory,
+        max_batch=config.WRITE_QUEUE_MAX_BATCH,
+        max_wait=config.WRITE_QUEUE_MAX_WAIT_MS / 1000,
+    )
+
+
+# Writer dùng chung cho ứng dụng (khởi động trong startup event của app.main)
+write_queue = create_write_queue(engine)
+
+
+async def run_write(db: Session, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Thực hiện một thao tác ghi từ router
+
+    Đi qua write_queue khi writer đang chạy; nếu không (tắt bằng
+    WRITE_QUEUE_ENABLED=0 hoặc chưa khởi động) thì chạy trực tiếp trên
+    session của request như trước.
+
+    Args:
+        db: Session của request (dùng khi không có writer)
+        fn: Hàm CRUD dạng fn(db, *args, **kwargs)
+    """
+    if write_queue.is_running:
+        return await write_queue.run(fn, *args, **kwargs)
+    return fn(db, *args, **kwargs)
+
+
+async def run_write_atomic(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Thực hiện một thao tác ghi gồm nhiều bước phải commit cùng nhau
+
+    Giống run_write nhưng khi không có writer, fn vẫn chạy trong một
+    transaction riêng (BEGIN IMMEDIATE trên SQLite) và commit một lần, thay vì
+    để mỗi db.commit() của hàm CRUD bên trong commit riêng.
+
+    Args:
+        fn: Hàm ghi dạng fn(db, *args, **kwargs)
+    """
+    if write_queue.is_running:
+        return await write_queue.run(fn, *args, **kwargs)
+    return write_queue.apply(fn, *args, **kwargs)
+
+
+def run_write_blocking(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Thực hiện một thao tác ghi từ thread nền (không có event loop)
+
+    Đi qua write_queue khi writer đang chạy (chờ kết quả), nếu không thì chạy
+    ngay trên thread hiện tại trong một transaction riêng.
+
+    Args:
+        fn: Hàm ghi dạng fn(db, *args, **kwargs)
+    """
+    if write_queue.is_running:
+        return write_queue.submit(fn, *args, **kwargs).result()
+    return write_queue.apply(fn, *args, **kwargs)
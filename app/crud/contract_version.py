@@ -0,0 +1,44 @@
+"""
+CRUD operations for ContractVersion
+"""
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+
+from app.models.contract_version import ContractVersion, versions_are_maintained
+
+
+def get_contract_version(db: Session, ma_hd: str) -> Optional[int]:
+    """
+    Get the change version of a contract (one primary-key lookup)
+
+    Args:
+        db: Database session
+        ma_hd: Contract ID
+
+    Returns:
+        Version or None if the contract has no version yet (or versions are
+        not maintained on this database)
+    """
+    if not versions_are_maintained(db.get_bind()):
+        return None
+    row = db.query(ContractVersion.Version).filter(ContractVersion.MaHD == ma_hd).first()
+    return row[0] if row else None
+
+
+def get_contract_versions(db: Session, ma_hds: List[str]) -> Dict[str, int]:
+    """
+    Get the change versions of many contracts in one query
+
+    Args:
+        db: Database session
+        ma_hds: Contract IDs
+
+    Returns:
+        dict: MaHD -> Version (contracts without a version are omitted)
+    """
+    if not ma_hds or not versions_are_maintained(db.get_bind()):
+        return {}
+    rows = db.query(ContractVersion.MaHD, ContractVersion.Version).filter(
+        ContractVersion.MaHD.in_(ma_hds)
+    ).all()
+    return {ma_hd: version for ma_hd, version in rows}
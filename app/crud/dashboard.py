@@ -2,9 +2,9 @@
 CRUD operations for Dashboard
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
-from datetime import date, datetime
-from typing import Optional
+from sqlalchemy import case, func, select
+from datetime import date, datetime, timedelta
+from typing import List, Optional
 
 from app.models.tin_chap import TinChap
 from app.models.tra_gop import TraGop
@@ -14,9 +14,13 @@ from app.schemas.dashboard import (
     LoaiHinhVay,
     LoaiHinhVayDetail,
     TiLeLaiThu,
-    TiLeLoiNhuan
+    TiLeLoiNhuan,
+    ForecastPeriod,
+    ForecastResponse,
 )
-from app.core.enums import TimePeriod, TrangThaiThanhToan
+from app.core import clock
+from app.core.enums import ForecastGroupBy, TimePeriod, TrangThaiThanhToan
+from app.utils.forecast import TERM_COLUMNS, project_due_amounts
 
 
 def _get_date_filter(time_period: str):
@@ -29,7 +33,7 @@ def _get_date_filter(time_period: str):
     Returns:
         tuple: (start_date, end_date) or (None, None) for 'all'
     """
-    today = date.today()
+    today = clock.today()
     
     if time_period == TimePeriod.THIS_MONTH.value:
         start_date = date(today.year, today.month, 1)
@@ -62,6 +66,51 @@ def _get_date_filter(time_period: str):
     return None, None
 
 
+def _summarize_contracts(db: Session, model, start_date: Optional[date], end_date: Optional[date]) -> tuple:
+    """
+    Tổng hợp một loại hợp đồng bằng truy vấn aggregate (không load ORM object)
+
+    Args:
+        db: Database session
+        model: TinChap hoặc TraGop
+        start_date: Ngày vay từ (None: không lọc)
+        end_date: Ngày vay trước (None: không lọc)
+
+    Returns:
+        tuple: (số hợp đồng, tiền cho vay, tiền đã thu, tiền nợ cần trả, số hợp đồng còn nợ)
+    """
+    date_filter = [model.NgayVay >= start_date, model.NgayVay < end_date] if start_date and end_date else []
+
+    so_hop_dong, tien_cho_vay = db.execute(
+        select(func.count(), func.coalesce(func.sum(model.SoTienVay), 0)).where(*date_filter)
+    ).one()
+
+    # Từng hợp đồng: tổng đã trả / phải trả, có kỳ còn nợ hay không
+    per_contract = (
+        select(
+            func.sum(LichSuTraLai.TienDaTra).label("da_tra"),
+            func.sum(LichSuTraLai.SoTien).label("phai_tra"),
+            func.max(case((LichSuTraLai.SoTien > LichSuTraLai.TienDaTra, 1), else_=0)).label("con_no"),
+        )
+        .select_from(model)
+        .join(LichSuTraLai, LichSuTraLai.MaHD == model.MaHD)
+        .where(*date_filter)
+        .group_by(model.MaHD)
+        .subquery()
+    )
+    tien_da_thu, tien_no_can_tra, so_con_no = db.execute(
+        select(
+            func.coalesce(func.sum(per_contract.c.da_tra), 0),
+            func.coalesce(func.sum(case(
+                (per_contract.c.phai_tra > per_contract.c.da_tra, per_contract.c.phai_tra - per_contract.c.da_tra),
+                else_=0,
+            )), 0),
+            func.coalesce(func.sum(per_contract.c.con_no), 0),
+        )
+    ).one()
+    return so_hop_dong, tien_cho_vay, tien_da_thu, tien_no_can_tra, so_con_no
+
+
 def get_dashboard(db: Session, time_period: str = "all") -> DashboardResponse:
     """
     Get dashboard data with time period filter
@@ -76,50 +125,13 @@ def get_dashboard(db: Session, time_period: str = "all") -> DashboardResponse:
     # Get date filter
     start_date, end_date = _get_date_filter(time_period)
     
-    # Base queries for TinChap and TraGop
-    tin_chap_query = db.query(TinChap)
-    tra_gop_query = db.query(TraGop)
-    
-    # Apply date filter if needed
-    if start_date and end_date:
-        tin_chap_query = tin_chap_query.filter(
-            TinChap.NgayVay >= start_date,
-            TinChap.NgayVay < end_date
-        )
-        tra_gop_query = tra_gop_query.filter(
-            TraGop.NgayVay >= start_date,
-            TraGop.NgayVay < end_date
-        )
-    
-    # Get all contracts
-    tin_chaps = tin_chap_query.all()
-    tra_gops = tra_gop_query.all()
-    
-    # Calculate Tín Chấp statistics
-    tc_so_hop_dong = len(tin_chaps)
-    tc_tien_cho_vay = sum(tc.SoTienVay for tc in tin_chaps)
-    tc_tien_da_thu = 0
-    tc_tien_no_can_tra = 0
-    
-    for tc in tin_chaps:
-        lich_sus = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == tc.MaHD).all()
-        tien_da_tra = sum(ls.TienDaTra for ls in lich_sus)
-        tien_phai_tra = sum(ls.SoTien for ls in lich_sus)
-        tc_tien_da_thu += tien_da_tra
-        tc_tien_no_can_tra += max(0, tien_phai_tra - tien_da_tra)
-    
-    # Calculate Trả Góp statistics
-    tg_so_hop_dong = len(tra_gops)
-    tg_tien_cho_vay = sum(tg.SoTienVay for tg in tra_gops)
-    tg_tien_da_thu = 0
-    tg_tien_no_can_tra = 0
-    
-    for tg in tra_gops:
-        lich_sus = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == tg.MaHD).all()
-        tien_da_tra = sum(ls.TienDaTra for ls in lich_sus)
-        tien_phai_tra = sum(ls.SoTien for ls in lich_sus)
-        tg_tien_da_thu += tien_da_tra
-        tg_tien_no_can_tra += max(0, tien_phai_tra - tien_da_tra)
+    # Mỗi loại hợp đồng: hai câu aggregate, database chỉ trả về một dòng số
+    tc_so_hop_dong, tc_tien_cho_vay, tc_tien_da_thu, tc_tien_no_can_tra, tc_con_no = _summarize_contracts(
+        db, TinChap, start_date, end_date
+    )
+    tg_so_hop_dong, tg_tien_cho_vay, tg_tien_da_thu, tg_tien_no_can_tra, tg_con_no = _summarize_contracts(
+        db, TraGop, start_date, end_date
+    )
     
     # Calculate totals
     tong_hop_dong = tc_so_hop_dong + tg_so_hop_dong
@@ -127,16 +139,7 @@ def get_dashboard(db: Session, time_period: str = "all") -> DashboardResponse:
     tong_tien_can_thu = tc_tien_no_can_tra + tg_tien_no_can_tra
     
     # Count contracts with debt (no_phai_thu)
-    no_phai_thu_count = 0
-    for tc in tin_chaps:
-        lich_sus = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == tc.MaHD).all()
-        if any(ls.SoTien > ls.TienDaTra for ls in lich_sus):
-            no_phai_thu_count += 1
-    
-    for tg in tra_gops:
-        lich_sus = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == tg.MaHD).all()
-        if any(ls.SoTien > ls.TienDaTra for ls in lich_sus):
-            no_phai_thu_count += 1
+    no_phai_thu_count = tc_con_no + tg_con_no
     
     # Calculate ti_le_lai_thu (% đã thu / chưa thu)
     tong_phai_thu = tong_tien_da_thu + tong_tien_can_thu
@@ -193,4 +196,166 @@ def get_dashboard(db: Session, time_period: str = "all") -> DashboardResponse:
         loai_hinh_vay=loai_hinh_vay,
         ti_le_lai_thu=ti_le_lai_thu,
         ti_le_loi_nhuan=ti_le_loi_nhuan
-    )
\ No newline at end of file
+    )
+
+# Trạng thái của kỳ còn nợ (kỳ đã đóng đủ / tất toán không còn đến hạn)
+_OUTSTANDING_STATUSES = [
+    TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+    TrangThaiThanhToan.THANH_TOAN_MOT_PHAN.value,
+]
+
+# Số dòng đọc mỗi lô (yield_per)
+_STREAM_BATCH_SIZE = 1000
+
+# Mốc tổng dự kiến (số ngày đầu của khoảng dự báo)
+FORECAST_MILESTONES = (30, 60, 90)
+
+
+def _load_forecast_terms(db: Session, as_of: date) -> dict:
+    """
+    Các cột mô tả hợp đồng đang hoạt động cho app.utils.forecast (đọc tuple)
+
+    Nợ trước as_of được đọc bằng một câu GROUP BY (MaHD, Ngay) mỗi loại hợp
+    đồng (chỉ các kỳ còn nợ, đọc theo lô) và chia ngay theo quy tắc cộng dồn
+    của loại đó, nên bộ nhớ chỉ tăng theo số hợp đồng.
+    """
+    terms = {name: [] for name in TERM_COLUMNS}
+    for model in (TinChap, TraGop):
+        is_tin_chap = model is TinChap
+        columns = [model.MaHD, model.NgayVay, model.KyDong, model.KyHienTai, model.LaiSuat]
+        if not is_tin_chap:
+            columns.append(model.SoLanTra)
+        rows = db.execute(
+            select(*columns).where(
+                model.TrangThai != TrangThaiThanhToan.DA_TAT_TOAN.value,
+                model.KyDong > 0,
+            )
+        )
+        # MaHD -> (vị trí trong các cột, ngày đến hạn của kỳ KyHienTai)
+        positions = {}
+        for row in rows:
+            ky_hien_tai = row.KyHienTai or 0
+            positions[row.MaHD] = (len(terms["ngay_vay"]), row.NgayVay + timedelta(days=row.KyDong * ky_hien_tai))
+            terms["ngay_vay"].append(row.NgayVay.toordinal())
+            terms["ky_dong"].append(row.KyDong)
+            terms["ky_hien_tai"].append(ky_hien_tai)
+            # Tín Chấp: kỳ chỉ có dòng khi đã cộng dồn, mỗi kỳ mới = LaiSuat
+            # Trả Góp: SoLanTra kỳ đầu được tạo sẵn, kỳ sau đó không có tiền mới
+            terms["so_ky_co_dong"].append(0 if is_tin_chap else row.SoLanTra)
+            terms["so_tien_ky_moi"].append(row.LaiSuat if is_tin_chap else 0)
+            terms["cong_don"].append(0)
+            terms["no_cu"].append(0)
+
+        rows = db.execute(
+            select(LichSuTraLai.MaHD, LichSuTraLai.Ngay, func.sum(LichSuTraLai.SoTien - LichSuTraLai.TienDaTra))
+            .select_from(LichSuTraLai)
+            .join(model, model.MaHD == LichSuTraLai.MaHD)
+            .where(
+                LichSuTraLai.TrangThaiThanhToan.in_(_OUTSTANDING_STATUSES),
+                LichSuTraLai.Ngay < as_of,
+                LichSuTraLai.SoTien > LichSuTraLai.TienDaTra,
+                model.TrangThai != TrangThaiThanhToan.DA_TAT_TOAN.value,
+                model.KyDong > 0,
+            )
+            .group_by(LichSuTraLai.MaHD, LichSuTraLai.Ngay)
+            .execution_options(yield_per=_STREAM_BATCH_SIZE)
+        )
+        for ma_hd, ngay, so_tien in rows:
+            index, ngay_ky_hien_tai = positions[ma_hd]
+            # Tín Chấp: mỗi kỳ mới gom toàn bộ nợ. Trả Góp: kỳ trong lịch chỉ
+            # nhận nợ của kỳ ngay trước, nên chỉ chuỗi kỳ từ KyHienTai được cộng dồn
+            if is_tin_chap or ngay >= ngay_ky_hien_tai:
+                terms["cong_don"][index] += so_tien
+            else:
+                terms["no_cu"][index] += so_tien
+    return terms
+
+
+def _forecast_rows_by_day(db: Session, as_of: date, end_date: date) -> dict:
+    """
+    Số tiền còn nợ của các kỳ đã có dòng lịch sử trong khoảng, theo ngày
+
+    Returns:
+        Dict Ngay -> (số tiền còn nợ, số kỳ)
+    """
+    by_day: dict = {}
+    for model in (TinChap, TraGop):
+        rows = db.execute(
+            select(
+                LichSuTraLai.Ngay,
+                func.sum(LichSuTraLai.SoTien - LichSuTraLai.TienDaTra),
+                func.count(),
+            )
+            .select_from(LichSuTraLai)
+            .join(model, model.MaHD == LichSuTraLai.MaHD)
+            .where(
+                LichSuTraLai.TrangThaiThanhToan.in_(_OUTSTANDING_STATUSES),
+                LichSuTraLai.Ngay.between(as_of, end_date),
+                LichSuTraLai.SoTien > LichSuTraLai.TienDaTra,
+                model.TrangThai != TrangThaiThanhToan.DA_TAT_TOAN.value,
+            )
+            .group_by(LichSuTraLai.Ngay)
+        )
+        for ngay, so_tien, so_ky in rows:
+            tong_tien, tong_ky = by_day.get(ngay, (0, 0))
+            by_day[ngay] = (tong_tien + so_tien, tong_ky + so_ky)
+    return by_day
+
+
+def _forecast_period_start(ngay: date, group_by: str) -> date:
+    """Ngày đầu của ngày / tuần (thứ Hai) / tháng chứa ngay"""
+    if group_by == ForecastGroupBy.WEEK.value:
+        return ngay - timedelta(days=ngay.weekday())
+    if group_by == ForecastGroupBy.MONTH.value:
+        return ngay.replace(day=1)
+    return ngay
+
+
+def get_forecast(db: Session, as_of: date, days: int = 90, group_by: str = "day") -> ForecastResponse:
+    """
+    Dự báo số tiền đến hạn của toàn bộ hợp đồng đang hoạt động
+
+    Kỳ đã có dòng lịch sử lấy số tiền còn nợ từ database; kỳ chưa có dòng được
+    sinh từ điều khoản hợp đồng bằng phép toán trên mảng (app.utils.forecast),
+    với nợ trước as_of cộng dồn vào kỳ chưa cộng dồn đầu tiên như lần cộng dồn
+    tự động. Các kỳ trong khoảng được coi là thu đúng hạn (không cộng dồn lại).
+
+    Args:
+        db: Database session
+        as_of: Ngày bắt đầu dự báo
+        days: Số ngày dự báo (as_of .. as_of + days - 1)
+        group_by: day, week (tuần bắt đầu thứ Hai) hoặc month
+
+    Returns:
+        ForecastResponse
+    """
+    end_date = as_of + timedelta(days=days - 1)
+    terms = _load_forecast_terms(db, as_of)
+    amounts, counts, tien_cong_don = project_due_amounts(terms, as_of, days)
+    for ngay, (so_tien, so_ky) in _forecast_rows_by_day(db, as_of, end_date).items():
+        offset = (ngay - as_of).days
+        amounts[offset] += so_tien
+        counts[offset] += so_ky
+
+    periods: List[ForecastPeriod] = []
+    for offset, (so_tien, so_ky) in enumerate(zip(amounts, counts)):
+        ngay = as_of + timedelta(days=offset)
+        tu_ngay = max(_forecast_period_start(ngay, group_by), as_of)
+        if periods and periods[-1].tu_ngay == tu_ngay:
+            period = periods[-1]
+            period.den_ngay = ngay
+            period.so_ky += so_ky
+            period.so_tien_du_kien += so_tien
+        else:
+            periods.append(ForecastPeriod(tu_ngay=tu_ngay, den_ngay=ngay, so_ky=so_ky, so_tien_du_kien=so_tien))
+
+    return ForecastResponse(
+        as_of=as_of,
+        days=days,
+        group_by=group_by,
+        so_hop_dong=len(terms["ngay_vay"]),
+        tong_so_tien_du_kien=sum(amounts),
+        tien_cong_don=tien_cong_don,
+        moc={str(moc): sum(amounts[:moc]) for moc in FORECAST_MILESTONES if moc <= days},
+        periods=periods,
+    )
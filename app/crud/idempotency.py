@@ -0,0 +1,99 @@
+"""
+CRUD operations for IdempotencyKey (request thanh toán / tất toán gửi lại)
+"""
+import datetime
+import hashlib
+import json
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.models.idempotency_key import IdempotencyKey
+
+
+def request_fingerprint(thao_tac: str, params: dict) -> str:
+    """
+    Dấu vết của request: tên thao tác + băm SHA-256 của tham số
+
+    Args:
+        thao_tac: Tên thao tác (vd. "pay", "pay-full")
+        params: Tham số của thao tác
+
+    Returns:
+        Chuỗi so sánh được giữa các lần gửi lại
+    """
+    payload = json.dumps(jsonable_encoder(params), sort_keys=True, ensure_ascii=False)
+    return f"{thao_tac}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def get_stored_result(db: Session, khoa: str, dau_vet: str) -> Optional[Any]:
+    """
+    Kết quả đã lưu của Idempotency-Key (một lần đọc theo khóa chính)
+
+    Args:
+        db: Database session
+        khoa: Giá trị header Idempotency-Key
+        dau_vet: Dấu vết của request hiện tại (request_fingerprint)
+
+    Returns:
+        Kết quả đã lưu, hoặc None nếu khóa chưa dùng / đã hết hạn
+
+    Raises:
+        HTTPException 422 nếu khóa đã được dùng cho một request khác
+    """
+    row = db.get(IdempotencyKey, khoa)
+    if row is None or row.HetHan <= datetime.datetime.now():
+        return None
+    if row.DauVet != dau_vet:
+        raise HTTPException(status_code=422, detail="Idempotency-Key đã được dùng cho một request khác")
+    return json.loads(row.KetQua)
+
+
+def run_idempotent(db: Session, khoa: str, dau_vet: str, action: Callable, params: dict) -> Tuple[Any, bool]:
+    """
+    Chạy action(db, **params) nhiều nhất một lần cho mỗi Idempotency-Key
+
+    Phải chạy qua writer.run_write_atomic: thao tác và dòng lưu kết quả được
+    commit trong cùng một transaction, nên không có trạng thái "đã trả tiền
+    nhưng chưa lưu kết quả". Thao tác lỗi (HTTPException...) không được lưu,
+    gửi lại sẽ chạy lại. Các khóa đã hết hạn được xóa ở đây (chỉ mục HetHan).
+
+    Args:
+        db: Session của writer
+        khoa: Giá trị header Idempotency-Key
+        dau_vet: Dấu vết của request (request_fingerprint)
+        action: Hàm CRUD dạng action(db, **params)
+        params: Tham số của action
+
+    Returns:
+        (kết quả, True nếu là kết quả đã lưu từ lần gửi trước)
+
+    Raises:
+        HTTPException 409 nếu một request khác cùng khóa vừa ghi kết quả
+    """
+    stored = get_stored_result(db, khoa, dau_vet)
+    if stored is not None:
+        return stored, True
+
+    now = datetime.datetime.now()
+    db.execute(delete(IdempotencyKey).where(IdempotencyKey.HetHan <= now))
+    result = action(db, **params)
+    db.add(IdempotencyKey(
+        Khoa=khoa,
+        DauVet=dau_vet,
+        KetQua=json.dumps(jsonable_encoder(result), ensure_ascii=False),
+        ThoiGian=now,
+        HetHan=now + datetime.timedelta(hours=config.IDEMPOTENCY_TTL_HOURS),
+    ))
+    try:
+        db.flush()
+    except IntegrityError:
+        # Database không khóa ghi từ đầu transaction: request song song cùng khóa
+        # đã commit trước, thao tác này bị hủy cùng savepoint / transaction
+        raise HTTPException(status_code=409, detail="Request với Idempotency-Key này đang được xử lý, hãy gửi lại")
+    return result, False
@@ -0,0 +1,317 @@
+"""
+CRUD operations for KhachHang
+"""
+from fastapi import HTTPException
+from sqlalchemy import case, func, literal, or_, select, union_all
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.core import clock
+from app.models.khach_hang import KhachHang
+from app.models.tin_chap import TinChap
+from app.models.tra_gop import TraGop
+from app.models.lich_su_tra_lai import LichSuTraLai
+from app.schemas.khach_hang import KhachHangCreate, KhachHangUpdate, KhachHangOverview, HopDongKhachHang
+from app.utils.id_generator import generate_khach_hang_id
+from app.utils.search import customer_name, customer_name_key
+
+# Ký tự lớn nhất cho truy vấn tiền tố dạng khoảng (key <= x < key + _PREFIX_END)
+_PREFIX_END = "\uffff"
+
+
+def _clean(value: Optional[str]) -> Optional[str]:
+    """Bỏ khoảng trắng thừa; chuỗi rỗng coi như không có"""
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+def _prefix_range(column, prefix: str):
+    """Điều kiện tiền tố dạng khoảng (dùng được chỉ mục, khác với LIKE trên SQLite)"""
+    return (column >= prefix) & (column < prefix + _PREFIX_END)
+
+
+def _check_cccd_available(db: Session, cccd: Optional[str], ma_kh: Optional[str] = None) -> None:
+    """409 nếu CCCD đã thuộc một khách hàng khác"""
+    if cccd is None:
+        return
+    owner = db.execute(select(KhachHang.MaKH).where(KhachHang.CCCD == cccd)).scalar()
+    if owner is not None and owner != ma_kh:
+        raise HTTPException(status_code=409, detail=f"CCCD đã thuộc khách hàng {owner}")
+
+
+def get_khach_hang(db: Session, ma_kh: str) -> Optional[KhachHang]:
+    """
+    Get a customer by MaKH
+
+    Args:
+        db: Database session
+        ma_kh: Customer ID
+
+    Returns:
+        KhachHang object or None if not found
+    """
+    return db.get(KhachHang, ma_kh)
+
+
+def get_khach_hangs(
+    db: Session,
+    search: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 20,
+) -> List[KhachHang]:
+    """
+    Tìm khách hàng theo tiền tố họ tên (không dấu) hoặc số điện thoại
+
+    Cả hai điều kiện là khoảng trên cột có chỉ mục (TenKhongDau, SoDienThoai),
+    nên không quét bảng.
+
+    Args:
+        db: Database session
+        search: Họ tên (có dấu hay không đều được) hoặc số điện thoại, tìm theo tiền tố
+        page: Trang
+        page_size: Số khách hàng mỗi trang
+
+    Returns:
+        List of KhachHang objects, theo họ tên
+    """
+    query = select(KhachHang)
+    if search and search.strip():
+        conditions = []
+        name_key = customer_name_key(search)
+        if name_key:
+            conditions.append(_prefix_range(KhachHang.TenKhongDau, name_key))
+        phone = search.strip()
+        conditions.append(_prefix_range(KhachHang.SoDienThoai, phone))
+        query = query.where(or_(*conditions))
+
+    page = max(1, page)
+    page_size = max(1, page_size)
+    query = query.order_by(KhachHang.TenKhongDau, KhachHang.MaKH).offset((page - 1) * page_size).limit(page_size)
+    return list(db.execute(query).scalars())
+
+
+def create_khach_hang(db: Session, khach_hang: KhachHangCreate) -> KhachHang:
+    """
+    Create a new customer
+
+    Args:
+        db: Database session
+        khach_hang: Customer creation data
+
+    Returns:
+        Created KhachHang object
+
+    Raises:
+        HTTPException 409 nếu CCCD đã thuộc khách hàng khác
+    """
+    try:
+        db_khach_hang = _add_khach_hang(db, khach_hang.HoTen, khach_hang.SoDienThoai, khach_hang.CCCD)
+        db.commit()
+        db.refresh(db_khach_hang)
+        return db_khach_hang
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _add_khach_hang(
+    db: Session,
+    ho_ten: str,
+    so_dien_thoai: Optional[str] = None,
+    cccd: Optional[str] = None,
+) -> KhachHang:
+    """Thêm khách hàng mới vào session (chưa commit)"""
+    cccd = _clean(cccd)
+    _check_cccd_available(db, cccd)
+    db_khach_hang = KhachHang(
+        MaKH=generate_khach_hang_id(db),
+        HoTen=customer_name(ho_ten),
+        TenKhongDau=customer_name_key(ho_ten),
+        SoDienThoai=_clean(so_dien_thoai),
+        CCCD=cccd,
+    )
+    db.add(db_khach_hang)
+    db.flush()
+    return db_khach_hang
+
+
+def update_khach_hang(db: Session, ma_kh: str, khach_hang_update: KhachHangUpdate) -> Optional[KhachHang]:
+    """
+    Update a customer
+
+    Args:
+        db: Database session
+        ma_kh: Customer ID
+        khach_hang_update: Update data
+
+    Returns:
+        Updated KhachHang object or None if not found
+    """
+    try:
+        db_khach_hang = get_khach_hang(db, ma_kh)
+        if not db_khach_hang:
+            return None
+
+        update_data = khach_hang_update.model_dump(exclude_unset=True)
+        if "HoTen" in update_data and update_data["HoTen"] is not None:
+            db_khach_hang.HoTen = customer_name(update_data["HoTen"])
+            db_khach_hang.TenKhongDau = customer_name_key(update_data["HoTen"])
+        if "SoDienThoai" in update_data:
+            db_khach_hang.SoDienThoai = _clean(update_data["SoDienThoai"])
+        if "CCCD" in update_data:
+            cccd = _clean(update_data["CCCD"])
+            _check_cccd_available(db, cccd, ma_kh)
+            db_khach_hang.CCCD = cccd
+
+        db.commit()
+        db.refresh(db_khach_hang)
+        return db_khach_hang
+    except Exception:
+        db.rollback()
+        raise
+
+
+def resolve_khach_hang(
+    db: Session,
+    ho_ten: str,
+    ma_kh: Optional[str] = None,
+    so_dien_thoai: Optional[str] = None,
+    cccd: Optional[str] = None,
+) -> str:
+    """
+    Tìm hoặc tạo khách hàng cho một hợp đồng mới (chưa commit)
+
+    Thứ tự so khớp:
+    1. MaKH chỉ định (404 nếu không có)
+    2. CCCD
+    3. Số điện thoại + đúng họ tên (đã chuẩn hóa khoảng trắng)
+    4. Tạo khách hàng mới
+
+    Khóa họ tên không dấu (TenKhongDau) chỉ dùng để tìm kiếm, không dùng để
+    nhận diện: "Nguyễn Văn Hùng" và "Nguyễn Văn Hưng" có cùng khóa nhưng là
+    hai người. Chỉ có họ tên thì luôn tạo khách hàng mới; gộp về khách hàng
+    có sẵn bằng MaKH.
+
+    Args:
+        db: Database session
+        ho_ten: Họ tên trên hợp đồng
+        ma_kh: Mã khách hàng chỉ định
+        so_dien_thoai: Số điện thoại
+        cccd: Số CCCD / CMND
+
+    Returns:
+        MaKH
+    """
+    if ma_kh is not None:
+        if get_khach_hang(db, ma_kh) is None:
+            raise HTTPException(status_code=404, detail="Không tìm thấy khách hàng")
+        return ma_kh
+
+    cccd = _clean(cccd)
+    so_dien_thoai = _clean(so_dien_thoai)
+    if cccd is not None:
+        found = db.execute(select(KhachHang.MaKH).where(KhachHang.CCCD == cccd)).scalar()
+        if found is not None:
+            return found
+
+    if so_dien_thoai is not None:
+        query = select(KhachHang).where(
+            KhachHang.SoDienThoai == so_dien_thoai,
+            KhachHang.HoTen == customer_name(ho_ten),
+        )
+        if cccd is not None:
+            # CCCD đã cho không thuộc ai (bước 2): khách hàng có CCCD khác là người khác
+            query = query.where(KhachHang.CCCD.is_(None))
+        found = db.execute(query.limit(1)).scalar()
+        if found is not None:
+            found.CCCD = found.CCCD or cccd
+            return found.MaKH
+
+    return _add_khach_hang(db, ho_ten, so_dien_thoai, cccd).MaKH
+
+
+def get_khach_hang_overview(db: Session, ma_kh: str) -> Optional[KhachHangOverview]:
+    """
+    Khách hàng cùng mọi hợp đồng và số dư (3 truy vấn, không phụ thuộc số hợp đồng)
+
+    1. Khách hàng theo khóa chính
+    2. Hợp đồng Tín chấp + Trả góp bằng UNION ALL (chỉ mục MaKH)
+    3. Số dư của các hợp đồng bằng một câu GROUP BY MaHD trên lịch sử trả lãi
+
+    Args:
+        db: Database session
+        ma_kh: Customer ID
+
+    Returns:
+        KhachHangOverview or None if not found
+    """
+    khach_hang = get_khach_hang(db, ma_kh)
+    if khach_hang is None:
+        return None
+
+    contracts = union_all(*[
+        select(
+            model.MaHD,
+            literal(loai_hop_dong).label("LoaiHopDong"),
+            model.HoTen,
+            model.NgayVay,
+            model.SoTienVay,
+            model.TrangThai,
+        ).where(model.MaKH == ma_kh)
+        for model, loai_hop_dong in ((TinChap, "tin_chap"), (TraGop, "tra_gop"))
+    ])
+    contract_rows = db.execute(contracts).all()
+
+    balances = {}
+    ma_hds = [row.MaHD for row in contract_rows]
+    if ma_hds:
+        con_no = case(
+            (LichSuTraLai.SoTien > LichSuTraLai.TienDaTra, LichSuTraLai.SoTien - LichSuTraLai.TienDaTra),
+            else_=0,
+        )
+        rows = db.execute(
+            select(
+                LichSuTraLai.MaHD,
+                func.count(LichSuTraLai.Stt),
+                func.sum(LichSuTraLai.SoTien),
+                func.sum(LichSuTraLai.TienDaTra),
+                func.sum(con_no),
+                func.sum(case((LichSuTraLai.Ngay < clock.today(), con_no), else_=0)),
+            )
+            .where(LichSuTraLai.MaHD.in_(ma_hds))
+            .group_by(LichSuTraLai.MaHD)
+        ).all()
+        balances = {row[0]: [value or 0 for value in row[1:]] for row in rows}
+
+    hop_dongs = []
+    for row in contract_rows:
+        so_ky, tong_so_tien, tong_tien_da_tra, con_no_hop_dong, qua_han = balances.get(row.MaHD, (0, 0, 0, 0, 0))
+        hop_dongs.append(HopDongKhachHang(
+            MaHD=row.MaHD,
+            LoaiHopDong=row.LoaiHopDong,
+            HoTen=row.HoTen,
+            NgayVay=row.NgayVay,
+            SoTienVay=row.SoTienVay,
+            TrangThai=row.TrangThai,
+            SoKy=so_ky,
+            TongSoTien=tong_so_tien,
+            TongTienDaTra=tong_tien_da_tra,
+            ConNo=con_no_hop_dong,
+            QuaHan=qua_han,
+        ))
+    hop_dongs.sort(key=lambda item: (item.NgayVay, item.MaHD), reverse=True)
+
+    return KhachHangOverview(
+        MaKH=khach_hang.MaKH,
+        HoTen=khach_hang.HoTen,
+        SoDienThoai=khach_hang.SoDienThoai,
+        CCCD=khach_hang.CCCD,
+        SoHopDong=len(hop_dongs),
+        TongTienVay=sum(item.SoTienVay for item in hop_dongs),
+        TongTienDaTra=sum(item.TongTienDaTra for item in hop_dongs),
+        ConNo=sum(item.ConNo for item in hop_dongs),
+        QuaHan=sum(item.QuaHan for item in hop_dongs),
+        HopDong=hop_dongs,
+    )
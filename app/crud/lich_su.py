@@ -2,26 +2,161 @@
 CRUD operations for Lich Su (History)
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_, and_
+from sqlalchemy import case, func, or_, select
 from datetime import date, datetime, timedelta
 from typing import List, Optional, Dict, Literal
 from collections import defaultdict
+import heapq
 
 from app.models.lich_su_tra_lai import LichSuTraLai
 from app.models.tin_chap import TinChap
 from app.models.tra_gop import TraGop
+from app.models.archive import TinChapArchive, TraGopArchive, LichSuTraLaiArchive
+from app.models.daily_collection_rollup import DailyCollectionRollup, rollup_is_maintained
 from app.schemas.lich_su import (
     LichSuResponse,
     LichSuStatisticsByDate,
-    LichSuDetail
+    LichSuDetail,
+    AgingRow,
+    AgingBucketSummary,
+    AgingDetail,
+    AgingDetailPage,
+    AgingResponse
 )
-from app.core.enums import TrangThaiThanhToan
+from app.core.enums import TrangThaiThanhToan, AgingBucket
 
 
-def get_lich_su(
+# Số dòng đọc mỗi lô khi duyệt kết quả lớn (yield_per)
+_STREAM_BATCH_SIZE = 1000
+
+
+def _get_statistics_from_rollup(
+    db: Session,
+    tu_ngay: Optional[date] = None,
+    den_ngay: Optional[date] = None
+) -> List[LichSuStatisticsByDate]:
+    """
+    Thống kê số kỳ đã trả / chưa trả theo ngày từ bảng daily_collection_rollup
+    """
+    query = db.query(
+        DailyCollectionRollup.Ngay,
+        func.sum(DailyCollectionRollup.SoKyDaTra),
+        func.sum(DailyCollectionRollup.SoKyChuaTra),
+    )
+    if tu_ngay:
+        query = query.filter(DailyCollectionRollup.Ngay >= tu_ngay)
+    if den_ngay:
+        query = query.filter(DailyCollectionRollup.Ngay <= den_ngay)
+    rows = query.group_by(DailyCollectionRollup.Ngay).order_by(DailyCollectionRollup.Ngay).all()
+
+    return [
+        LichSuStatisticsByDate(ngay=ngay, so_nguoi_da_tra=da_tra, so_nguoi_chua_tra=chua_tra)
+        for ngay, da_tra, chua_tra in rows
+    ]
+
+
+def _get_statistics_from_rows(
+    db: Session,
+    tu_ngay: Optional[date] = None,
+    den_ngay: Optional[date] = None
+) -> List[LichSuStatisticsByDate]:
+    """
+    Thống kê số kỳ đã trả / chưa trả theo ngày, tính từ từng dòng LichSuTraLai
+
+    Dùng khi database không có bảng tổng hợp được cập nhật (không phải SQLite).
+    """
+    # Đếm theo ngày bằng GROUP BY (không load từng dòng)
+    is_paid = LichSuTraLai.TrangThaiThanhToan.in_(
+        [TrangThaiThanhToan.DONG_DU.value, TrangThaiThanhToan.DA_TAT_TOAN.value]
+    )
+    query = db.query(
+        LichSuTraLai.Ngay,
+        func.sum(case((is_paid, 1), else_=0)),
+        func.sum(case((is_paid, 0), else_=1)),
+    )
+    if tu_ngay:
+        query = query.filter(LichSuTraLai.Ngay >= tu_ngay)
+    if den_ngay:
+        query = query.filter(LichSuTraLai.Ngay <= den_ngay)
+    rows = query.group_by(LichSuTraLai.Ngay).order_by(LichSuTraLai.Ngay).all()
+    
+    return [
+        LichSuStatisticsByDate(ngay=ngay, so_nguoi_da_tra=da_tra, so_nguoi_chua_tra=chua_tra)
+        for ngay, da_tra, chua_tra in rows
+    ]
+
+
+def _get_archived_statistics(
     db: Session,
     tu_ngay: Optional[date] = None,
     den_ngay: Optional[date] = None
+) -> Dict[date, Dict[str, int]]:
+    """
+    Số kỳ đã trả / chưa trả theo ngày trong bảng lưu trữ (một truy vấn GROUP BY)
+    """
+    is_paid = LichSuTraLaiArchive.TrangThaiThanhToan.in_(
+        [TrangThaiThanhToan.DONG_DU.value, TrangThaiThanhToan.DA_TAT_TOAN.value]
+    )
+    query = db.query(
+        LichSuTraLaiArchive.Ngay,
+        func.sum(case((is_paid, 1), else_=0)),
+        func.sum(case((is_paid, 0), else_=1)),
+    )
+    if tu_ngay:
+        query = query.filter(LichSuTraLaiArchive.Ngay >= tu_ngay)
+    if den_ngay:
+        query = query.filter(LichSuTraLaiArchive.Ngay <= den_ngay)
+    rows = query.group_by(LichSuTraLaiArchive.Ngay).all()
+    return {ngay: {"da_tra": da_tra, "chua_tra": chua_tra} for ngay, da_tra, chua_tra in rows}
+
+
+def _merge_statistics(
+    statistics: List[LichSuStatisticsByDate],
+    extra: Dict[date, Dict[str, int]]
+) -> List[LichSuStatisticsByDate]:
+    """Cộng thêm thống kê (vd: từ bảng lưu trữ) vào thống kê theo ngày"""
+    merged = {
+        item.ngay: {"da_tra": item.so_nguoi_da_tra, "chua_tra": item.so_nguoi_chua_tra}
+        for item in statistics
+    }
+    for ngay, counts in extra.items():
+        bucket = merged.setdefault(ngay, {"da_tra": 0, "chua_tra": 0})
+        bucket["da_tra"] += counts["da_tra"]
+        bucket["chua_tra"] += counts["chua_tra"]
+    return [
+        LichSuStatisticsByDate(ngay=ngay, so_nguoi_da_tra=counts["da_tra"], so_nguoi_chua_tra=counts["chua_tra"])
+        for ngay, counts in sorted(merged.items())
+    ]
+
+
+def _load_contract_names(db: Session, ma_hds: set, include_archived: bool = False) -> Dict[str, tuple]:
+    """
+    Họ tên và loại hợp đồng cho nhiều MaHD (một truy vấn mỗi bảng)
+
+    Returns:
+        Dict MaHD -> (HoTen, LoaiHopDong)
+    """
+    sources = [(TinChap, "Tín chấp"), (TraGop, "Trả góp")]
+    if include_archived:
+        sources += [(TinChapArchive, "Tín chấp"), (TraGopArchive, "Trả góp")]
+
+    names: Dict[str, tuple] = {}
+    for model, loai_hop_dong in sources:
+        pending = sorted(ma_hd for ma_hd in ma_hds if ma_hd not in names)
+        # Chia nhỏ danh sách IN (SQLite giới hạn số tham số mỗi câu lệnh)
+        for start in range(0, len(pending), 500):
+            chunk = pending[start:start + 500]
+            rows = db.query(model.MaHD, model.HoTen).filter(model.MaHD.in_(chunk)).all()
+            for ma_hd, ho_ten in rows:
+                names[ma_hd] = (ho_ten, loai_hop_dong)
+    return names
+
+
+def get_lich_su(
+    db: Session,
+    tu_ngay: Optional[date] = None,
+    den_ngay: Optional[date] = None,
+    include_archived: bool = False
 ) -> LichSuResponse:
     """
     Get history data with statistics and details
@@ -30,80 +165,41 @@ def get_lich_su(
         db: Database session
         tu_ngay: Start date filter
         den_ngay: End date filter
+        include_archived: Also include archived (settled) contracts
         
     Returns:
         LichSuResponse with statistics by date and detailed records
     """
-    # Base query for LichSuTraLai
-    query = db.query(LichSuTraLai)
-    
-    # Apply date filters
-    if tu_ngay:
-        query = query.filter(LichSuTraLai.Ngay >= tu_ngay)
-    if den_ngay:
-        query = query.filter(LichSuTraLai.Ngay <= den_ngay)
-    
-    # Get all records for statistics (before pagination)
-    all_lich_su = query.all()
-    
-    # Calculate statistics by date
-    stats_by_date = defaultdict(lambda: {"da_tra": 0, "chua_tra": 0})
-    
-    for ls in all_lich_su:
-        date_key = ls.Ngay
-        if ls.TrangThaiThanhToan == TrangThaiThanhToan.DONG_DU.value or \
-           ls.TrangThaiThanhToan == TrangThaiThanhToan.DA_TAT_TOAN.value:
-            stats_by_date[date_key]["da_tra"] += 1
-        else:
-            stats_by_date[date_key]["chua_tra"] += 1
-    
-    # Convert statistics to list and sort by date
-    statistics = []
-    for ngay in sorted(stats_by_date.keys()):
-        statistics.append(
-            LichSuStatisticsByDate(
-                ngay=ngay,
-                so_nguoi_da_tra=stats_by_date[ngay]["da_tra"],
-                so_nguoi_chua_tra=stats_by_date[ngay]["chua_tra"]
-            )
-        )
+    # Thống kê theo ngày: đọc bảng tổng hợp (một dòng / ngày / loại HĐ)
+    if rollup_is_maintained(db.get_bind()):
+        statistics = _get_statistics_from_rollup(db, tu_ngay, den_ngay)
+    else:
+        statistics = _get_statistics_from_rows(db, tu_ngay, den_ngay)
+    if include_archived:
+        statistics = _merge_statistics(statistics, _get_archived_statistics(db, tu_ngay, den_ngay))
     
     # Apply date filter for details (no search, no pagination)
-    detail_query = db.query(LichSuTraLai)
-    if tu_ngay:
-        detail_query = detail_query.filter(LichSuTraLai.Ngay >= tu_ngay)
-    if den_ngay:
-        detail_query = detail_query.filter(LichSuTraLai.Ngay <= den_ngay)
+    history_models = [LichSuTraLai, LichSuTraLaiArchive] if include_archived else [LichSuTraLai]
+    lich_su_list = []
+    for model in history_models:
+        detail_query = db.query(model)
+        if tu_ngay:
+            detail_query = detail_query.filter(model.Ngay >= tu_ngay)
+        if den_ngay:
+            detail_query = detail_query.filter(model.Ngay <= den_ngay)
+        lich_su_list += detail_query.all()
     
     # Order by date desc, then by Stt desc - get ALL records
-    lich_su_list = detail_query.order_by(
-        LichSuTraLai.Ngay.desc(),
-        LichSuTraLai.Stt.desc()
-    ).all()
+    lich_su_list.sort(key=lambda ls: (ls.Ngay, ls.Stt), reverse=True)
     
     # Get total count
     total_records = len(lich_su_list)
     
     # Build detailed records with HoTen from TinChap/TraGop
+    names = _load_contract_names(db, {ls.MaHD for ls in lich_su_list}, include_archived)
     details = []
     for ls in lich_su_list:
-        # Get contract info to find HoTen and LoaiHopDong
-        ho_ten = ""
-        loai_hop_dong = ""
-        
-        # Check if MaHD starts with TC (Tín Chấp)
-        if ls.MaHD.startswith("TC"):
-            tin_chap = db.query(TinChap).filter(TinChap.MaHD == ls.MaHD).first()
-            if tin_chap:
-                ho_ten = tin_chap.HoTen
-                loai_hop_dong = "Tín chấp"
-        # Check if MaHD starts with TG (Trả Góp)
-        elif ls.MaHD.startswith("TG"):
-            tra_gop = db.query(TraGop).filter(TraGop.MaHD == ls.MaHD).first()
-            if tra_gop:
-                ho_ten = tra_gop.HoTen
-                loai_hop_dong = "Trả góp"
-        
+        ho_ten, loai_hop_dong = names.get(ls.MaHD, ("", ""))
         details.append(
             LichSuDetail(
                 stt=ls.Stt,
@@ -203,122 +299,108 @@ def get_financial_statistics(
         "breakdown": {"tin_chap": 0.0, "tra_gop": 0.0}
     })
     
-    # Get all contracts in date range
-    tin_chaps = db.query(TinChap).filter(
-        TinChap.NgayVay >= start_date,
-        TinChap.NgayVay <= end_date
-    ).all()
-    
-    tra_gops = db.query(TraGop).filter(
-        TraGop.NgayVay >= start_date,
-        TraGop.NgayVay <= end_date
-    ).all()
-    
-    # Calculate disbursed amount by period
-    for tc in tin_chaps:
-        bucket_key = _get_bucket_key(tc.NgayVay, granularity)
-        trend_buckets[bucket_key]["bucket"] = bucket_key
-        trend_buckets[bucket_key]["tong_tien_chi"] += float(tc.SoTienVay)
-        trend_buckets[bucket_key]["breakdown"]["tin_chap"] += float(tc.SoTienVay)
-    
-    for tg in tra_gops:
-        bucket_key = _get_bucket_key(tg.NgayVay, granularity)
-        trend_buckets[bucket_key]["bucket"] = bucket_key
-        trend_buckets[bucket_key]["tong_tien_chi"] += float(tg.SoTienVay)
-        trend_buckets[bucket_key]["breakdown"]["tra_gop"] += float(tg.SoTienVay)
-    
-    # Calculate collected amount and interest from payment history
-    paid_records = db.query(LichSuTraLai).filter(
-        LichSuTraLai.Ngay >= start_date,
-        LichSuTraLai.Ngay <= end_date,
-        or_(
-            LichSuTraLai.TrangThaiThanhToan == TrangThaiThanhToan.DONG_DU.value,
-            LichSuTraLai.TrangThaiThanhToan == TrangThaiThanhToan.DA_TAT_TOAN.value
-        )
-    ).all()
-    
     breakdown = {
         "tin_chap": {"disbursed": 0.0, "collected": 0.0, "interest": 0.0},
         "tra_gop": {"disbursed": 0.0, "collected": 0.0, "interest": 0.0}
     }
     
-    for record in paid_records:
-        if not record.MaHD:
-            continue
-        
-        contract = _load_contract(db, record.MaHD)
-        if not contract:
-            continue
-        
-        bucket_key = _get_bucket_key(record.Ngay, granularity)
-        paid_amount = float(record.TienDaTra)
-        interest_amount = float(contract["interest_per_period"])
-        ctype = contract["contract_type"]
-        
-        # Add to trend
-        trend_buckets[bucket_key]["bucket"] = bucket_key
-        trend_buckets[bucket_key]["tong_tien_thu"] += paid_amount
-        trend_buckets[bucket_key]["tong_tien_lai"] += interest_amount
-        
-        # Add to breakdown
-        breakdown[ctype]["collected"] += paid_amount
-        breakdown[ctype]["interest"] += interest_amount
+    # Các truy vấn dưới đây trả về tuple (không load ORM object) và được đọc
+    # dần theo lô (yield_per): bộ nhớ không tăng theo số dòng lịch sử
+    sources = ((TinChap, "tin_chap"), (TraGop, "tra_gop"))
     
-    # Add disbursed to breakdown
-    for tc in tin_chaps:
-        breakdown["tin_chap"]["disbursed"] += float(tc.SoTienVay)
-    for tg in tra_gops:
-        breakdown["tra_gop"]["disbursed"] += float(tg.SoTienVay)
+    # Calculate disbursed amount by period: tổng theo ngày vay
+    for model, ctype in sources:
+        rows = db.execute(
+            select(model.NgayVay, func.sum(model.SoTienVay))
+            .where(model.NgayVay >= start_date, model.NgayVay <= end_date)
+            .group_by(model.NgayVay)
+            .execution_options(yield_per=_STREAM_BATCH_SIZE)
+        )
+        for ngay_vay, so_tien_vay in rows:
+            bucket_key = _get_bucket_key(ngay_vay, granularity)
+            trend_buckets[bucket_key]["bucket"] = bucket_key
+            trend_buckets[bucket_key]["tong_tien_chi"] += float(so_tien_vay)
+            trend_buckets[bucket_key]["breakdown"][ctype] += float(so_tien_vay)
+            breakdown[ctype]["disbursed"] += float(so_tien_vay)
     
-    # Calculate outstanding contracts and overdue
-    outstanding_records = db.query(LichSuTraLai).filter(
-        or_(
-            LichSuTraLai.TrangThaiThanhToan == TrangThaiThanhToan.CHUA_THANH_TOAN.value,
-            LichSuTraLai.TrangThaiThanhToan == TrangThaiThanhToan.THANH_TOAN_MOT_PHAN.value
+    # Calculate collected amount and interest from payment history:
+    # tổng theo ngày, lãi mỗi kỳ lấy từ hợp đồng (join thay vì tra từng kỳ)
+    for model, ctype in sources:
+        rows = db.execute(
+            select(LichSuTraLai.Ngay, func.sum(LichSuTraLai.TienDaTra), func.sum(model.LaiSuat))
+            .join(model, model.MaHD == LichSuTraLai.MaHD)
+            .where(
+                LichSuTraLai.Ngay >= start_date,
+                LichSuTraLai.Ngay <= end_date,
+                or_(
+                    LichSuTraLai.TrangThaiThanhToan == TrangThaiThanhToan.DONG_DU.value,
+                    LichSuTraLai.TrangThaiThanhToan == TrangThaiThanhToan.DA_TAT_TOAN.value
+                ),
+            )
+            .group_by(LichSuTraLai.Ngay)
+            .execution_options(yield_per=_STREAM_BATCH_SIZE)
         )
-    ).all()
+        for ngay, paid_amount, interest_amount in rows:
+            bucket_key = _get_bucket_key(ngay, granularity)
+            
+            # Add to trend
+            trend_buckets[bucket_key]["bucket"] = bucket_key
+            trend_buckets[bucket_key]["tong_tien_thu"] += float(paid_amount)
+            trend_buckets[bucket_key]["tong_tien_lai"] += float(interest_amount)
+            
+            # Add to breakdown
+            breakdown[ctype]["collected"] += float(paid_amount)
+            breakdown[ctype]["interest"] += float(interest_amount)
     
-    active_contracts = set()
-    overdue_contracts = set()
-    overdue_amount = 0.0
-    outstanding_amounts = defaultdict(float)
-    outstanding_contract_types = {}
+    # Calculate outstanding contracts and overdue: một dòng mỗi hợp đồng còn nợ
+    amount_due = LichSuTraLai.SoTien - LichSuTraLai.TienDaTra
+    is_overdue = LichSuTraLai.Ngay < end_date
+    outstanding_rows = db.execute(
+        select(
+            LichSuTraLai.MaHD,
+            func.sum(amount_due),
+            func.sum(case((is_overdue, amount_due), else_=0)),
+            func.max(case((is_overdue, 1), else_=0)),
+        )
+        .where(
+            or_(
+                LichSuTraLai.TrangThaiThanhToan == TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+                LichSuTraLai.TrangThaiThanhToan == TrangThaiThanhToan.THANH_TOAN_MOT_PHAN.value
+            ),
+            LichSuTraLai.MaHD.isnot(None),
+            LichSuTraLai.MaHD != "",
+            amount_due > 0,
+        )
+        .group_by(LichSuTraLai.MaHD)
+        .execution_options(yield_per=_STREAM_BATCH_SIZE)
+    )
     
-    for record in outstanding_records:
-        if not record.MaHD:
-            continue
-        
-        amount_due = float(record.SoTien - record.TienDaTra)
-        if amount_due <= 0:
-            continue
-        
-        contract = _load_contract(db, record.MaHD)
-        contract_type = contract["contract_type"] if contract else "unknown"
-        
-        active_contracts.add(record.MaHD)
-        outstanding_amounts[record.MaHD] += amount_due
-        outstanding_contract_types[record.MaHD] = contract_type
-        
-        # Check if overdue
-        due_date = record.Ngay
-        if due_date and due_date < end_date:
-            overdue_contracts.add(record.MaHD)
-            overdue_amount += amount_due
+    totals = {"active": 0, "overdue": 0, "overdue_amount": 0.0}
+
+    def _outstanding():
+        for ma_hd, amount, overdue, has_overdue in outstanding_rows:
+            totals["active"] += 1
+            totals["overdue"] += has_overdue
+            totals["overdue_amount"] += float(overdue)
+            yield float(amount), ma_hd, bool(has_overdue)
+
+    # Chỉ giữ 5 hợp đồng nợ nhiều nhất (heap), không giữ toàn bộ danh sách;
+    # cùng số tiền thì xếp theo mã hợp đồng
+    top_rows = heapq.nsmallest(5, _outstanding(), key=lambda item: (-item[0], item[1]))
+    active_contracts = totals["active"]
+    overdue_contracts = totals["overdue"]
+    overdue_amount = totals["overdue_amount"]
     
     # Top 5 outstanding contracts
-    top_outstanding = sorted(
-        [
-            {
-                "ma_hop_dong": ma_hd,
-                "amount": amount,
-                "contract_type": outstanding_contract_types.get(ma_hd),
-                "is_overdue": ma_hd in overdue_contracts,
-            }
-            for ma_hd, amount in outstanding_amounts.items()
-        ],
-        key=lambda item: item["amount"],
-        reverse=True,
-    )[:5]
+    top_outstanding = []
+    for amount, ma_hd, has_overdue in top_rows:
+        contract = _load_contract(db, ma_hd)
+        top_outstanding.append({
+            "ma_hop_dong": ma_hd,
+            "amount": amount,
+            "contract_type": contract["contract_type"] if contract else "unknown",
+            "is_overdue": has_overdue,
+        })
     
     # Convert trend buckets to sorted list
     trend = sorted(trend_buckets.values(), key=lambda x: x["bucket"])
@@ -333,8 +415,8 @@ def get_financial_statistics(
         "total_collected": float(summary_collected),
         "total_interest": float(summary_interest),
         "net_cash_flow": float(summary_collected - summary_disbursed),
-        "active_contracts": len(active_contracts),
-        "overdue_contracts": len(overdue_contracts),
+        "active_contracts": active_contracts,
+        "overdue_contracts": overdue_contracts,
         "overdue_amount": float(overdue_amount),
     }
     
@@ -351,3 +433,183 @@ def get_financial_statistics(
         "top_outstanding": top_outstanding,
     }
 
+
+# Nhóm tuổi nợ: (nhóm, số ngày quá hạn từ, đến; None: không giới hạn)
+AGING_BUCKETS = (
+    (AgingBucket.D1_30.value, 1, 30),
+    (AgingBucket.D31_60.value, 31, 60),
+    (AgingBucket.D61_90.value, 61, 90),
+    (AgingBucket.D90_PLUS.value, 91, None),
+)
+
+_OUTSTANDING_STATUSES = [
+    TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+    TrangThaiThanhToan.THANH_TOAN_MOT_PHAN.value,
+]
+
+
+def _contract_type_expr():
+    """Loại hợp đồng theo tiền tố MaHD (TC: tín chấp, TG: trả góp)"""
+    return case(
+        (LichSuTraLai.MaHD.like("TC%"), "tin_chap"),
+        (LichSuTraLai.MaHD.like("TG%"), "tra_gop"),
+        else_="unknown",
+    )
+
+
+def _overdue_filter(as_of: date) -> list:
+    """Kỳ còn nợ đã quá hạn tại ngày as_of (đi theo chỉ mục TrangThaiThanhToan, Ngay)"""
+    return [
+        LichSuTraLai.TrangThaiThanhToan.in_(_OUTSTANDING_STATUSES),
+        LichSuTraLai.Ngay < as_of,
+        LichSuTraLai.SoTien > LichSuTraLai.TienDaTra,
+    ]
+
+
+def get_aging_report(
+    db: Session,
+    as_of: date,
+    bucket: Optional[str] = None,
+    loai_hop_dong: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 50,
+) -> AgingResponse:
+    """
+    Báo cáo tuổi nợ quá hạn: tiền còn nợ (SoTien - TienDaTra) theo nhóm tuổi
+    nợ, loại hợp đồng và trạng thái, tính bằng một câu GROUP BY
+
+    Số ngày quá hạn = as_of - Ngay; nhóm được xác định bằng so sánh Ngay với
+    các mốc ngày tính sẵn, nên câu SQL dùng được chỉ mục trên Ngay. Trạng thái
+    thanh toán là trạng thái hiện tại (as_of chỉ dời mốc quá hạn).
+
+    Args:
+        db: Database session
+        as_of: Ngày báo cáo
+        bucket: Nhóm cần xem chi tiết (None: chỉ trả tổng hợp)
+        loai_hop_dong: Lọc chi tiết theo loại hợp đồng (tin_chap/tra_gop)
+        page: Trang chi tiết
+        page_size: Số dòng mỗi trang chi tiết
+
+    Returns:
+        AgingResponse
+    """
+    bucket_expr = case(
+        *[
+            (LichSuTraLai.Ngay >= as_of - timedelta(days=to_days), name)
+            for name, _, to_days in AGING_BUCKETS
+            if to_days is not None
+        ],
+        else_=AGING_BUCKETS[-1][0],
+    )
+    type_expr = _contract_type_expr()
+    amount_due = LichSuTraLai.SoTien - LichSuTraLai.TienDaTra
+
+    grouped = db.execute(
+        select(
+            bucket_expr,
+            type_expr,
+            LichSuTraLai.TrangThaiThanhToan,
+            func.sum(amount_due),
+            func.count(),
+            func.count(LichSuTraLai.MaHD.distinct()),
+        )
+        .where(*_overdue_filter(as_of))
+        .group_by(bucket_expr, type_expr, LichSuTraLai.TrangThaiThanhToan)
+    ).all()
+
+    rows = [
+        AgingRow(
+            bucket=name,
+            loai_hop_dong=ctype,
+            trang_thai=trang_thai,
+            so_tien_con_no=amount,
+            so_ky=so_ky,
+            so_hop_dong=so_hop_dong,
+        )
+        for name, ctype, trang_thai, amount, so_ky, so_hop_dong in grouped
+    ]
+    bucket_order = {name: index for index, (name, _, _) in enumerate(AGING_BUCKETS)}
+    rows.sort(key=lambda row: (bucket_order[row.bucket], row.loai_hop_dong, row.trang_thai))
+
+    # Tổng theo nhóm: luôn đủ 4 nhóm (nhóm không có nợ = 0)
+    buckets = []
+    for name, _, _ in AGING_BUCKETS:
+        in_bucket = [row for row in rows if row.bucket == name]
+        by_type: Dict[str, int] = defaultdict(int)
+        for row in in_bucket:
+            by_type[row.loai_hop_dong] += row.so_tien_con_no
+        buckets.append(AgingBucketSummary(
+            bucket=name,
+            so_tien_con_no=sum(row.so_tien_con_no for row in in_bucket),
+            so_ky=sum(row.so_ky for row in in_bucket),
+            theo_loai_hop_dong=dict(by_type),
+        ))
+
+    details = None
+    if bucket is not None:
+        details = _get_aging_details(db, as_of, bucket, loai_hop_dong, page, page_size)
+
+    return AgingResponse(
+        as_of=as_of,
+        tong_no_qua_han=sum(item.so_tien_con_no for item in buckets),
+        buckets=buckets,
+        rows=rows,
+        details=details,
+    )
+
+
+def _get_aging_details(
+    db: Session,
+    as_of: date,
+    bucket: str,
+    loai_hop_dong: Optional[str],
+    page: int,
+    page_size: int,
+) -> AgingDetailPage:
+    """Một trang các kỳ còn nợ của một nhóm tuổi nợ (cũ nhất trước)"""
+    from_days, to_days = next((start, end) for name, start, end in AGING_BUCKETS if name == bucket)
+    conditions = _overdue_filter(as_of) + [LichSuTraLai.Ngay <= as_of - timedelta(days=from_days)]
+    if to_days is not None:
+        conditions.append(LichSuTraLai.Ngay >= as_of - timedelta(days=to_days))
+    if loai_hop_dong == "tin_chap":
+        conditions.append(LichSuTraLai.MaHD.like("TC%"))
+    elif loai_hop_dong == "tra_gop":
+        conditions.append(LichSuTraLai.MaHD.like("TG%"))
+
+    total = db.execute(select(func.count()).select_from(LichSuTraLai).where(*conditions)).scalar_one()
+
+    page = max(1, page)
+    page_size = max(1, page_size)
+    records = db.execute(
+        select(
+            LichSuTraLai.Stt,
+            LichSuTraLai.MaHD,
+            LichSuTraLai.Ngay,
+            LichSuTraLai.SoTien,
+            LichSuTraLai.TienDaTra,
+            LichSuTraLai.TrangThaiThanhToan,
+            _contract_type_expr(),
+        )
+        .where(*conditions)
+        .order_by(LichSuTraLai.Ngay, LichSuTraLai.Stt)
+        .offset((page - 1) * page_size)
+        .limit(page_size)
+    ).all()
+
+    names = _load_contract_names(db, {record.MaHD for record in records})
+    items = [
+        AgingDetail(
+            stt=stt,
+            ma_hd=ma_hd,
+            ho_ten=names.get(ma_hd, ("", ""))[0],
+            loai_hop_dong=ctype,
+            ngay=ngay,
+            so_ngay_qua_han=(as_of - ngay).days,
+            so_tien=so_tien,
+            tien_da_tra=tien_da_tra,
+            so_tien_con_no=so_tien - tien_da_tra,
+            trang_thai=trang_thai,
+        )
+        for stt, ma_hd, ngay, so_tien, tien_da_tra, trang_thai, ctype in records
+    ]
+    return AgingDetailPage(bucket=bucket, page=page, page_size=page_size, total=total, items=items)
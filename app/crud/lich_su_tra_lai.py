@@ -3,15 +3,19 @@ CRUD operations for LichSuTraLai
 """
 from datetime import date, timedelta
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import select, or_
-from typing import List, Optional
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, case, func, insert, select, or_, update
+from typing import Dict, List, Optional, Set
 
-from app.core.enums import TrangThaiThanhToan, TrangThaiNgayThanhToan
+from app.core import clock
+from app.core.enums import NguonThanhToan, TrangThaiThanhToan, TrangThaiNgayThanhToan
+from app.crud.payment_ledger import record_payment
 from app.models.lich_su_tra_lai import LichSuTraLai
+from app.models.archive import LichSuTraLaiArchive
 from app.models.tin_chap import TinChap
 from app.models.tra_gop import TraGop
-from app.schemas.lich_su_tra_lai import LichSuTraLaiCreate, LichSuTraLaiUpdate
+from app.schemas.lich_su_tra_lai import LichSuTraLaiCreate, LichSuTraLaiUpdate, LichSuTraLaiPayItem
+from app.utils.schedule import period_due_date, periods_due_by, refresh_due_date, set_current_period
 
 
 def get_lich_su(db: Session, stt: int) -> Optional[LichSuTraLai]:
@@ -43,18 +47,141 @@ def get_lich_sus(db: Session, skip: int = 0, limit: int = 100) -> List[LichSuTra
     return db.query(LichSuTraLai).offset(skip).limit(limit).all()
 
 
-def get_lich_sus_by_contract(db: Session, ma_hd: str) -> List[LichSuTraLai]:
+def get_lich_sus_by_contract(db: Session, ma_hd: str, include_archived: bool = False) -> List[LichSuTraLai]:
     """
     Get payment history records by contract ID
     
     Args:
         db: Database session
         ma_hd: Contract ID
+        include_archived: Also return rows from lich_su_tra_lai_archive
         
     Returns:
-        List of LichSuTraLai objects
+        List of LichSuTraLai (and LichSuTraLaiArchive) objects
+    """
+    lich_sus = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == ma_hd).all()
+    if include_archived:
+        lich_sus += (
+            db.query(LichSuTraLaiArchive)
+            .filter(LichSuTraLaiArchive.MaHD == ma_hd)
+            .order_by(LichSuTraLaiArchive.Stt)
+            .all()
+        )
+    return lich_sus
+
+
+def get_lich_sus_for_contracts(
+    db: Session,
+    ma_hds: List[str],
+    last_n: Optional[int] = None,
+) -> Dict[str, List[LichSuTraLai]]:
+    """
+    Get payment history for a page of contracts in one query
+
+    Args:
+        db: Database session
+        ma_hds: Contract IDs
+        last_n: Only the N most recent periods per contract (None: all)
+
+    Returns:
+        Dict MaHD -> list of LichSuTraLai (ascending Stt)
+    """
+    histories: Dict[str, List[LichSuTraLai]] = {ma_hd: [] for ma_hd in ma_hds}
+    if not ma_hds:
+        return histories
+
+    if last_n is None:
+        query = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD.in_(ma_hds))
+        rows = query.order_by(LichSuTraLai.MaHD, LichSuTraLai.Stt).all()
+    else:
+        # ROW_NUMBER() theo từng hợp đồng: chỉ N kỳ gần nhất được đọc ra
+        row_number = func.row_number().over(
+            partition_by=LichSuTraLai.MaHD,
+            order_by=(LichSuTraLai.Ngay.desc(), LichSuTraLai.Stt.desc()),
+        ).label("rn")
+        ranked = select(LichSuTraLai, row_number).where(LichSuTraLai.MaHD.in_(ma_hds)).subquery()
+        ranked_lich_su = aliased(LichSuTraLai, ranked)
+        rows = (
+            db.query(ranked_lich_su)
+            .filter(ranked.c.rn <= max(0, last_n))
+            .order_by(ranked_lich_su.MaHD, ranked_lich_su.Stt)
+            .all()
+        )
+
+    for row in rows:
+        histories[row.MaHD].append(row)
+    return histories
+
+
+def summarize_lich_sus(lich_sus: List[LichSuTraLai]) -> dict:
+    """
+    Tóm tắt lịch sử trả lãi đã tải (cùng khóa với get_lich_su_summaries)
+
+    Args:
+        lich_sus: Lịch sử trả lãi của một hợp đồng
+
+    Returns:
+        dict SoKy, SoKyDaDongDu, TongSoTien, TongTienDaTra, NgayChuaThanhToanDauTien
+    """
+    so_ky_da_dong_du = tong_so_tien = tong_tien_da_tra = 0
+    ngay_chua_tra = None
+    for ls in lich_sus:
+        so_tien, tien_da_tra = ls.SoTien, ls.TienDaTra
+        tong_so_tien += so_tien
+        tong_tien_da_tra += tien_da_tra
+        if tien_da_tra >= so_tien:
+            so_ky_da_dong_du += 1
+        elif ngay_chua_tra is None or ls.Ngay < ngay_chua_tra:
+            ngay_chua_tra = ls.Ngay
+    return {
+        "SoKy": len(lich_sus),
+        "SoKyDaDongDu": so_ky_da_dong_du,
+        "TongSoTien": tong_so_tien,
+        "TongTienDaTra": tong_tien_da_tra,
+        "NgayChuaThanhToanDauTien": ngay_chua_tra,
+    }
+
+
+def get_lich_su_summaries(db: Session, ma_hds: List[str]) -> Dict[str, dict]:
     """
-    return db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == ma_hd).all()
+    Tóm tắt lịch sử trả lãi của nhiều hợp đồng bằng một truy vấn GROUP BY
+
+    Không đọc từng dòng lịch sử; hợp đồng chưa có lịch sử nhận tóm tắt rỗng.
+
+    Args:
+        db: Database session
+        ma_hds: Contract IDs
+
+    Returns:
+        Dict MaHD -> tóm tắt (xem summarize_lich_sus)
+    """
+    summaries = {ma_hd: summarize_lich_sus([]) for ma_hd in ma_hds}
+    if not ma_hds:
+        return summaries
+
+    is_paid = LichSuTraLai.TienDaTra >= LichSuTraLai.SoTien
+    rows = db.execute(
+        select(
+            LichSuTraLai.MaHD,
+            func.count(LichSuTraLai.Stt),
+            func.sum(case((is_paid, 1), else_=0)),
+            func.sum(LichSuTraLai.SoTien),
+            func.sum(LichSuTraLai.TienDaTra),
+            func.min(case((~is_paid, LichSuTraLai.Ngay))),
+        )
+        .where(LichSuTraLai.MaHD.in_(ma_hds))
+        .group_by(LichSuTraLai.MaHD)
+    ).all()
+
+    for ma_hd, so_ky, so_ky_da_dong_du, tong_so_tien, tong_tien_da_tra, ngay_chua_tra in rows:
+        summaries[ma_hd] = {
+            "SoKy": so_ky,
+            "SoKyDaDongDu": so_ky_da_dong_du or 0,
+            "TongSoTien": tong_so_tien or 0,
+            "TongTienDaTra": tong_tien_da_tra or 0,
+            "NgayChuaThanhToanDauTien": ngay_chua_tra,
+        }
+    return summaries
 
 
 def create_lich_su(db: Session, ma_hd: str) -> dict:
@@ -103,7 +230,7 @@ def create_lich_su(db: Session, ma_hd: str) -> dict:
         ngay_vay = data_hop_dong.NgayVay
         ky_dong = data_hop_dong.KyDong  # Số ngày giữa các kỳ
         lai_suat = data_hop_dong.LaiSuat
-        date_now = date.today()
+        date_now = clock.today()
         
         # 3. Kiểm tra nếu NgayVay = hôm nay → không tạo gì
         if ngay_vay >= date_now:
@@ -204,6 +331,9 @@ def create_lich_su(db: Session, ma_hd: str) -> dict:
             )
             db.add(db_lich_su)
         
+        # Các kỳ đến hạn tới hôm nay đã được tính: lần cộng dồn tiếp theo là kỳ sau
+        set_current_period(data_hop_dong, periods_due_by(ngay_vay, ky_dong, date_now))
+        
         # 8. Commit vào database
         db.commit()
         
@@ -240,8 +370,13 @@ def update_lich_su(db: Session, stt: int, lich_su_update: LichSuTraLaiUpdate) ->
         return None
     
     update_data = lich_su_update.model_dump(exclude_unset=True)
+    tien_da_tra_cu = db_lich_su.TienDaTra
     for key, value in update_data.items():
         setattr(db_lich_su, key, value)
+    if update_data.get("TienDaTra") is not None:
+        record_payment(
+            db, db_lich_su.MaHD, db_lich_su.TienDaTra - tien_da_tra_cu, NguonThanhToan.DIEU_CHINH, stt=stt
+        )
     
     db.commit()
     db.refresh(db_lich_su)
@@ -333,212 +468,362 @@ def delete_lich_sus_by_contract(db: Session, ma_hd: str) -> int:
         raise HTTPException(status_code=500, detail=f"Lỗi khi xóa lịch sử trả lãi: {str(e)}")
 
 
-def auto_create_lich_su(db: Session) -> dict:
+def _apply_status_transitions(db: Session, as_of: date) -> Dict[str, int]:
+    """
+    Chuyển trạng thái ngày của các kỳ theo ngày as_of bằng UPDATE hàng loạt (chưa commit)
+
+    - Chưa đến hạn / Đến hạn -> Quá hạn: kỳ có Ngay < as_of đã trả đủ hoặc đã
+      được cộng dồn sang kỳ sau (SoTien <= TienDaTra)
+    - Chưa đến hạn -> Đến hạn: kỳ có Ngay <= as_of (kể cả ngày bị bỏ lỡ)
+
+    Kỳ đã qua ngày nhưng còn nợ giữ trạng thái Đến hạn (vẫn thanh toán được)
+    cho tới khi lần cộng dồn dồn số còn nợ sang kỳ mới và đánh dấu Quá hạn.
+    Mỗi câu UPDATE đi theo chỉ mục (TrangThaiNgayThanhToan, Ngay) nên chỉ đọc
+    các kỳ thực sự cần đổi. Chỉ chuyển tiến, không đưa kỳ về trạng thái trước.
+
+    Returns:
+        dict: Số kỳ đã đổi cho từng chuyển trạng thái
+    """
+    qua_han = db.execute(
+        update(LichSuTraLai)
+        .where(
+            LichSuTraLai.TrangThaiNgayThanhToan.in_([
+                TrangThaiNgayThanhToan.CHUA_DEN_HAN.value,
+                TrangThaiNgayThanhToan.DEN_HAN.value,
+            ]),
+            LichSuTraLai.Ngay < as_of,
+            LichSuTraLai.SoTien <= LichSuTraLai.TienDaTra,
+        )
+        .values(TrangThaiNgayThanhToan=TrangThaiNgayThanhToan.QUA_HAN.value)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    den_han = db.execute(
+        update(LichSuTraLai)
+        .where(
+            LichSuTraLai.TrangThaiNgayThanhToan == TrangThaiNgayThanhToan.CHUA_DEN_HAN.value,
+            LichSuTraLai.Ngay <= as_of,
+        )
+        .values(TrangThaiNgayThanhToan=TrangThaiNgayThanhToan.DEN_HAN.value)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return {"chua_den_han_sang_den_han": den_han, "sang_qua_han": qua_han}
+
+
+def transition_payment_statuses(db: Session, as_of: date) -> dict:
+    """
+    Chuyển trạng thái ngày (Chưa đến hạn -> Đến hạn -> Quá hạn) cho toàn bộ
+    lịch sử theo ngày as_of, trong một transaction
+
+    Args:
+        db: Database session
+        as_of: Ngày xét
+
+    Returns:
+        dict: Số kỳ đã đổi theo từng chuyển trạng thái và tổng số
+    """
+    try:
+        counts = _apply_status_transitions(db, as_of)
+        db.commit()
+        # Các object đã load có thể giữ trạng thái cũ
+        db.expire_all()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Lỗi khi chuyển trạng thái kỳ thanh toán: {str(e)}")
+
+    return {
+        "success": True,
+        "as_of": as_of.isoformat(),
+        **counts,
+        "tong_so_ky": sum(counts.values()),
+    }
+
+
+# Cột lịch sử mà lần cộng dồn đọc / ghi (đọc dạng tuple, ghi hàng loạt)
+_ACCRUAL_COLUMNS = ("Stt", "MaHD", "Ngay", "SoTien", "TienDaTra", "NoiDung", "TrangThaiNgayThanhToan")
+
+
+def _load_accrual_rows(db: Session, ma_hds: List[str], window_start: date, window_end: date) -> Dict[str, List[dict]]:
+    """
+    Các dòng lịch sử mà lần cộng dồn cần, cho nhiều hợp đồng trong vài truy vấn
+
+    Gồm các kỳ còn nợ (mọi ngày) và mọi kỳ có ngày trong [window_start, window_end].
+
+    Returns:
+        Dict MaHD -> danh sách dòng (dict) theo thứ tự Stt
+    """
+    columns = [getattr(LichSuTraLai, name) for name in _ACCRUAL_COLUMNS]
+    rows_by_contract: Dict[str, List[dict]] = {ma_hd: [] for ma_hd in ma_hds}
+    # Chia nhỏ danh sách IN (SQLite giới hạn số tham số mỗi câu lệnh)
+    for start in range(0, len(ma_hds), 500):
+        rows = db.execute(
+            select(*columns)
+            .where(
+                LichSuTraLai.MaHD.in_(ma_hds[start:start + 500]),
+                or_(
+                    and_(LichSuTraLai.SoTien > LichSuTraLai.TienDaTra, LichSuTraLai.SoTien != 0),
+                    LichSuTraLai.Ngay.between(window_start, window_end),
+                ),
+            )
+            .order_by(LichSuTraLai.Stt)
+        )
+        for row in rows:
+            rows_by_contract[row.MaHD].append(dict(zip(_ACCRUAL_COLUMNS, row)))
+    return rows_by_contract
+
+
+def _day_status(ngay: date, as_of: date) -> str:
+    """Trạng thái ngày của kỳ vừa cộng dồn: kỳ của ngày đã qua (chạy bù) là quá hạn"""
+    if ngay < as_of:
+        return TrangThaiNgayThanhToan.QUA_HAN.value
+    return TrangThaiNgayThanhToan.DEN_HAN.value
+
+
+def _carry_unpaid(rows: List[dict], changed: Set[int]) -> tuple:
+    """
+    Dồn các kỳ còn nợ sang kỳ mới: SoTien = 0, quá hạn, bỏ phần "(cộng dồn ...)"
+
+    Returns:
+        (tổng số tiền còn nợ, số kỳ còn nợ)
+    """
+    unpaid = [row for row in rows if row["SoTien"] > row["TienDaTra"] and row["SoTien"] != 0]
+    tong_tien_chua_tra = 0
+    for row in unpaid:
+        tong_tien_chua_tra += row["SoTien"] - row["TienDaTra"]
+        row["SoTien"] = 0
+        row["TrangThaiNgayThanhToan"] = TrangThaiNgayThanhToan.QUA_HAN.value
+        if "kỳ" in row["NoiDung"]:
+            ky_so = row["NoiDung"].split("kỳ ")[1].split(" ")[0]
+            row["NoiDung"] = f"Trả lãi kỳ {ky_so}"
+        changed.add(id(row))
+    return tong_tien_chua_tra, len(unpaid)
+
+
+def _new_period_row(rows: List[dict], ma_hd: str, ngay: date, so_tien: int, noi_dung: str, as_of: date) -> dict:
+    """Thêm kỳ mới (chưa ghi) vào danh sách dòng của hợp đồng"""
+    row = {
+        "Stt": None,
+        "MaHD": ma_hd,
+        "Ngay": ngay,
+        "SoTien": so_tien,
+        "TienDaTra": 0,
+        "NoiDung": noi_dung,
+        "TrangThaiNgayThanhToan": _day_status(ngay, as_of),
+        "TrangThaiThanhToan": TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+    }
+    rows.append(row)
+    return row
+
+
+def _accrue_tin_chap(contract: TinChap, rows: List[dict], due_dates: List[date], as_of: date, changed: Set[int]) -> int:
+    """
+    Cộng dồn các kỳ đến hạn của một hợp đồng Tín Chấp (trong bộ nhớ)
+
+    Mỗi ngày đến hạn chưa có lịch sử: dồn mọi kỳ còn nợ vào một kỳ mới
+    (LaiSuat + số tiền còn nợ). Returns: số kỳ mới.
+    """
+    created = 0
+    for ngay in due_dates:
+        if any(row["Ngay"] == ngay for row in rows):
+            continue  # Đã có lịch sử cho ngày này, bỏ qua
+        tong_tien_chua_tra, so_ky_chua_tra = _carry_unpaid(rows, changed)
+        _new_period_row(
+            rows, contract.MaHD, ngay,
+            so_tien=contract.LaiSuat + tong_tien_chua_tra,
+            noi_dung=f"Trả lãi kỳ {so_ky_chua_tra + 1} (cộng dồn {tong_tien_chua_tra})",
+            as_of=as_of,
+        )
+        created += 1
+    return created
+
+
+def _accrue_tra_gop(contract: TraGop, rows: List[dict], due_dates: List[date], as_of: date, changed: Set[int]) -> tuple:
+    """
+    Cộng dồn các kỳ đến hạn của một hợp đồng Trả Góp (trong bộ nhớ)
+
+    - Ngày đến hạn đã có kỳ trong lịch: dồn số còn nợ của kỳ trước (Ngay - KyDong)
+      vào kỳ này, không tạo mới
+    - Ngày đến hạn ngoài lịch (đã quá số lần trả): dồn mọi kỳ còn nợ vào một kỳ mới
+
+    Returns:
+        (số kỳ mới, số kỳ được cập nhật)
+    """
+    created = updated = 0
+    so_tien_moi_ky = (contract.SoTienVay + contract.LaiSuat) // contract.SoLanTra
+    for ngay in due_dates:
+        ky_den_han = next((row for row in rows if row["Ngay"] == ngay), None)
+        if ky_den_han is None:
+            tong_tien_chua_tra, so_ky_chua_tra = _carry_unpaid(rows, changed)
+            _new_period_row(
+                rows, contract.MaHD, ngay,
+                so_tien=tong_tien_chua_tra,
+                noi_dung=f"Trả lãi kỳ {so_ky_chua_tra + 1} (cộng dồn {tong_tien_chua_tra})",
+                as_of=as_of,
+            )
+            created += 1
+            continue
+
+        ngay_ky_truoc = ngay - timedelta(days=contract.KyDong)
+        ky_truoc = next((row for row in rows if row["Ngay"] == ngay_ky_truoc), None)
+        if ky_truoc is None:
+            continue
+        tong_tien_chua_tra = ky_truoc["SoTien"] - ky_truoc["TienDaTra"]
+        ky_truoc["SoTien"] = 0
+        ky_truoc["TrangThaiNgayThanhToan"] = TrangThaiNgayThanhToan.QUA_HAN.value
+        ky_den_han["SoTien"] = so_tien_moi_ky + tong_tien_chua_tra
+        ky_den_han["TrangThaiNgayThanhToan"] = _day_status(ngay, as_of)
+        if "kỳ" in ky_truoc["NoiDung"]:
+            ky_so = int(ky_truoc["NoiDung"].split("kỳ ")[1].split(" ")[0]) + 1
+            ky_den_han["NoiDung"] = f"Trả lãi kỳ {ky_so} (cộng dồn {tong_tien_chua_tra})"
+        changed.update((id(ky_truoc), id(ky_den_han)))
+        updated += 1
+    return created, updated
+
+
+def _due_dates(contract, from_date: date, to_date: date) -> List[date]:
+    """Ngày đến hạn của các kỳ chưa tính trong [from_date, to_date] của hợp đồng"""
+    last_ky = periods_due_by(contract.NgayVay, contract.KyDong, to_date)
+    due_dates = []
+    for ky in range(contract.KyHienTai + 1, last_ky + 1):
+        ngay = period_due_date(contract.NgayVay, contract.KyDong, ky)
+        if ngay >= from_date:
+            due_dates.append(ngay)
+    return due_dates
+
+
+def auto_create_lich_su(db: Session, from_date: Optional[date] = None, to_date: Optional[date] = None) -> dict:
     """
     Tự động cập nhật lịch sử trả lãi cho tất cả hợp đồng chưa thanh toán
     
     Logic:
-    - Chỉ xử lý hợp đồng chưa có trạng thái "DA_TAT_TOAN"
-    - Kiểm tra ngày hôm nay đã có trong bảng lịch_su_tra_lai chưa
-    - Tín Chấp: Cộng dồn số tiền chưa trả vào kỳ mới, tạo bản ghi mới
-    - Trả Góp: Cập nhật kỳ có ngày trùng với hôm nay, không tạo mới
+    - Chuyển trạng thái ngày của mọi kỳ theo to_date (transition_payment_statuses)
+    - Chỉ xử lý hợp đồng chưa có trạng thái "DA_TAT_TOAN" có ngày đến hạn tiếp
+      theo (NgayDenHanTiepTheo) <= to_date: một phép tra chỉ mục
+    - Với mỗi kỳ chưa tính có ngày đến hạn trong [from_date, to_date], theo thứ tự ngày:
+      - Tín Chấp: Cộng dồn số tiền chưa trả vào kỳ mới, tạo bản ghi mới
+      - Trả Góp: Cập nhật kỳ có ngày trùng với ngày đến hạn, không tạo mới
+    - Lịch sử cần dùng được đọc một lần cho mọi hợp đồng, tính trong bộ nhớ
+      rồi ghi bằng INSERT / UPDATE hàng loạt (chạy bù nhiều ngày vẫn chỉ một lượt)
+    - Sau khi xử lý, ngày đến hạn tiếp theo được dời sang kỳ sau to_date
+      (kỳ đến hạn trước from_date chỉ được dời, không cộng dồn)
+    
+    Args:
+        db: Database session
+        from_date: Ngày đầu của đợt chạy bù (mặc định: to_date, chỉ xử lý một ngày)
+        to_date: Ngày cuối (mặc định: hôm nay theo app.core.clock)
     
     Returns:
         dict: Thông tin kết quả xử lý
     """
+    to_date = to_date or clock.today()
+    from_date = from_date or to_date
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="from_date phải trước hoặc bằng to_date")
+
     try:
-        # date_now = date.today()
-        # test với ngày 13/10/2025
-        date_now = date(2025, 10, 17)
-        contracts_processed = 0
         records_created = 0
         records_updated = 0
         
-        # 1. Lấy tất cả hợp đồng Tín Chấp chưa thanh toán
-        tin_chap_contracts = db.execute(select(TinChap).where(TinChap.TrangThai != "DA_TAT_TOAN")).scalars().all()
-        # 2. Lấy tất cả hợp đồng Trả Góp chưa thanh toán  
-        tra_gop_contracts = db.execute(select(TraGop).where(TraGop.TrangThai != "DA_TAT_TOAN")).scalars().all()
-        # 3. Xử lý Tín Chấp
-        for contract in tin_chap_contracts:
-            ma_hd = contract.MaHD
-            # Kiểm tra hôm nay có phải là ngày đóng lãi không
-            ky_dong = contract.KyDong
-            if (date_now.day - contract.NgayVay.day) % ky_dong != 0:
-                print(ma_hd)
-                continue
-            
-            # Kiểm tra đã có lịch sử cho ngày hôm nay chưa
-            existing_today = db.query(LichSuTraLai).filter(
-                LichSuTraLai.MaHD == ma_hd,
-                LichSuTraLai.Ngay == date_now
-            ).first()
-            
-            if existing_today:
-                continue  # Đã có lịch sử cho hôm nay, bỏ qua
-            
-            # Tính số tiền cộng dồn từ tất cả các kỳ chưa trả
-            tong_tien_chua_tra = 0
-            lich_sus_chua_tra = db.query(LichSuTraLai).filter(
-                LichSuTraLai.MaHD == ma_hd,
-                LichSuTraLai.SoTien > LichSuTraLai.TienDaTra,
-                LichSuTraLai.SoTien != 0
-            ).all()
-            
-            # Cập nhật tất cả các kỳ cũ: SoTien = 0, TrangThaiNgayThanhToan = QUA_HAN
-            for ls in lich_sus_chua_tra:
-                tong_tien_chua_tra += (ls.SoTien - ls.TienDaTra)
-                ls.SoTien = 0
-                ls.TrangThaiNgayThanhToan = TrangThaiNgayThanhToan.QUA_HAN.value
-                # Cập nhật NoiDung để bỏ phần cộng dồn
-                if "kỳ" in ls.NoiDung:
-                    ky_so = ls.NoiDung.split("kỳ ")[1].split(" ")[0]
-                    ls.NoiDung = f"Trả lãi kỳ {ky_so}"
-
-
-            # Tạo bản ghi mới cho hôm nay
-            so_tien_ky_moi = contract.LaiSuat + tong_tien_chua_tra
-            
-            db_lich_su = LichSuTraLai(
-                MaHD=ma_hd,
-                Ngay=date_now,
-                SoTien=so_tien_ky_moi,
-                NoiDung=f"Trả lãi kỳ {len(lich_sus_chua_tra) + 1} (cộng dồn {tong_tien_chua_tra})",
-                TrangThaiThanhToan=TrangThaiThanhToan.CHUA_THANH_TOAN.value,
-                TrangThaiNgayThanhToan=TrangThaiNgayThanhToan.DEN_HAN.value,
-                TienDaTra=0
-            )
-            db.add(db_lich_su)
-            records_created += 1
+        # 0. Chuyển trạng thái ngày của toàn bộ các kỳ theo to_date (UPDATE hàng loạt)
+        status_transitions = _apply_status_transitions(db, to_date)
         
-        # 4. Xử lý Trả Góp
-        for contract in tra_gop_contracts:
-            ma_hd = contract.MaHD
-            ky_dong = contract.KyDong
-            
-            # Kiểm tra ngày hôm nay có phải là ngày đóng lãi không
-            check_ngay_dong_lai = db.query(LichSuTraLai).filter(
-                LichSuTraLai.MaHD == ma_hd,
-                LichSuTraLai.Ngay == date_now
-            ).first()
-            print(check_ngay_dong_lai)
-            if not check_ngay_dong_lai:
-                continue
-                
-            # Tìm kỳ có trạng thái "Đến hạn trả lãi" (kỳ cần cập nhật)
-            latest_ky = db.query(LichSuTraLai).filter(
-                LichSuTraLai.MaHD == ma_hd,
-                LichSuTraLai.Ngay == date_now-timedelta(days=ky_dong)
-            ).first()
-            
-            if not latest_ky:
-                continue
-                
-            # Lưu số tiền gốc trước khi đặt = 0
-            so_tien_goc = latest_ky.SoTien
-            tong_tien_chua_tra = so_tien_goc - latest_ky.TienDaTra
-            
-            # Cập nhật kỳ cũ: SoTien = 0, TrangThaiNgayThanhToan = QUA_HAN
-            latest_ky.SoTien = 0
-            latest_ky.TrangThaiNgayThanhToan = TrangThaiNgayThanhToan.QUA_HAN.value
-            
-            # Cập nhật kỳ hôm nay với số tiền cộng dồn
-            so_tien_moi_ky = (contract.SoTienVay + contract.LaiSuat) // contract.SoLanTra
-            check_ngay_dong_lai.SoTien = so_tien_moi_ky + tong_tien_chua_tra
-            check_ngay_dong_lai.TrangThaiNgayThanhToan = TrangThaiNgayThanhToan.DEN_HAN.value
-            
-            # Cập nhật NoiDung
-            if "kỳ" in latest_ky.NoiDung:
-                ky_so = int(latest_ky.NoiDung.split('kỳ ')[1].split(' ')[0]) + 1
-                check_ngay_dong_lai.NoiDung = f"Trả lãi kỳ {ky_so} (cộng dồn {tong_tien_chua_tra})"
-            
-            records_updated += 1
-        
-        # 4.1. Xử lý Trả Góp - Tạo kỳ mới khi quá hạn
-        for contract in tra_gop_contracts:
-            ma_hd = contract.MaHD
-            # Kiểm tra hôm nay có phải là ngày đóng lãi không
-            ky_dong = contract.KyDong
-            if (date_now.day - contract.NgayVay.day) % ky_dong != 0:
-                print(ma_hd)
-                continue
-            
-            # Kiểm tra đã có lịch sử cho ngày hôm nay chưa
-            existing_today = db.query(LichSuTraLai).filter(
-                LichSuTraLai.MaHD == ma_hd,
-                LichSuTraLai.Ngay == date_now
-            ).first()
-            
-            if existing_today:
-                continue  # Đã có lịch sử cho hôm nay, bỏ qua
-            
-            # Tính số tiền cộng dồn từ tất cả các kỳ chưa trả
-            tong_tien_chua_tra = 0
-            lich_sus_chua_tra = db.query(LichSuTraLai).filter(
-                LichSuTraLai.MaHD == ma_hd,
-                LichSuTraLai.SoTien > LichSuTraLai.TienDaTra,
-                LichSuTraLai.SoTien != 0
-            ).all()
-            
-            # Cập nhật tất cả các kỳ cũ: SoTien = 0, TrangThaiNgayThanhToan = QUA_HAN
-            for ls in lich_sus_chua_tra:
-                # Tính số tiền chưa trả TRƯỚC KHI set SoTien = 0
-                so_tien_chua_tra = ls.SoTien - ls.TienDaTra
-                if so_tien_chua_tra > 0:  # Chỉ cộng dồn nếu thực sự chưa trả đủ
-                    tong_tien_chua_tra += so_tien_chua_tra
-                # Sau đó mới set SoTien = 0
-                ls.SoTien = 0
-                ls.TrangThaiNgayThanhToan = TrangThaiNgayThanhToan.QUA_HAN.value
-                # Cập nhật NoiDung để bỏ phần cộng dồn
-                if "kỳ" in ls.NoiDung:
-                    ky_so = ls.NoiDung.split("kỳ ")[1].split(" ")[0]
-                    ls.NoiDung = f"Trả lãi kỳ {ky_so}"
-
-            # Tạo bản ghi mới cho hôm nay
-            so_tien_ky_moi = so_tien_chua_tra
-            
-            db_lich_su = LichSuTraLai(
-                MaHD=ma_hd,
-                Ngay=date_now,
-                SoTien=so_tien_ky_moi,
-                NoiDung=f"Trả lãi kỳ {len(lich_sus_chua_tra) + 1} (cộng dồn {tong_tien_chua_tra})",
-                TrangThaiThanhToan=TrangThaiThanhToan.CHUA_THANH_TOAN.value,
-                TrangThaiNgayThanhToan=TrangThaiNgayThanhToan.DEN_HAN.value,
-                TienDaTra=0
-            )
-            db.add(db_lich_su)
-            records_created += 1
+        # 1. Các hợp đồng Tín Chấp / Trả Góp chưa thanh toán đã đến hạn
+        tin_chap_contracts = db.execute(select(TinChap).where(
+            TinChap.NgayDenHanTiepTheo <= to_date,
+            TinChap.TrangThai != TrangThaiThanhToan.DA_TAT_TOAN.value,
+        )).scalars().all()
+        tra_gop_contracts = db.execute(select(TraGop).where(
+            TraGop.NgayDenHanTiepTheo <= to_date,
+            TraGop.TrangThai != TrangThaiThanhToan.DA_TAT_TOAN.value,
+        )).scalars().all()
+        contracts = list(tin_chap_contracts) + list(tra_gop_contracts)
+        due_dates = {contract.MaHD: _due_dates(contract, from_date, to_date) for contract in contracts}
+        pending = [contract for contract in contracts if due_dates[contract.MaHD]]
+
+        # 2. Đọc lịch sử cần dùng cho mọi hợp đồng đến hạn
+        # Trả Góp cần thêm kỳ trước ngày đến hạn đầu tiên (Ngay - KyDong)
+        ky_dong_max = max((contract.KyDong for contract in pending), default=0)
+        rows_by_contract = _load_accrual_rows(
+            db, [contract.MaHD for contract in pending], from_date - timedelta(days=ky_dong_max), to_date
+        )
+
+        # 3. Cộng dồn trong bộ nhớ, theo thứ tự ngày của từng hợp đồng
+        changed: Set[int] = set()
+        for contract in pending:
+            rows = rows_by_contract[contract.MaHD]
+            if isinstance(contract, TinChap):
+                records_created += _accrue_tin_chap(contract, rows, due_dates[contract.MaHD], to_date, changed)
+            else:
+                created, updated = _accrue_tra_gop(contract, rows, due_dates[contract.MaHD], to_date, changed)
+                records_created += created
+                records_updated += updated
+
+        # 4. Ghi hàng loạt: UPDATE theo khóa chính cho kỳ cũ, INSERT cho kỳ mới
+        new_rows, updated_rows = [], []
+        for rows in rows_by_contract.values():
+            for row in rows:
+                if row["Stt"] is None:
+                    new_rows.append({key: value for key, value in row.items() if key != "Stt"})
+                elif id(row) in changed:
+                    updated_rows.append({
+                        "Stt": row["Stt"],
+                        "SoTien": row["SoTien"],
+                        "NoiDung": row["NoiDung"],
+                        "TrangThaiNgayThanhToan": row["TrangThaiNgayThanhToan"],
+                    })
+        if updated_rows:
+            db.execute(update(LichSuTraLai), updated_rows)
+        if new_rows:
+            db.execute(insert(LichSuTraLai), new_rows)
+        
+        # 5. Dời ngày đến hạn tiếp theo sang kỳ sau to_date
+        for contract in contracts:
+            set_current_period(contract, periods_due_by(contract.NgayVay, contract.KyDong, to_date))
         
-        # 5. Commit tất cả thay đổi
         db.commit()
-        contracts_processed = len(tin_chap_contracts) + len(tra_gop_contracts)
+        contracts_processed = len(contracts)
         
         return {
             "success": True,
             "message": f"Đã xử lý {contracts_processed} hợp đồng",
+            "from_date": from_date.isoformat(),
+            "to_date": to_date.isoformat(),
             "contracts_processed": contracts_processed,
             "records_created": records_created,
-            "records_updated": records_updated
+            "records_updated": records_updated,
+            "status_transitions": status_transitions
         }
         
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Lỗi khi tự động cập nhật lịch sử: {str(e)}")
 
-def pay_lich_su(db: Session, stt: int, so_tien: int) -> dict:
+def _is_payable(db_lich_su: LichSuTraLai) -> bool:
     """
-    Thanh toán lịch sử trả lãi theo chuẩn logic:
-    - Chỉ cho phép thanh toán kỳ "Đến hạn" (DEN_HAN)
-    - Không cho phép trả vượt quá số tiền còn lại của kỳ
-    - Cập nhật trạng thái kỳ: DONG_DU hoặc THANH_TOAN_MOT_PHAN
-    - Cập nhật trạng thái HĐ: nếu còn kỳ chưa trả đủ => THANH_TOAN_MOT_PHAN; nếu tất cả đã đủ => DA_TAT_TOAN
+    Kỳ thanh toán được: Đến hạn, hoặc Quá hạn nhưng còn nợ (trả trễ)
+
+    Kỳ Quá hạn đã cộng dồn sang kỳ sau có SoTien = 0 nên không còn gì để trả.
+    """
+    if db_lich_su.TrangThaiNgayThanhToan == TrangThaiNgayThanhToan.DEN_HAN.value:
+        return True
+    return (
+        db_lich_su.TrangThaiNgayThanhToan == TrangThaiNgayThanhToan.QUA_HAN.value
+        and db_lich_su.SoTien > db_lich_su.TienDaTra
+    )
+
+
+def _apply_payment(db: Session, db_lich_su: LichSuTraLai, so_tien: int, nguon: NguonThanhToan) -> int:
+    """
+    Áp dụng một khoản thanh toán vào một kỳ và ghi vào sổ thu tiền (chưa commit)
+
+    Raises:
+        HTTPException: Nếu khoản thanh toán không hợp lệ
+
+    Returns:
+        Số tiền thực tế được ghi nhận cho kỳ
     """
     if so_tien <= 0:
         raise HTTPException(status_code=400, detail="Số tiền thanh toán phải > 0")
-
-    db_lich_su = get_lich_su(db, stt)
-    if not db_lich_su:
-        raise HTTPException(status_code=404, detail="Không tìm thấy bản ghi lịch sử")
-    if db_lich_su.TrangThaiNgayThanhToan != TrangThaiNgayThanhToan.DEN_HAN.value:
+    if not _is_payable(db_lich_su):
         raise HTTPException(status_code=400, detail="Chỉ được thanh toán kỳ đến hạn")
 
     con_lai_ky = max(0, db_lich_su.SoTien - db_lich_su.TienDaTra)
@@ -547,27 +832,76 @@ def pay_lich_su(db: Session, stt: int, so_tien: int) -> dict:
 
     thanh_toan_thuc_te = min(so_tien, con_lai_ky)
     db_lich_su.TienDaTra += thanh_toan_thuc_te
+    record_payment(db, db_lich_su.MaHD, thanh_toan_thuc_te, nguon, stt=db_lich_su.Stt)
     if db_lich_su.TienDaTra >= db_lich_su.SoTien:
         db_lich_su.TrangThaiThanhToan = TrangThaiThanhToan.DONG_DU.value
     else:
         db_lich_su.TrangThaiThanhToan = TrangThaiThanhToan.THANH_TOAN_MOT_PHAN.value
+    return thanh_toan_thuc_te
 
-    ma_hd = db_lich_su.MaHD
-    # Cập nhật trạng thái hợp đồng dựa trên tổng còn nợ trong lịch sử
-    any_unpaid = db.query(LichSuTraLai).filter(
-        LichSuTraLai.MaHD == ma_hd,
-        LichSuTraLai.SoTien > LichSuTraLai.TienDaTra
-    ).first() is not None
 
-    if "TG" in ma_hd:
-        contract = db.query(TraGop).filter(TraGop.MaHD == ma_hd).first()
-    else:
-        contract = db.query(TinChap).filter(TinChap.MaHD == ma_hd).first()
+def _update_contract_statuses(db: Session, ma_hds: Set[str]) -> Dict[str, str]:
+    """
+    Cập nhật trạng thái các hợp đồng sau khi thanh toán (chưa commit)
+
+    Nếu còn kỳ chưa trả đủ => THANH_TOAN_MOT_PHAN; nếu tất cả đã đủ => DA_TAT_TOAN.
+    Mỗi nhóm hợp đồng chỉ tốn một truy vấn, bất kể số lượng hợp đồng.
 
-    if contract:
+    Returns:
+        dict: MaHD -> trạng thái mới (chỉ các hợp đồng tồn tại)
+    """
+    if not ma_hds:
+        return {}
+
+    # Ghi các thay đổi kỳ thanh toán xuống trước khi kiểm tra còn nợ
+    db.flush()
+    unpaid_ids = {
+        row[0] for row in db.query(LichSuTraLai.MaHD).filter(
+            LichSuTraLai.MaHD.in_(ma_hds),
+            LichSuTraLai.SoTien > LichSuTraLai.TienDaTra
+        ).distinct().all()
+    }
+
+    contracts = []
+    tg_ids = [ma_hd for ma_hd in ma_hds if "TG" in ma_hd]
+    tc_ids = [ma_hd for ma_hd in ma_hds if "TG" not in ma_hd]
+    if tg_ids:
+        contracts += db.query(TraGop).filter(TraGop.MaHD.in_(tg_ids)).all()
+    if tc_ids:
+        contracts += db.query(TinChap).filter(TinChap.MaHD.in_(tc_ids)).all()
+
+    statuses = {}
+    for contract in contracts:
         contract.TrangThai = (
-            TrangThaiThanhToan.THANH_TOAN_MOT_PHAN.value if any_unpaid else TrangThaiThanhToan.DA_TAT_TOAN.value
+            TrangThaiThanhToan.THANH_TOAN_MOT_PHAN.value
+            if contract.MaHD in unpaid_ids
+            else TrangThaiThanhToan.DA_TAT_TOAN.value
         )
+        refresh_due_date(contract, clock.today())
+        statuses[contract.MaHD] = contract.TrangThai
+    return statuses
+
+
+def pay_lich_su(db: Session, stt: int, so_tien: int) -> dict:
+    """
+    Thanh toán lịch sử trả lãi theo chuẩn logic:
+    - Chỉ cho phép thanh toán kỳ "Đến hạn" (DEN_HAN), hoặc kỳ "Quá hạn" còn nợ (trả trễ)
+    - Không cho phép trả vượt quá số tiền còn lại của kỳ
+    - Cập nhật trạng thái kỳ: DONG_DU hoặc THANH_TOAN_MOT_PHAN
+    - Cập nhật trạng thái HĐ: nếu còn kỳ chưa trả đủ => THANH_TOAN_MOT_PHAN; nếu tất cả đã đủ => DA_TAT_TOAN
+    """
+    if so_tien <= 0:
+        raise HTTPException(status_code=400, detail="Số tiền thanh toán phải > 0")
+
+    db_lich_su = get_lich_su(db, stt)
+    if not db_lich_su:
+        raise HTTPException(status_code=404, detail="Không tìm thấy bản ghi lịch sử")
+
+    thanh_toan_thuc_te = _apply_payment(db, db_lich_su, so_tien, NguonThanhToan.PAY)
+
+    ma_hd = db_lich_su.MaHD
+    # Cập nhật trạng thái hợp đồng dựa trên tổng còn nợ trong lịch sử
+    statuses = _update_contract_statuses(db, {ma_hd})
 
     db.commit()
 
@@ -579,16 +913,99 @@ def pay_lich_su(db: Session, stt: int, so_tien: int) -> dict:
         "so_tien_da_tra_ky": db_lich_su.TienDaTra,
         "so_tien_ky": db_lich_su.SoTien,
         "trang_thai_thanh_toan_ky": db_lich_su.TrangThaiThanhToan,
-        "trang_thai_hop_dong": contract.TrangThai if contract else None,
+        "trang_thai_hop_dong": statuses.get(ma_hd),
     }
 
 
+def pay_lich_su_batch(db: Session, items: List[LichSuTraLaiPayItem]) -> dict:
+    """
+    Thanh toán nhiều kỳ trong một transaction (chốt thu cuối ngày)
+
+    - Đọc tất cả các kỳ liên quan bằng một truy vấn
+    - Mỗi khoản áp dụng cùng quy tắc với pay_lich_su; khoản lỗi được báo lỗi
+      riêng và không ảnh hưởng các khoản khác
+    - Nhiều khoản cho cùng một kỳ được áp dụng lần lượt theo thứ tự gửi lên
+    - Trạng thái mỗi hợp đồng bị ảnh hưởng được cập nhật một lần, commit một lần
+
+    Args:
+        db: Database session
+        items: Danh sách (stt, so_tien)
+
+    Returns:
+        dict: Tổng hợp và kết quả từng khoản theo thứ tự gửi lên
+    """
+    try:
+        stts = {item.stt for item in items}
+        lich_sus = {
+            ls.Stt: ls for ls in db.query(LichSuTraLai).filter(LichSuTraLai.Stt.in_(stts)).all()
+        } if stts else {}
+
+        results = []
+        touched_contracts = set()
+        for item in items:
+            db_lich_su = lich_sus.get(item.stt)
+            if not db_lich_su:
+                results.append({
+                    "success": False,
+                    "stt": item.stt,
+                    "status_code": 404,
+                    "error": "Không tìm thấy bản ghi lịch sử",
+                })
+                continue
+
+            try:
+                thanh_toan_thuc_te = _apply_payment(db, db_lich_su, item.so_tien, NguonThanhToan.PAY_BATCH)
+            except HTTPException as e:
+                results.append({
+                    "success": False,
+                    "stt": item.stt,
+                    "ma_hd": db_lich_su.MaHD,
+                    "status_code": e.status_code,
+                    "error": e.detail,
+                })
+                continue
+
+            touched_contracts.add(db_lich_su.MaHD)
+            results.append({
+                "success": True,
+                "stt": item.stt,
+                "ma_hd": db_lich_su.MaHD,
+                "da_thanh_toan": thanh_toan_thuc_te,
+                "so_tien_da_tra_ky": db_lich_su.TienDaTra,
+                "so_tien_ky": db_lich_su.SoTien,
+                "trang_thai_thanh_toan_ky": db_lich_su.TrangThaiThanhToan,
+            })
+
+        statuses = _update_contract_statuses(db, touched_contracts)
+        db.commit()
+
+        for result in results:
+            if result["success"]:
+                result["trang_thai_hop_dong"] = statuses.get(result["ma_hd"])
+
+        succeeded = [r for r in results if r["success"]]
+        return {
+            "success": True,
+            "total": len(results),
+            "succeeded": len(succeeded),
+            "failed": len(results) - len(succeeded),
+            "tong_tien_da_thanh_toan": sum(r["da_thanh_toan"] for r in succeeded),
+            "contracts_updated": statuses,
+            "results": results,
+        }
+
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Lỗi khi thanh toán hàng loạt: {str(e)}")
+
+
 def tat_toan_hop_dong(db: Session, ma_hd: str) -> dict:
     """
     Tất toán hợp đồng cho cả Trả Góp và Tín Chấp.
     - Đặt trạng thái hợp đồng => DA_TAT_TOAN
     - Cập nhật tất cả lịch sử trả lãi liên quan:
-        + Nếu TrangThaiNgayThanhToan != Quá hạn => đánh Đóng đủ và điền đủ số tiền
+        + Nếu TrangThaiNgayThanhToan != Quá hạn, hoặc kỳ quá hạn còn nợ
+          => đánh Đóng đủ và điền đủ số tiền
     """
     # 1. Xác định loại hợp đồng
     contract = None
@@ -607,14 +1024,16 @@ def tat_toan_hop_dong(db: Session, ma_hd: str) -> dict:
 
     # 2. Cập nhật trạng thái hợp đồng
     contract.TrangThai = TrangThaiThanhToan.DA_TAT_TOAN.value
+    refresh_due_date(contract, clock.today())
 
     # 3. Cập nhật lịch sử liên quan
     lich_sus = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == ma_hd).all()
     updated = 0
     for ls in lich_sus:
-        # Chỉ đóng đủ cho các kỳ không phải quá hạn
-        if ls.TrangThaiNgayThanhToan != TrangThaiNgayThanhToan.QUA_HAN.value:
+        # Bỏ qua các kỳ quá hạn đã cộng dồn sang kỳ sau
+        if ls.TrangThaiNgayThanhToan != TrangThaiNgayThanhToan.QUA_HAN.value or _is_payable(ls):
             if ls.TienDaTra < ls.SoTien:
+                record_payment(db, ma_hd, ls.SoTien - ls.TienDaTra, NguonThanhToan.TAT_TOAN, stt=ls.Stt)
                 ls.TienDaTra = ls.SoTien
             ls.TrangThaiThanhToan = TrangThaiThanhToan.DONG_DU.value
             updated += 1
@@ -1,95 +1,112 @@
+from itertools import groupby
+
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.models.tin_chap import TinChap
 from app.models.lich_su_tra_lai import LichSuTraLai
 from app.models.tra_gop import TraGop
 from app.schemas.no_phai_thu import NoPhaiThuResponse
-from app.schemas.lich_su_tra_lai import LichSuTraLai as LichSuTraLaiSchema
-from typing import List
-from datetime import date, timedelta
+from app.utils.serialization import LICH_SU_FIELDS
+from typing import Dict, List
+from app.core import clock
 from app.core.enums import TrangThaiThanhToan
 
+# Số dòng lịch sử đọc mỗi lô (yield_per)
+_STREAM_BATCH_SIZE = 1000
+
+_CONTRACT_COLUMNS = ("MaHD", "HoTen", "NgayVay", "SoTienVay", "KyDong", "LaiSuat", "TrangThai")
+
+
+def _load_active_contracts(db: Session, ma_hds: List[str]) -> Dict[str, tuple]:
+    """
+    Thông tin các hợp đồng chưa tất toán (tuple, không load ORM object)
+
+    Returns:
+        Dict MaHD -> (loại "tc"/"tg", Row các cột hợp đồng)
+    """
+    contracts: Dict[str, tuple] = {}
+    for model, kind in ((TinChap, "tc"), (TraGop, "tg")):
+        columns = [getattr(model, name) for name in _CONTRACT_COLUMNS]
+        columns.append(model.SoTienTraGoc if kind == "tc" else model.SoLanTra)
+        pending = [ma_hd for ma_hd in ma_hds if ma_hd not in contracts]
+        # Chia nhỏ danh sách IN (SQLite giới hạn số tham số mỗi câu lệnh)
+        for start in range(0, len(pending), 500):
+            rows = db.execute(
+                select(*columns).where(
+                    model.MaHD.in_(pending[start:start + 500]),
+                    model.TrangThai != TrangThaiThanhToan.DA_TAT_TOAN.value,
+                )
+            )
+            for row in rows:
+                contracts[row.MaHD] = (kind, row)
+    return contracts
+
+
 def get_no_phai_thus(db: Session, time: str = "today") -> List[NoPhaiThuResponse]:
     try:
-        list_ma_hd_tc = db.query(TinChap.MaHD).filter(
-            TinChap.TrangThai != TrangThaiThanhToan.DA_TAT_TOAN.value
-        ).distinct().all()
-        list_ma_hd_tg = db.query(TraGop.MaHD).filter(
-            TraGop.TrangThai != TrangThaiThanhToan.DA_TAT_TOAN.value
-        ).distinct().all()
-        active_ids = {row[0] for row in list_ma_hd_tc} | {row[0] for row in list_ma_hd_tg}
-
+        today = clock.today()
         if time == "today":
-            list_ma_hd_in_lich_su_tra_lai = db.query(LichSuTraLai.MaHD).filter(
-                LichSuTraLai.Ngay == date.today()
-            ).distinct().all()
+            in_window = select(LichSuTraLai.MaHD).where(LichSuTraLai.Ngay == today)
         elif time == "all":
-            list_ma_hd_in_lich_su_tra_lai = db.query(LichSuTraLai.MaHD).distinct().all()
+            in_window = select(LichSuTraLai.MaHD)
         else:
             return []
-        
-        # Intersection: active contracts that have history in the selected window
-        in_history_ids = {row[0] for row in list_ma_hd_in_lich_su_tra_lai}
-        target_ids = sorted(active_ids & in_history_ids)
 
-        results: List[NoPhaiThuResponse] = []
-        for ma_hd in target_ids:
-            # Determine contract type (TinChap or TraGop)
-            tc = db.query(TinChap).filter(TinChap.MaHD == ma_hd).first()
-            tg = None if tc else db.query(TraGop).filter(TraGop.MaHD == ma_hd).first()
+        # Active contracts that have history in the selected window
+        window_ids = sorted(db.execute(in_window.distinct()).scalars())
+        contracts = _load_active_contracts(db, window_ids)
+        if not contracts:
+            return []
 
-            if not tc and not tg:
-                continue
+        # Lịch sử của các hợp đồng đó: đọc tuple theo lô, sắp theo (MaHD, Stt)
+        # để gom từng hợp đồng một mà không giữ toàn bộ bảng trong bộ nhớ
+        history_columns = [getattr(LichSuTraLai, field) for field in LICH_SU_FIELDS]
+        history_rows = db.execute(
+            select(*history_columns)
+            .where(LichSuTraLai.MaHD.in_(in_window))
+            .order_by(LichSuTraLai.MaHD, LichSuTraLai.Stt)
+            .execution_options(yield_per=_STREAM_BATCH_SIZE)
+        )
 
-            contract = tc if tc else tg
+        results: List[NoPhaiThuResponse] = []
+        for ma_hd, rows in groupby(history_rows, key=lambda row: row.MaHD):
+            if ma_hd not in contracts:
+                continue
+            kind, contract = contracts[ma_hd]
 
-            # Fetch history
-            lich_sus = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == ma_hd).all()
-            lich_su_schemas = [LichSuTraLaiSchema.model_validate(ls).model_dump() for ls in lich_sus]
+            lich_su_schemas = [dict(zip(LICH_SU_FIELDS, row)) for row in rows]
 
             # Compute today's payment aggregates only
-            today = date.today()
-            lai_da_tra = sum(ls.TienDaTra for ls in lich_sus if ls.Ngay == today)
-            total_due = sum(ls.SoTien for ls in lich_sus if ls.Ngay == today)
+            lai_da_tra = sum(ls["TienDaTra"] for ls in lich_su_schemas if ls["Ngay"] == today)
+            total_due = sum(ls["SoTien"] for ls in lich_su_schemas if ls["Ngay"] == today)
             lai_con_lai = max(0, total_due - lai_da_tra)
 
             # Derive fields depending on contract type
-            if tc:
-                so_tien_tra_goc = tc.SoTienTraGoc
-                trang_thai = tc.TrangThai
-                ho_ten = tc.HoTen
-                ngay_vay = tc.NgayVay
-                so_tien_vay = tc.SoTienVay
-                ky_dong = tc.KyDong
-                lai_suat = tc.LaiSuat
+            if kind == "tc":
+                so_tien_tra_goc = contract.SoTienTraGoc
                 # Tin chấp: Tổng = SoTienVay + LaiSuat * <số kỳ đóng>
-                so_ky_dong = len(lich_sus)
-                tong_tien_vay_va_lai = so_tien_vay + lai_suat * so_ky_dong
+                so_ky_dong = len(lich_su_schemas)
+                tong_tien_vay_va_lai = contract.SoTienVay + contract.LaiSuat * so_ky_dong
             else:
                 # TraGop: approximate principal per period; fallback if SoLanTra is 0
-                so_lan_tra = tg.SoLanTra if tg.SoLanTra else 0
-                so_tien_tra_goc = (tg.SoTienVay // so_lan_tra) if so_lan_tra else 0
-                trang_thai = tg.TrangThai
-                ho_ten = tg.HoTen
-                ngay_vay = tg.NgayVay
-                so_tien_vay = tg.SoTienVay
-                ky_dong = tg.KyDong
-                lai_suat = tg.LaiSuat
+                so_lan_tra = contract.SoLanTra if contract.SoLanTra else 0
+                so_tien_tra_goc = (contract.SoTienVay // so_lan_tra) if so_lan_tra else 0
                 # Trả góp: Tổng = SoTienVay + LaiSuat
-                tong_tien_vay_va_lai = so_tien_vay + lai_suat
+                tong_tien_vay_va_lai = contract.SoTienVay + contract.LaiSuat
 
             # Latest day status if available
-            trang_thai_ngay_thanh_toan = lich_sus[-1].TrangThaiNgayThanhToan if lich_sus else ""
+            trang_thai_ngay_thanh_toan = lich_su_schemas[-1]["TrangThaiNgayThanhToan"] if lich_su_schemas else ""
 
             results.append(
                 NoPhaiThuResponse(
                     MaHD=ma_hd,
-                    HoTen=ho_ten,
-                    NgayVay=ngay_vay,
-                    SoTienVay=so_tien_vay,
-                    KyDong=ky_dong,
-                    LaiSuat=lai_suat,
+                    HoTen=contract.HoTen,
+                    NgayVay=contract.NgayVay,
+                    SoTienVay=contract.SoTienVay,
+                    KyDong=contract.KyDong,
+                    LaiSuat=contract.LaiSuat,
                     SoTienTraGoc=so_tien_tra_goc,
-                    TrangThaiThanhToan=trang_thai,
+                    TrangThaiThanhToan=contract.TrangThai,
                     TrangThaiNgayThanhToan=trang_thai_ngay_thanh_toan,
                     LichSuTraLai=lich_su_schemas,
                     LaiDaTra=lai_da_tra,
@@ -100,4 +117,4 @@ def get_no_phai_thus(db: Session, time: str = "today") -> List[NoPhaiThuResponse
 
         return results
     except Exception as e:
-        raise e
\ No newline at end of file
+        raise e
@@ -0,0 +1,171 @@
+"""
+CRUD operations for PaymentLedger (sổ thu tiền)
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from app.core import clock
+from app.core.enums import NguonThanhToan
+from app.models.lich_su_tra_lai import LichSuTraLai
+from app.models.payment_ledger import PaymentLedger
+from app.models.tin_chap import TinChap
+from app.schemas.lich_su import CollectionByDate, CollectionReport, LedgerMismatch, LedgerVerifyResponse
+
+
+# Số dòng đọc mỗi lô khi đối chiếu toàn bộ lịch sử (yield_per)
+_STREAM_BATCH_SIZE = 1000
+
+
+def record_payment(
+    db: Session,
+    ma_hd: str,
+    so_tien: int,
+    nguon: NguonThanhToan,
+    stt: Optional[int] = None,
+) -> None:
+    """
+    Ghi một khoản thu vào sổ (chưa commit: cùng transaction với thay đổi TienDaTra)
+
+    Args:
+        db: Database session
+        ma_hd: Mã hợp đồng
+        so_tien: Số tiền thực tế được ghi nhận
+        nguon: Đường ghi nhận khoản thu
+        stt: Kỳ được thanh toán (None: trả gốc)
+    """
+    if so_tien == 0:
+        return
+    db.add(PaymentLedger(NgayThu=clock.today(), Stt=stt, MaHD=ma_hd, SoTien=so_tien, Nguon=nguon.value))
+
+
+def get_collections(
+    db: Session,
+    tu_ngay: date,
+    den_ngay: date,
+    ma_hd: Optional[str] = None,
+) -> CollectionReport:
+    """
+    Tiền thu được trong [tu_ngay, den_ngay] theo ngày và nguồn
+
+    Một câu GROUP BY trên khoảng NgayThu (chỉ mục NgayThu, Nguon); không đọc
+    lich_su_tra_lai.
+
+    Args:
+        db: Database session
+        tu_ngay: Từ ngày
+        den_ngay: Đến ngày
+        ma_hd: Chỉ tính một hợp đồng
+
+    Returns:
+        CollectionReport
+    """
+    conditions = [PaymentLedger.NgayThu.between(tu_ngay, den_ngay)]
+    if ma_hd:
+        conditions.append(PaymentLedger.MaHD == ma_hd)
+    rows = db.execute(
+        select(PaymentLedger.NgayThu, PaymentLedger.Nguon, func.sum(PaymentLedger.SoTien), func.count())
+        .where(*conditions)
+        .group_by(PaymentLedger.NgayThu, PaymentLedger.Nguon)
+        .order_by(PaymentLedger.NgayThu)
+    ).all()
+
+    by_date: Dict[date, CollectionByDate] = {}
+    by_source: Dict[str, int] = defaultdict(int)
+    for ngay, nguon, so_tien, so_khoan in rows:
+        item = by_date.setdefault(ngay, CollectionByDate(ngay=ngay, so_tien=0, so_khoan_thu=0, theo_nguon={}))
+        item.so_tien += so_tien
+        item.so_khoan_thu += so_khoan
+        item.theo_nguon[nguon] = so_tien
+        by_source[nguon] += so_tien
+
+    return CollectionReport(
+        tu_ngay=tu_ngay,
+        den_ngay=den_ngay,
+        tong_thu=sum(item.so_tien for item in by_date.values()),
+        so_khoan_thu=sum(item.so_khoan_thu for item in by_date.values()),
+        theo_nguon=dict(by_source),
+        theo_ngay=list(by_date.values()),
+    )
+
+
+def verify_ledger(db: Session, ma_hd: Optional[str] = None, limit: int = 100) -> LedgerVerifyResponse:
+    """
+    Đối chiếu sổ thu tiền với số đã trả hiện tại
+
+    - Mỗi kỳ lich_su_tra_lai: TienDaTra = tổng các khoản trong sổ của kỳ đó
+    - Mỗi hợp đồng Tín chấp: SoTienTraGoc = tổng các khoản trả gốc trong sổ
+
+    Mỗi phía là một câu LEFT JOIN với tổng trong sổ gom theo kỳ / hợp đồng.
+    Khoản thu của kỳ đã xóa hoặc đã lưu trữ không được đối chiếu.
+
+    Args:
+        db: Database session
+        ma_hd: Chỉ đối chiếu một hợp đồng (None: toàn bộ)
+        limit: Số dòng lệch tối đa trả về
+
+    Returns:
+        LedgerVerifyResponse
+    """
+    period_totals = (
+        select(PaymentLedger.Stt, PaymentLedger.MaHD, func.sum(PaymentLedger.SoTien).label("total"))
+        .where(PaymentLedger.Stt.is_not(None))
+        .group_by(PaymentLedger.Stt, PaymentLedger.MaHD)
+    )
+    principal_totals = (
+        select(PaymentLedger.MaHD, func.sum(PaymentLedger.SoTien).label("total"))
+        .where(PaymentLedger.Stt.is_(None))
+        .group_by(PaymentLedger.MaHD)
+    )
+    if ma_hd:
+        period_totals = period_totals.where(PaymentLedger.MaHD == ma_hd)
+        principal_totals = principal_totals.where(PaymentLedger.MaHD == ma_hd)
+    period_totals = period_totals.subquery()
+    principal_totals = principal_totals.subquery()
+
+    period_ledger = func.coalesce(period_totals.c.total, 0)
+    periods = (
+        select(LichSuTraLai.Stt, LichSuTraLai.MaHD, LichSuTraLai.TienDaTra, period_ledger)
+        .outerjoin(period_totals, and_(
+            period_totals.c.Stt == LichSuTraLai.Stt, period_totals.c.MaHD == LichSuTraLai.MaHD,
+        ))
+    )
+    principal_ledger = func.coalesce(principal_totals.c.total, 0)
+    principals = (
+        select(TinChap.MaHD, TinChap.SoTienTraGoc, principal_ledger)
+        .outerjoin(principal_totals, principal_totals.c.MaHD == TinChap.MaHD)
+    )
+    if ma_hd:
+        periods = periods.where(LichSuTraLai.MaHD == ma_hd)
+        principals = principals.where(TinChap.MaHD == ma_hd)
+
+    so_ky = so_hop_dong = so_dong_lech = 0
+    mismatches = []
+    stream = {"yield_per": _STREAM_BATCH_SIZE}
+    for stt, row_ma_hd, tien_da_tra, trong_so in db.execute(periods.execution_options(**stream)):
+        so_ky += 1
+        if tien_da_tra != trong_so:
+            so_dong_lech += 1
+            if len(mismatches) < limit:
+                mismatches.append(LedgerMismatch(
+                    stt=stt, ma_hd=row_ma_hd, so_tien_hien_tai=tien_da_tra, so_tien_trong_so=trong_so,
+                ))
+    for row_ma_hd, so_tien_tra_goc, trong_so in db.execute(principals.execution_options(**stream)):
+        so_hop_dong += 1
+        if (so_tien_tra_goc or 0) != trong_so:
+            so_dong_lech += 1
+            if len(mismatches) < limit:
+                mismatches.append(LedgerMismatch(
+                    ma_hd=row_ma_hd, so_tien_hien_tai=so_tien_tra_goc or 0, so_tien_trong_so=trong_so,
+                ))
+
+    return LedgerVerifyResponse(
+        ok=so_dong_lech == 0,
+        so_ky_kiem_tra=so_ky,
+        so_hop_dong_kiem_tra=so_hop_dong,
+        so_dong_lech=so_dong_lech,
+        lech=mismatches,
+    )
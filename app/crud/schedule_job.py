@@ -0,0 +1,159 @@
+"""
+CRUD operations for ScheduleJob (tạo lịch sử trả lãi ở nền)
+"""
+import datetime
+import logging
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.core.database import SessionLocal
+from app.core.enums import TrangThaiTaoLichSu
+from app.core.jobs import JobWorker
+from app.core.writer import run_write_blocking
+from app.crud import lich_su_tra_lai as crud_lich_su
+from app.models.schedule_job import ScheduleJob
+
+
+logger = logging.getLogger("api_app_credit.schedule_job")
+
+
+def enqueue_schedule_job(db: Session, ma_hd: str) -> ScheduleJob:
+    """
+    Thêm job tạo lịch sử cho hợp đồng (chưa commit: cùng transaction với hợp đồng)
+
+    Args:
+        db: Database session
+        ma_hd: Mã hợp đồng
+
+    Returns:
+        ScheduleJob đang chờ
+    """
+    job = ScheduleJob(MaHD=ma_hd, TrangThai=TrangThaiTaoLichSu.CHO.value, SoLanThu=0)
+    db.add(job)
+    return job
+
+
+def get_schedule_job(db: Session, ma_hd: str) -> Optional[ScheduleJob]:
+    """
+    Get the schedule job of a contract
+
+    Args:
+        db: Database session
+        ma_hd: Contract ID
+
+    Returns:
+        ScheduleJob object or None if the contract has no job
+    """
+    return db.get(ScheduleJob, ma_hd)
+
+
+def get_pending_schedule_jobs(db: Session, limit: int) -> List[str]:
+    """
+    MaHD của các job đang chờ, cũ nhất trước (chỉ mục TrangThai, ThoiGianTao)
+
+    Args:
+        db: Database session
+        limit: Số job tối đa
+
+    Returns:
+        Danh sách MaHD
+    """
+    return list(db.execute(
+        select(ScheduleJob.MaHD)
+        .where(ScheduleJob.TrangThai == TrangThaiTaoLichSu.CHO.value)
+        .order_by(ScheduleJob.ThoiGianTao)
+        .limit(limit)
+    ).scalars())
+
+
+def run_schedule_job(db: Session, ma_hd: str) -> Optional[ScheduleJob]:
+    """
+    Tạo lịch sử cho một job và đánh dấu xong trong cùng một transaction
+
+    Job đã xong (một process khác chạy trước) được bỏ qua; create_lich_su
+    cũng không tạo lại nếu hợp đồng đã có lịch sử.
+
+    Args:
+        db: Session của writer
+        ma_hd: Mã hợp đồng
+
+    Returns:
+        ScheduleJob hoặc None nếu không còn job
+    """
+    job = get_schedule_job(db, ma_hd)
+    if job is None or job.TrangThai != TrangThaiTaoLichSu.CHO.value:
+        return job
+
+    result = crud_lich_su.create_lich_su(db, ma_hd)
+    job.TrangThai = TrangThaiTaoLichSu.XONG.value
+    job.SoKyDaTao = result.get("records_created", 0)
+    job.Loi = None
+    job.ThoiGianXong = datetime.datetime.now()
+    db.commit()
+    return job
+
+
+def mark_schedule_job_failed(db: Session, ma_hd: str, loi: str) -> Optional[ScheduleJob]:
+    """
+    Ghi nhận một lần chạy lỗi; hết SCHEDULE_JOB_MAX_ATTEMPTS lần thì đánh dấu lỗi
+
+    Args:
+        db: Session của writer
+        ma_hd: Mã hợp đồng
+        loi: Nội dung lỗi
+
+    Returns:
+        ScheduleJob hoặc None nếu không còn job
+    """
+    job = get_schedule_job(db, ma_hd)
+    if job is None or job.TrangThai != TrangThaiTaoLichSu.CHO.value:
+        return job
+
+    job.SoLanThu += 1
+    job.Loi = loi
+    if job.SoLanThu >= config.SCHEDULE_JOB_MAX_ATTEMPTS:
+        job.TrangThai = TrangThaiTaoLichSu.LOI.value
+        job.ThoiGianXong = datetime.datetime.now()
+    db.commit()
+    return job
+
+
+def process_pending_schedule_jobs(limit: int = config.SCHEDULE_WORKER_BATCH_SIZE) -> bool:
+    """
+    Xử lý một lô job đang chờ (gọi từ schedule_worker)
+
+    Mỗi job là một thao tác ghi qua write_queue; job lỗi được ghi nhận để thử
+    lại ở lần quét sau.
+
+    Args:
+        limit: Số job tối đa của lô
+
+    Returns:
+        True nếu lô đầy (có thể còn job đang chờ)
+    """
+    db = SessionLocal()
+    try:
+        ma_hds = get_pending_schedule_jobs(db, limit)
+    finally:
+        db.close()
+
+    for ma_hd in ma_hds:
+        try:
+            run_write_blocking(run_schedule_job, ma_hd=ma_hd)
+        except Exception as exc:
+            loi = exc.detail if isinstance(exc, HTTPException) else f"{type(exc).__name__}: {exc}"
+            logger.warning("Schedule job %s failed: %s", ma_hd, loi)
+            run_write_blocking(mark_schedule_job_failed, ma_hd=ma_hd, loi=str(loi))
+    return len(ma_hds) >= limit
+
+
+# Worker dùng chung cho ứng dụng (khởi động trong startup event của app.main)
+schedule_worker = JobWorker(
+    "schedule-jobs",
+    process_pending_schedule_jobs,
+    poll_interval=config.SCHEDULE_WORKER_POLL_SECONDS,
+)
@@ -1,47 +1,50 @@
 """
 CRUD operations for TinChap
 """
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 from typing import List, Optional
-from datetime import date
 
+from app.core import clock
 from app.models.tin_chap import TinChap
 from app.models.lich_su_tra_lai import LichSuTraLai
-from app.schemas.tin_chap import TinChapCreate, TinChapUpdate, TinChapResponse
-from app.schemas.lich_su_tra_lai import LichSuTraLai as LichSuTraLaiSchema
-from app.core.enums import TrangThaiThanhToan
+from app.models.archive import TinChapArchive, LichSuTraLaiArchive
+from app.models.contract_search import contract_search_filter
+from app.schemas.tin_chap import TinChapCreate, TinChapUpdate
+from app.core.enums import NguonThanhToan, TrangThaiThanhToan, HistoryMode
+from app.crud import khach_hang as crud_khach_hang
+from app.crud import lich_su_tra_lai as crud_lich_su_tra_lai
+from app.crud.lich_su_tra_lai import summarize_lich_sus
+from app.crud.payment_ledger import record_payment
+from app.crud.schedule_job import enqueue_schedule_job
+from app.utils.id_generator import ma_hd_order_by
+from app.utils.projection import parse_fields, project
+from app.utils.serialization import lich_su_to_dict
+from app.utils.schedule import set_current_period, reset_schedule_position, refresh_due_date
 
 
-def _calculate_payment_info(db: Session, ma_hd: str) -> dict:
+def _calculate_payment_info(tin_chap: TinChap, summary: dict) -> dict:
     """
     Calculate payment information for a TinChap contract
     
     Args:
-        db: Database session
-        ma_hd: Contract ID
+        tin_chap: TinChap contract
+        summary: History summary (see crud.lich_su_tra_lai.summarize_lich_sus)
         
     Returns:
         dict: Payment information including LaiDaTra, GocConLai, LaiConLai
     """
-    # Get all payment history for this contract
-    lich_sus = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == ma_hd).all()
-    
     # Calculate total interest paid
-    lai_da_tra = sum(ls.TienDaTra for ls in lich_sus)
+    lai_da_tra = summary["TongTienDaTra"]
     
     # For TinChap, the remaining principal is the original loan amount
     # since TinChap only pays interest, not principal
-    tin_chap = db.query(TinChap).filter(TinChap.MaHD == ma_hd).first()
-    if tin_chap:
-        goc_con_lai = tin_chap.SoTienVay  # For TinChap, principal is never paid
-    else:
-        goc_con_lai = 0
+    goc_con_lai = tin_chap.SoTienVay
     
     # Calculate remaining interest
     # Total interest should be calculated based on the contract terms
     # For now, we'll use a simple calculation
-    total_interest_due = sum(ls.SoTien for ls in lich_sus)
+    total_interest_due = summary["TongSoTien"]
     lai_con_lai = max(0, total_interest_due - lai_da_tra)
     
     return {
@@ -51,6 +54,56 @@ def _calculate_payment_info(db: Session, ma_hd: str) -> dict:
     }
 
 
+# Các trường chọn được bằng fields= (MaHD luôn được trả về)
+TIN_CHAP_FIELDS = (
+    "MaHD", "MaKH", "HoTen", "NgayVay", "SoTienVay", "KyDong", "LaiSuat", "SoTienTraGoc",
+    "TrangThai", "LaiDaTra", "GocConLai", "LaiConLai",
+)
+# Các trường cần tổng hợp từ lịch sử trả lãi
+_TOTAL_FIELDS = {"LaiDaTra", "GocConLai", "LaiConLai"}
+
+
+def _tin_chap_to_dict(
+    tin_chap: TinChap,
+    lich_sus: Optional[List[LichSuTraLai]] = None,
+    summary: Optional[dict] = None,
+    with_summary: bool = False,
+) -> dict:
+    """
+    Build the TinChapResponse payload as a plain dict
+
+    Rows come straight from the database, so they are not re-validated
+    through Pydantic (see app.core.responses).
+
+    Args:
+        tin_chap: TinChap contract
+        lich_sus: History rows to embed (None: no LichSuTraLai key)
+        summary: History summary for the totals (None: no totals)
+        with_summary: Also embed the summary as TomTatLichSu
+    """
+    payload = {
+        "MaHD": tin_chap.MaHD,
+        "MaKH": tin_chap.MaKH,
+        "HoTen": tin_chap.HoTen,
+        "NgayVay": tin_chap.NgayVay,
+        "SoTienVay": tin_chap.SoTienVay,
+        "KyDong": tin_chap.KyDong,
+        "LaiSuat": tin_chap.LaiSuat,
+        "SoTienTraGoc": tin_chap.SoTienTraGoc,
+        "TrangThai": tin_chap.TrangThai,
+    }
+    if lich_sus is not None:
+        payload["LichSuTraLai"] = [lich_su_to_dict(ls) for ls in lich_sus]
+    if summary is not None:
+        payment_info = _calculate_payment_info(tin_chap, summary)
+        payload["LaiDaTra"] = payment_info["lai_da_tra"]
+        payload["GocConLai"] = payment_info["goc_con_lai"]
+        payload["LaiConLai"] = payment_info["lai_con_lai"]
+        if with_summary:
+            payload["TomTatLichSu"] = summary
+    return payload
+
+
 def get_tin_chap(db: Session, ma_hd: str) -> Optional[TinChap]:
     """
     Get a TinChap contract by MaHD
@@ -69,50 +122,94 @@ def get_tin_chap(db: Session, ma_hd: str) -> Optional[TinChap]:
         raise
 
 
-def get_tin_chap_with_history(db: Session, ma_hd: str) -> Optional[TinChapResponse]:
+def get_tin_chap_with_history(db: Session, ma_hd: str, include_archived: bool = False) -> Optional[dict]:
     """
     Get a TinChap contract by MaHD with payment history information
     
     Args:
         db: Database session
         ma_hd: Contract ID
+        include_archived: Also look in the archive tables (settled contracts)
         
     Returns:    
-        TinChapResponse object or None if not found
+        dict with the TinChapResponse fields or None if not found
     """
     try:
         tin_chap = db.query(TinChap).filter(TinChap.MaHD == ma_hd).first()
+        history_model = LichSuTraLai
+        if not tin_chap and include_archived:
+            tin_chap = db.query(TinChapArchive).filter(TinChapArchive.MaHD == ma_hd).first()
+            history_model = LichSuTraLaiArchive
         if not tin_chap:
             return None
         
         # Get payment history for this contract
-        lich_sus = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == tin_chap.MaHD).all()
-        lich_su_schemas = [LichSuTraLaiSchema.model_validate(ls).model_dump() for ls in lich_sus]
-        
-        # Calculate payment information
-        payment_info = _calculate_payment_info(db, tin_chap.MaHD)
-        
-        # Create TinChapResponse
-        tin_chap_response = TinChapResponse(
-            MaHD=tin_chap.MaHD,
-            HoTen=tin_chap.HoTen,
-            NgayVay=tin_chap.NgayVay,
-            SoTienVay=tin_chap.SoTienVay,
-            KyDong=tin_chap.KyDong,
-            LaiSuat=tin_chap.LaiSuat,
-            SoTienTraGoc=tin_chap.SoTienTraGoc,
-            TrangThai=tin_chap.TrangThai,
-            LichSuTraLai=lich_su_schemas,
-            LaiDaTra=payment_info["lai_da_tra"],
-            GocConLai=payment_info["goc_con_lai"],
-            LaiConLai=payment_info["lai_con_lai"]
-        )
-        
-        return tin_chap_response
+        lich_sus = db.query(history_model).filter(history_model.MaHD == tin_chap.MaHD).order_by(history_model.Stt).all()
+        return _tin_chap_to_dict(tin_chap, lich_sus, summarize_lich_sus(lich_sus))
     except Exception as e:
         raise
 
 
+def _build_tin_chaps_query(
+    db: Session,
+    status: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 10,
+    search: Optional[str] = None,
+    sort_by: str = "NgayVay",
+    sort_dir: str = "desc",
+    today_only: bool = False,
+):
+    """
+    Build the filtered, sorted and paginated TinChap query
+    """
+    query = db.query(TinChap)
+
+    if status:
+        query = query.filter(TinChap.TrangThai == status)
+
+    if search:
+        query = query.filter(contract_search_filter(db, TinChap, "TC", search))
+
+    if today_only:
+        query = query.filter(TinChap.NgayVay == clock.today())
+
+    allowed_sort_fields = {
+        "MaHD": TinChap.MaHD,
+        "HoTen": TinChap.HoTen,
+        "NgayVay": TinChap.NgayVay,
+        "SoTienVay": TinChap.SoTienVay,
+        "KyDong": TinChap.KyDong,
+        "LaiSuat": TinChap.LaiSuat,
+        "TrangThai": TinChap.TrangThai,
+    }
+    sort_column = allowed_sort_fields.get(sort_by, TinChap.NgayVay)
+    descending = sort_dir.lower() != "asc"
+    if sort_column is TinChap.MaHD:
+        # Sắp theo số thứ tự mã (TC1000 sau TC999)
+        query = query.order_by(*ma_hd_order_by(sort_column, descending))
+    elif descending:
+        query = query.order_by(sort_column.desc())
+    else:
+        query = query.order_by(sort_column.asc())
+
+    page = max(1, page)
+    page_size = max(1, page_size)
+    offset = (page - 1) * page_size
+    return query.offset(offset).limit(page_size)
+
+
+def get_tin_chap_ids(db: Session, **filters) -> List[str]:
+    """
+    Get only the MaHD of the TinChap contracts on a list page
+
+    Accepts the same filters as get_tin_chaps; used to compute list ETags
+    without loading contracts or their histories.
+    """
+    query = _build_tin_chaps_query(db, **filters)
+    return [row[0] for row in query.with_entities(TinChap.MaHD).all()]
+
+
 def get_tin_chaps(
     db: Session,
     status: Optional[str] = None,
@@ -122,73 +219,77 @@ def get_tin_chaps(
     sort_by: str = "NgayVay",
     sort_dir: str = "desc",
     today_only: bool = False,
-) -> List[TinChapResponse]:
+    fields: Optional[str] = None,
+    include_history: str = HistoryMode.ALL.value,
+    history_n: int = 5,
+) -> List[dict]:
     """
     Get TinChap contracts with filter/search/sort/pagination and payment history
+
+    Args:
+        fields: Comma-separated TinChapResponse fields to return (MaHD is always included)
+        include_history: none | summary | last_n | all (see HistoryMode)
+        history_n: Number of most recent periods for include_history=last_n
+
+    Returns plain dicts with the (selected) TinChapResponse fields. History rows
+    are only queried for last_n/all; totals and summaries come from one
+    GROUP BY query for the whole page, and are skipped if no selected field needs them.
     """
     try:
-        query = db.query(TinChap)
-
-        if status:
-            query = query.filter(TinChap.TrangThai == status)
-
-        if search:
-            like = f"%{search}%"
-            query = query.filter(or_(TinChap.HoTen.ilike(like), TinChap.MaHD.ilike(like)))
-
-        if today_only:
-            query = query.filter(TinChap.NgayVay == date.today())
-
-        allowed_sort_fields = {
-            "MaHD": TinChap.MaHD,
-            "HoTen": TinChap.HoTen,
-            "NgayVay": TinChap.NgayVay,
-            "SoTienVay": TinChap.SoTienVay,
-            "KyDong": TinChap.KyDong,
-            "LaiSuat": TinChap.LaiSuat,
-            "TrangThai": TinChap.TrangThai,
-        }
-        sort_column = allowed_sort_fields.get(sort_by, TinChap.NgayVay)
-        if sort_dir.lower() == "asc":
-            query = query.order_by(sort_column.asc())
-        else:
-            query = query.order_by(sort_column.desc())
-
-        page = max(1, page)
-        page_size = max(1, page_size)
-        offset = (page - 1) * page_size
-        tin_chaps = query.offset(offset).limit(page_size).all()
-
-        results = []
-        for tin_chap in tin_chaps:
-            lich_sus = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == tin_chap.MaHD).all()
-            lich_su_schemas = [LichSuTraLaiSchema.model_validate(ls).model_dump() for ls in lich_sus]
-
-            payment_info = _calculate_payment_info(db, tin_chap.MaHD)
-
-            results.append(
-                TinChapResponse(
-                    MaHD=tin_chap.MaHD,
-                    HoTen=tin_chap.HoTen,
-                    NgayVay=tin_chap.NgayVay,
-                    SoTienVay=tin_chap.SoTienVay,
-                    KyDong=tin_chap.KyDong,
-                    LaiSuat=tin_chap.LaiSuat,
-                    SoTienTraGoc=tin_chap.SoTienTraGoc,
-                    TrangThai=tin_chap.TrangThai,
-                    LichSuTraLai=lich_su_schemas,
-                    LaiDaTra=payment_info["lai_da_tra"],
-                    GocConLai=payment_info["goc_con_lai"],
-                    LaiConLai=payment_info["lai_con_lai"],
-                )
-            )
+        mode = HistoryMode(include_history)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"include_history không hợp lệ, chọn một trong: {', '.join(HistoryMode.list_values())}"
+        )
+    try:
+        selected = parse_fields(fields, TIN_CHAP_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        return results
-    except Exception as e:
-        raise
+    need_totals = selected is None or bool(selected & _TOTAL_FIELDS)
+    keep = None if selected is None else selected | {"MaHD", "LichSuTraLai", "TomTatLichSu"}
 
+    tin_chaps = _build_tin_chaps_query(
+        db,
+        status=status,
+        page=page,
+        page_size=page_size,
+        search=search,
+        sort_by=sort_by,
+        sort_dir=sort_dir,
+        today_only=today_only,
+    ).all()
+    ma_hds = [tin_chap.MaHD for tin_chap in tin_chaps]
 
-def create_tin_chap(db: Session, tin_chap: TinChapCreate, ma_hd: str) -> TinChap:
+    histories = {}
+    if mode == HistoryMode.ALL:
+        histories = crud_lich_su_tra_lai.get_lich_sus_for_contracts(db, ma_hds)
+    elif mode == HistoryMode.LAST_N:
+        histories = crud_lich_su_tra_lai.get_lich_sus_for_contracts(db, ma_hds, last_n=history_n)
+
+    summaries = {}
+    if mode == HistoryMode.ALL:
+        # Đã có toàn bộ lịch sử: tính tổng trực tiếp, không cần truy vấn thêm
+        summaries = {ma_hd: summarize_lich_sus(rows) for ma_hd, rows in histories.items()}
+    elif need_totals or mode == HistoryMode.SUMMARY:
+        summaries = crud_lich_su_tra_lai.get_lich_su_summaries(db, ma_hds)
+
+    return [
+        project(
+            _tin_chap_to_dict(
+                tin_chap,
+                lich_sus=histories.get(tin_chap.MaHD),
+                summary=summaries.get(tin_chap.MaHD),
+                with_summary=mode == HistoryMode.SUMMARY,
+            ),
+            keep,
+        )
+        for tin_chap in tin_chaps
+    ]
+
+
+def create_tin_chap(db: Session, tin_chap: TinChapCreate, ma_hd: str, async_schedule: bool = False) -> TinChap:
     """
     Create a new TinChap contract
     
@@ -196,15 +297,20 @@ def create_tin_chap(db: Session, tin_chap: TinChapCreate, ma_hd: str) -> TinChap
         db: Database session
         tin_chap: TinChap creation data
         ma_hd: Generated contract ID
+        async_schedule: Thêm job tạo lịch sử trả lãi ở nền (cùng transaction)
         
     Returns:
         Created TinChap object
     """
     try:
         trang_thai = TrangThaiThanhToan.CHUA_THANH_TOAN.value
+        ma_kh = crud_khach_hang.resolve_khach_hang(
+            db, tin_chap.HoTen, ma_kh=tin_chap.MaKH, so_dien_thoai=tin_chap.SoDienThoai, cccd=tin_chap.CCCD
+        )
         
         db_tin_chap = TinChap(
             MaHD=ma_hd,
+            MaKH=ma_kh,
             HoTen=tin_chap.HoTen,
             NgayVay=tin_chap.NgayVay,
             SoTienVay=tin_chap.SoTienVay,
@@ -212,8 +318,12 @@ def create_tin_chap(db: Session, tin_chap: TinChapCreate, ma_hd: str) -> TinChap
             LaiSuat=tin_chap.LaiSuat,
             TrangThai=trang_thai
         )
+        # Chưa có kỳ nào được tính: kỳ đầu tiên đến hạn sau KyDong ngày
+        set_current_period(db_tin_chap, 0)
         
         db.add(db_tin_chap)
+        if async_schedule:
+            enqueue_schedule_job(db, ma_hd)
         db.commit()
         db.refresh(db_tin_chap)
         
@@ -243,10 +353,18 @@ def update_tin_chap(db: Session, ma_hd: str, tin_chap_update: TinChapUpdate) ->
             return None
         
         update_data = tin_chap_update.model_dump(exclude_unset=True)
+        if update_data.get("MaKH") is not None:
+            crud_khach_hang.resolve_khach_hang(db, db_tin_chap.HoTen, ma_kh=update_data["MaKH"])
+        else:
+            update_data.pop("MaKH", None)  # Hợp đồng luôn thuộc một khách hàng
         
         if update_data:
             for key, value in update_data.items():
                 setattr(db_tin_chap, key, value)
+            if update_data.keys() & {"NgayVay", "KyDong"}:
+                reset_schedule_position(db_tin_chap, clock.today())
+            elif "TrangThai" in update_data:
+                refresh_due_date(db_tin_chap, clock.today())
             
             db.commit()
             db.refresh(db_tin_chap)
@@ -336,6 +454,7 @@ def tra_goc_tin_chap(db: Session, ma_hd: str, so_tien_tra_goc: int) -> bool:
         if not db_tin_chap:
             return False
         db_tin_chap.SoTienTraGoc += so_tien_tra_goc
+        record_payment(db, ma_hd, so_tien_tra_goc, NguonThanhToan.TRA_GOC)
         if db_tin_chap.SoTienTraGoc > db_tin_chap.SoTienVay:
             # db_tin_chap.TrangThai = TrangThaiThanhToan.DA_TAT_TOAN.value
             db_lich_su_tra_lai_tin_chap = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == ma_hd).all()
@@ -344,6 +463,7 @@ def tra_goc_tin_chap(db: Session, ma_hd: str, so_tien_tra_goc: int) -> bool:
                 db_tin_chap.TrangThai = TrangThaiThanhToan.DA_TAT_TOAN.value
             else:
                 db_tin_chap.TrangThai = TrangThaiThanhToan.THANH_TOAN_MOT_PHAN.value
+            refresh_due_date(db_tin_chap, clock.today())
         db.commit()
         db.refresh(db_tin_chap)
         return True
@@ -1,16 +1,25 @@
 """
 CRUD operations for TraGop
 """
+from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 from typing import List, Optional
-from datetime import date
 
-from app.core.enums import TrangThaiThanhToan
+from app.core import clock
+from app.core.enums import TrangThaiThanhToan, HistoryMode
+from app.crud import khach_hang as crud_khach_hang
+from app.crud import lich_su_tra_lai as crud_lich_su_tra_lai
+from app.crud.lich_su_tra_lai import summarize_lich_sus
+from app.crud.schedule_job import enqueue_schedule_job
+from app.utils.id_generator import ma_hd_order_by
 from app.models.tra_gop import TraGop
 from app.models.lich_su_tra_lai import LichSuTraLai
-from app.schemas.tra_gop import TraGopCreate, TraGopUpdate, TraGopResponse
-from app.schemas.lich_su_tra_lai import LichSuTraLai as LichSuTraLaiSchema
+from app.models.archive import TraGopArchive, LichSuTraLaiArchive
+from app.models.contract_search import contract_search_filter
+from app.schemas.tra_gop import TraGopCreate, TraGopUpdate
+from app.utils.projection import parse_fields, project
+from app.utils.serialization import lich_su_to_dict
+from app.utils.schedule import set_current_period, reset_schedule_position, refresh_due_date
 
 
 def get_tra_gop(db: Session, ma_hd: str) -> Optional[TraGop]:
@@ -27,16 +36,58 @@ def get_tra_gop(db: Session, ma_hd: str) -> Optional[TraGop]:
     return db.query(TraGop).filter(TraGop.MaHD == ma_hd).first()
 
 
-def _calculate_tg_payment_info(db: Session, ma_hd: str) -> dict:
-    """Calculate total paid and remaining for TraGop from lịch sử."""
-    histories = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == ma_hd).all()
-    da_thanh_toan = sum(h.TienDaTra for h in histories)
-    tong_phai_tra = sum(h.SoTien for h in histories)
+def _calculate_tg_payment_info(summary: dict) -> dict:
+    """Calculate total paid and remaining for TraGop from tóm tắt lịch sử."""
+    da_thanh_toan = summary["TongTienDaTra"]
+    tong_phai_tra = summary["TongSoTien"]
     con_lai = max(0, tong_phai_tra - da_thanh_toan)
     return {"da_thanh_toan": da_thanh_toan, "con_lai": con_lai}
 
 
-def get_tra_gops(
+# Các trường chọn được bằng fields= (MaHD luôn được trả về)
+TRA_GOP_FIELDS = (
+    "MaHD", "MaKH", "HoTen", "NgayVay", "SoTienVay", "KyDong", "SoLanTra", "LaiSuat",
+    "TrangThai", "DaThanhToan", "ConLai",
+)
+# Các trường cần tổng hợp từ lịch sử trả lãi
+_TOTAL_FIELDS = {"DaThanhToan", "ConLai"}
+
+
+def _tra_gop_to_dict(
+    tg: TraGop,
+    histories: Optional[List[LichSuTraLai]] = None,
+    summary: Optional[dict] = None,
+    with_summary: bool = False,
+) -> dict:
+    """
+    Build the TraGopResponse payload as a plain dict (no Pydantic pass).
+
+    histories=None omits LichSuTraLai, summary=None omits the totals;
+    with_summary also embeds the summary as TomTatLichSu.
+    """
+    payload = {
+        "MaHD": tg.MaHD,
+        "MaKH": tg.MaKH,
+        "HoTen": tg.HoTen,
+        "NgayVay": tg.NgayVay,
+        "SoTienVay": tg.SoTienVay,
+        "KyDong": tg.KyDong,
+        "SoLanTra": tg.SoLanTra,
+        "LaiSuat": tg.LaiSuat,
+        "TrangThai": tg.TrangThai,
+    }
+    if histories is not None:
+        payload["LichSuTraLai"] = [lich_su_to_dict(h) for h in histories]
+    if summary is not None:
+        totals = _calculate_tg_payment_info(summary)
+        payload["DaThanhToan"] = totals["da_thanh_toan"]
+        payload["ConLai"] = totals["con_lai"]
+        if with_summary:
+            payload["TomTatLichSu"] = summary
+    return payload
+
+
+def _build_tra_gops_query(
     db: Session,
     status: Optional[str] = None,
     page: int = 1,
@@ -45,9 +96,9 @@ def get_tra_gops(
     sort_by: str = "NgayVay",
     sort_dir: str = "desc",
     today_only: bool = False,
-) -> List[TraGopResponse]:
+):
     """
-    Get TraGop contracts with filter/search/sort/pagination and enrich with lịch sử + totals.
+    Build the filtered, sorted and paginated TraGop query
     """
     query = db.query(TraGop)
 
@@ -55,11 +106,10 @@ def get_tra_gops(
         query = query.filter(TraGop.TrangThai == status)
 
     if search:
-        like = f"%{search}%"
-        query = query.filter(or_(TraGop.HoTen.ilike(like), TraGop.MaHD.ilike(like)))
+        query = query.filter(contract_search_filter(db, TraGop, "TG", search))
 
     if today_only:
-        query = query.filter(TraGop.NgayVay == date.today())
+        query = query.filter(TraGop.NgayVay == clock.today())
 
     allowed_sort_fields = {
         "MaHD": TraGop.MaHD,
@@ -72,64 +122,125 @@ def get_tra_gops(
         "TrangThai": TraGop.TrangThai,
     }
     sort_column = allowed_sort_fields.get(sort_by, TraGop.NgayVay)
-    if sort_dir.lower() == "asc":
-        query = query.order_by(sort_column.asc())
-    else:
+    descending = sort_dir.lower() != "asc"
+    if sort_column is TraGop.MaHD:
+        # Sắp theo số thứ tự mã (TG1000 sau TG999)
+        query = query.order_by(*ma_hd_order_by(sort_column, descending))
+    elif descending:
         query = query.order_by(sort_column.desc())
+    else:
+        query = query.order_by(sort_column.asc())
 
     page = max(1, page)
     page_size = max(1, page_size)
     offset = (page - 1) * page_size
-    tra_gops = query.offset(offset).limit(page_size).all()
-
-    results: List[TraGopResponse] = []
-    for tg in tra_gops:
-        histories = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == tg.MaHD).all()
-        histories_schema = [LichSuTraLaiSchema.model_validate(h).model_dump() for h in histories]
-        totals = _calculate_tg_payment_info(db, tg.MaHD)
-        results.append(
-            TraGopResponse(
-                MaHD=tg.MaHD,
-                HoTen=tg.HoTen,
-                NgayVay=tg.NgayVay,
-                SoTienVay=tg.SoTienVay,
-                KyDong=tg.KyDong,
-                SoLanTra=tg.SoLanTra,
-                LaiSuat=tg.LaiSuat,
-                TrangThai=tg.TrangThai,
-                LichSuTraLai=histories_schema,
-                DaThanhToan=totals["da_thanh_toan"],
-                ConLai=totals["con_lai"],
-            )
+    return query.offset(offset).limit(page_size)
+
+
+def get_tra_gop_ids(db: Session, **filters) -> List[str]:
+    """
+    Get only the MaHD of the TraGop contracts on a list page
+
+    Accepts the same filters as get_tra_gops; used to compute list ETags
+    without loading contracts or their histories.
+    """
+    query = _build_tra_gops_query(db, **filters)
+    return [row[0] for row in query.with_entities(TraGop.MaHD).all()]
+
+
+def get_tra_gops(
+    db: Session,
+    status: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 10,
+    search: Optional[str] = None,
+    sort_by: str = "NgayVay",
+    sort_dir: str = "desc",
+    today_only: bool = False,
+    fields: Optional[str] = None,
+    include_history: str = HistoryMode.ALL.value,
+    history_n: int = 5,
+) -> List[dict]:
+    """
+    Get TraGop contracts with filter/search/sort/pagination and enrich with lịch sử + totals.
+
+    fields chọn các trường TraGopResponse trả về (MaHD luôn có); include_history
+    (none | summary | last_n | all) quyết định lịch sử có được truy vấn hay không.
+    Tổng tiền lấy từ một truy vấn GROUP BY cho cả trang.
+
+    Returns plain dicts with the (selected) TraGopResponse fields.
+    """
+    try:
+        mode = HistoryMode(include_history)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"include_history không hợp lệ, chọn một trong: {', '.join(HistoryMode.list_values())}"
         )
+    try:
+        selected = parse_fields(fields, TRA_GOP_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return results
+    need_totals = selected is None or bool(selected & _TOTAL_FIELDS)
+    keep = None if selected is None else selected | {"MaHD", "LichSuTraLai", "TomTatLichSu"}
 
+    tra_gops = _build_tra_gops_query(
+        db,
+        status=status,
+        page=page,
+        page_size=page_size,
+        search=search,
+        sort_by=sort_by,
+        sort_dir=sort_dir,
+        today_only=today_only,
+    ).all()
+    ma_hds = [tg.MaHD for tg in tra_gops]
 
-def get_tra_gop_with_history(db: Session, ma_hd: str) -> Optional[TraGopResponse]:
-    """Get a single TraGop enriched with lịch sử + totals."""
+    histories = {}
+    if mode == HistoryMode.ALL:
+        histories = crud_lich_su_tra_lai.get_lich_sus_for_contracts(db, ma_hds)
+    elif mode == HistoryMode.LAST_N:
+        histories = crud_lich_su_tra_lai.get_lich_sus_for_contracts(db, ma_hds, last_n=history_n)
+
+    summaries = {}
+    if mode == HistoryMode.ALL:
+        summaries = {ma_hd: summarize_lich_sus(rows) for ma_hd, rows in histories.items()}
+    elif need_totals or mode == HistoryMode.SUMMARY:
+        summaries = crud_lich_su_tra_lai.get_lich_su_summaries(db, ma_hds)
+
+    return [
+        project(
+            _tra_gop_to_dict(
+                tg,
+                histories=histories.get(tg.MaHD),
+                summary=summaries.get(tg.MaHD),
+                with_summary=mode == HistoryMode.SUMMARY,
+            ),
+            keep,
+        )
+        for tg in tra_gops
+    ]
+
+
+def get_tra_gop_with_history(db: Session, ma_hd: str, include_archived: bool = False) -> Optional[dict]:
+    """
+    Get a single TraGop enriched with lịch sử + totals (TraGopResponse fields).
+
+    include_archived=True còn tìm trong bảng lưu trữ (hợp đồng đã tất toán).
+    """
     tg = db.query(TraGop).filter(TraGop.MaHD == ma_hd).first()
+    history_model = LichSuTraLai
+    if not tg and include_archived:
+        tg = db.query(TraGopArchive).filter(TraGopArchive.MaHD == ma_hd).first()
+        history_model = LichSuTraLaiArchive
     if not tg:
         return None
-    histories = db.query(LichSuTraLai).filter(LichSuTraLai.MaHD == tg.MaHD).all()
-    histories_schema = [LichSuTraLaiSchema.model_validate(h).model_dump() for h in histories]
-    totals = _calculate_tg_payment_info(db, tg.MaHD)
-    return TraGopResponse(
-        MaHD=tg.MaHD,
-        HoTen=tg.HoTen,
-        NgayVay=tg.NgayVay,
-        SoTienVay=tg.SoTienVay,
-        KyDong=tg.KyDong,
-        SoLanTra=tg.SoLanTra,
-        LaiSuat=tg.LaiSuat,
-        TrangThai=tg.TrangThai,
-        LichSuTraLai=histories_schema,
-        DaThanhToan=totals["da_thanh_toan"],
-        ConLai=totals["con_lai"],
-    )
+    histories = db.query(history_model).filter(history_model.MaHD == tg.MaHD).order_by(history_model.Stt).all()
+    return _tra_gop_to_dict(tg, histories, summarize_lich_sus(histories))
 
 
-def create_tra_gop(db: Session, tra_gop: TraGopCreate, ma_hd: str) -> TraGop:
+def create_tra_gop(db: Session, tra_gop: TraGopCreate, ma_hd: str, async_schedule: bool = False) -> TraGop:
     """
     Create a new TraGop contract
     
@@ -137,13 +248,18 @@ def create_tra_gop(db: Session, tra_gop: TraGopCreate, ma_hd: str) -> TraGop:
         db: Database session
         tra_gop: TraGop creation data
         ma_hd: Generated contract ID
+        async_schedule: Thêm job tạo lịch sử trả lãi ở nền (cùng transaction)
         
     Returns:
         Created TraGop object
     """
     trang_thai = TrangThaiThanhToan.CHUA_THANH_TOAN.value
+    ma_kh = crud_khach_hang.resolve_khach_hang(
+        db, tra_gop.HoTen, ma_kh=tra_gop.MaKH, so_dien_thoai=tra_gop.SoDienThoai, cccd=tra_gop.CCCD
+    )
     db_tra_gop = TraGop(
         MaHD=ma_hd,
+        MaKH=ma_kh,
         HoTen=tra_gop.HoTen,
         NgayVay=tra_gop.NgayVay,
         SoTienVay=tra_gop.SoTienVay,
@@ -152,8 +268,12 @@ def create_tra_gop(db: Session, tra_gop: TraGopCreate, ma_hd: str) -> TraGop:
         LaiSuat=tra_gop.LaiSuat,
         TrangThai=trang_thai
     )
+    # Chưa có kỳ nào được tính: kỳ đầu tiên đến hạn sau KyDong ngày
+    set_current_period(db_tra_gop, 0)
     
     db.add(db_tra_gop)
+    if async_schedule:
+        enqueue_schedule_job(db, ma_hd)
     db.commit()
     db.refresh(db_tra_gop)
     
@@ -178,8 +298,16 @@ def update_tra_gop(db: Session, ma_hd: str, tra_gop_update: TraGopUpdate) -> Opt
         return None
     
     update_data = tra_gop_update.model_dump(exclude_unset=True)
+    if update_data.get("MaKH") is not None:
+        crud_khach_hang.resolve_khach_hang(db, db_tra_gop.HoTen, ma_kh=update_data["MaKH"])
+    else:
+        update_data.pop("MaKH", None)  # Hợp đồng luôn thuộc một khách hàng
     for key, value in update_data.items():
         setattr(db_tra_gop, key, value)
+    if update_data.keys() & {"NgayVay", "KyDong"}:
+        reset_schedule_position(db_tra_gop, clock.today())
+    elif "TrangThai" in update_data:
+        refresh_due_date(db_tra_gop, clock.today())
     
     db.commit()
     db.refresh(db_tra_gop)
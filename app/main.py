@@ -5,8 +5,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
-from app.core.database import engine, Base
-from app.routers import tin_chap, tra_gop, lich_su_tra_lai, no_phai_thu, dashboard, lich_su
+from app.core import config
+from app.core.database import engine, Base, SQLITE_ONLY_FEATURES
+from app.core.writer import write_queue
+from app.core.replica import REPLICA_ENABLED, replica_engine, snapshotter
+from app.core.query_log import install_slow_query_log
+from app.core.request_context import RequestContextMiddleware
+from app.crud.schedule_job import schedule_worker
+from app.routers import tin_chap, tra_gop, lich_su_tra_lai, no_phai_thu, dashboard, lich_su, khach_hang
 
 # Configure logging for the application
 logging.basicConfig(
@@ -19,6 +25,11 @@ logging.basicConfig(
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+# Log truy vấn chậm (database chính và analytics replica)
+if config.SLOW_QUERY_LOG_ENABLED:
+    install_slow_query_log(engine)
+    install_slow_query_log(replica_engine)
+
 # Create FastAPI instance
 app = FastAPI(
     title="API App Credit",
@@ -37,6 +48,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Route hiện tại cho log (phải là middleware ngoài cùng để bao cả request)
+app.add_middleware(RequestContextMiddleware)
+
 # Include routers
 app.include_router(tin_chap.router)
 app.include_router(tra_gop.router)
@@ -44,6 +58,7 @@ app.include_router(lich_su_tra_lai.router)
 app.include_router(no_phai_thu.router)
 app.include_router(dashboard.router)
 app.include_router(lich_su.router)
+app.include_router(khach_hang.router)
 # Startup event
 @app.on_event("startup")
 async def startup_event():
@@ -53,6 +68,34 @@ async def startup_event():
     logger.info("🚀 API App Credit Started!")
     logger.info("="*60)
 
+    if engine.dialect.name != "sqlite":
+        logger.warning(
+            "⚠️  Database %s: các tính năng chỉ có trên SQLite bị tắt: %s",
+            engine.dialect.name,
+            "; ".join(SQLITE_ONLY_FEATURES),
+        )
+
+    if config.WRITE_QUEUE_ENABLED:
+        write_queue.start()
+        logger.info("✍️  Single-writer queue started (group commit)")
+
+    if REPLICA_ENABLED:
+        snapshotter.start()
+        logger.info("📸 Analytics replica snapshotter started")
+
+    if config.SCHEDULE_WORKER_ENABLED:
+        schedule_worker.start()
+        logger.info("🗓️  Schedule job worker started")
+
+
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush pending writes before exit"""
+    schedule_worker.stop()
+    write_queue.stop()
+    snapshotter.stop()
+
 
 # Root endpoints
 @app.get("/")
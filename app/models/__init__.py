@@ -4,6 +4,17 @@ Database models package
 from app.models.tin_chap import TinChap
 from app.models.tra_gop import TraGop
 from app.models.lich_su_tra_lai import LichSuTraLai
+from app.models.khach_hang import KhachHang
+from app.models.id_sequence import IdSequence
+from app.models.contract_version import ContractVersion
+from app.models.daily_collection_rollup import DailyCollectionRollup
+from app.models.payment_ledger import PaymentLedger
+from app.models.idempotency_key import IdempotencyKey
+from app.models.schedule_job import ScheduleJob
+from app.models.archive import TinChapArchive, TraGopArchive, LichSuTraLaiArchive
+from app.models import contract_search  # FTS5 search index (tables + triggers)
+from app.models import due_date  # Điền ngày đến hạn tiếp theo cho database cũ
 
-__all__ = ["TinChap", "TraGop", "LichSuTraLai"]
-
+__all__ = ["TinChap", "TraGop", "LichSuTraLai", "KhachHang", "IdSequence", "ContractVersion", "DailyCollectionRollup",
+           "PaymentLedger", "IdempotencyKey", "ScheduleJob",
+           "TinChapArchive", "TraGopArchive", "LichSuTraLaiArchive"]
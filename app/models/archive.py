@@ -0,0 +1,90 @@
+"""
+Archive models - Bảng lưu trữ hợp đồng đã tất toán (cold storage)
+
+Hợp đồng Đã tất toán quá một khoảng thời gian được chuyển khỏi các bảng
+đang dùng (tin_chap, tra_gop, lich_su_tra_lai) sang các bảng *_archive cùng
+cấu trúc (thêm cột NgayLuuTru), để chỉ mục và các truy vấn danh mục đang
+hoạt động không phình theo lịch sử. Xem app.services.archive.
+"""
+from sqlalchemy import Column, Date, Index, Table, event, text
+from sqlalchemy.engine import Connection
+
+from app.core.database import Base
+from app.models.tin_chap import TinChap
+from app.models.tra_gop import TraGop
+from app.models.lich_su_tra_lai import LichSuTraLai
+
+
+def _archive_table(source: Table) -> Table:
+    """Tạo bảng lưu trữ cùng cột với bảng nguồn, thêm NgayLuuTru"""
+    columns = [
+        Column(
+            column.name,
+            column.type,
+            primary_key=column.primary_key,
+            nullable=column.nullable,
+            server_default=column.server_default.arg if column.server_default is not None else None,
+            autoincrement=False,  # Giữ nguyên khóa của bảng nguồn
+        )
+        for column in source.columns
+    ]
+    columns.append(Column("NgayLuuTru", Date, nullable=False))  # Ngày chuyển vào lưu trữ
+    return Table(f"{source.name}_archive", Base.metadata, *columns)
+
+
+class TinChapArchive(Base):
+    """
+    Tín chấp đã lưu trữ
+    """
+    __table__ = _archive_table(TinChap.__table__)
+
+
+class TraGopArchive(Base):
+    """
+    Trả góp đã lưu trữ
+    """
+    __table__ = _archive_table(TraGop.__table__)
+
+
+class LichSuTraLaiArchive(Base):
+    """
+    Lịch sử trả lãi của hợp đồng đã lưu trữ
+    """
+    __table__ = _archive_table(LichSuTraLai.__table__)
+
+
+Index("ix_lich_su_tra_lai_archive_MaHD", LichSuTraLaiArchive.__table__.c.MaHD)
+Index("ix_lich_su_tra_lai_archive_Ngay", LichSuTraLaiArchive.__table__.c.Ngay)
+
+
+# Bảng đang dùng -> bảng lưu trữ tương ứng
+ARCHIVE_MODELS = {
+    TinChap: TinChapArchive,
+    TraGop: TraGopArchive,
+    LichSuTraLai: LichSuTraLaiArchive,
+}
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _reserve_archived_keys(target, connection: Connection, **kw):
+    """
+    Bộ đếm AUTOINCREMENT của lich_su_tra_lai không thấp hơn Stt lớn nhất đã lưu trữ
+
+    Database tạo trước khi bảng có AUTOINCREMENT có thể đã xóa (lưu trữ) các
+    Stt lớn nhất; bộ đếm được nâng lên để Stt mới không trùng với bảng lưu
+    trữ. Chỉ đọc max theo khóa chính nên chạy mỗi lần khởi động không tốn gì.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    source = LichSuTraLai.__table__.name
+    archive = LichSuTraLaiArchive.__table__.name
+    connection.execute(
+        text("INSERT INTO sqlite_sequence (name, seq) SELECT :name, 0 "
+             "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"),
+        {"name": source},
+    )
+    connection.execute(
+        text(f"UPDATE sqlite_sequence SET seq = (SELECT MAX(Stt) FROM {archive}) "
+             f"WHERE name = :name AND seq < (SELECT MAX(Stt) FROM {archive})"),
+        {"name": source},
+    )
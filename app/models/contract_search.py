@@ -0,0 +1,185 @@
+"""
+ContractSearch - Chỉ mục tìm kiếm toàn văn (SQLite FTS5) cho hợp đồng
+
+Bảng ảo `contract_search` chứa MaHD + HoTen của cả Tín chấp và Trả góp.
+Tokenizer `unicode61 remove_diacritics 2` bỏ dấu tiếng Việt khi đánh chỉ mục,
+riêng "đ" được trigger đổi thành "d" trước khi ghi (tokenizer không tách được).
+Trigger trên tin_chap/tra_gop giữ chỉ mục luôn đồng bộ.
+"""
+from sqlalchemy import event, column, table, text, literal_column, select, or_, func
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.database import Base
+from app.utils.search import build_fts_query, customer_name_key, needs_substring_search
+
+
+CONTRACT_SEARCH_TABLE = "contract_search"
+
+# Lightweight table construct dùng để viết truy vấn (không đăng ký vào Base.metadata)
+contract_search = table(
+    CONTRACT_SEARCH_TABLE,
+    column("MaHD"),
+    column("HoTen"),
+    column("LoaiHD"),
+)
+
+# (bảng nguồn, loại hợp đồng)
+_SOURCE_TABLES = (("tin_chap", "TC"), ("tra_gop", "TG"))
+
+
+def _fold_sql(expr: str) -> str:
+    """Biểu thức SQL đổi đ/Đ -> d (phần dấu còn lại do tokenizer xử lý)"""
+    return f"replace(replace({expr}, 'Đ', 'd'), 'đ', 'd')"
+
+
+def _create_statements() -> list:
+    """Các câu lệnh DDL tạo bảng FTS5 và trigger đồng bộ"""
+    statements = [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {CONTRACT_SEARCH_TABLE} USING fts5(
+            MaHD,
+            HoTen,
+            LoaiHD UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """
+    ]
+    for source, loai in _SOURCE_TABLES:
+        insert_new = (
+            f"INSERT INTO {CONTRACT_SEARCH_TABLE}(MaHD, HoTen, LoaiHD) "
+            f"VALUES (new.MaHD, {_fold_sql('new.HoTen')}, '{loai}');"
+        )
+        # MaHD chỉ có một token nên MATCH theo cột MaHD xác định đúng một dòng
+        delete_old = (
+            f"DELETE FROM {CONTRACT_SEARCH_TABLE} "
+            f"WHERE {CONTRACT_SEARCH_TABLE} MATCH 'MaHD:\"' || old.MaHD || '\"';"
+        )
+        statements += [
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {source}_search_ai AFTER INSERT ON {source}
+            BEGIN
+                {insert_new}
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {source}_search_ad AFTER DELETE ON {source}
+            BEGIN
+                {delete_old}
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {source}_search_au AFTER UPDATE OF MaHD, HoTen ON {source}
+            BEGIN
+                {delete_old}
+                {insert_new}
+            END
+            """,
+        ]
+    return statements
+
+
+def rebuild_contract_search(connection: Connection) -> int:
+    """
+    Xây dựng lại toàn bộ chỉ mục tìm kiếm từ tin_chap và tra_gop
+
+    Dùng khi khôi phục dữ liệu hoặc khi chỉ mục bị lệch.
+
+    Args:
+        connection: Kết nối database (SQLite)
+
+    Returns:
+        Số hợp đồng đã đưa vào chỉ mục
+    """
+    connection.execute(text(f"DELETE FROM {CONTRACT_SEARCH_TABLE}"))
+    total = 0
+    for source, loai in _SOURCE_TABLES:
+        result = connection.execute(text(
+            f"INSERT INTO {CONTRACT_SEARCH_TABLE}(MaHD, HoTen, LoaiHD) "
+            f"SELECT MaHD, {_fold_sql('HoTen')}, '{loai}' FROM {source}"
+        ))
+        total += result.rowcount
+    return total
+
+
+def contract_search_ids(fts_query: str, loai_hd: str):
+    """
+    Subquery trả về các MaHD khớp câu truy vấn FTS5
+
+    Args:
+        fts_query: Câu truy vấn MATCH (xem app.utils.search.build_fts_query)
+        loai_hd: "TC" hoặc "TG"
+
+    Returns:
+        Select MaHD dùng được với column.in_()
+    """
+    return select(contract_search.c.MaHD).where(
+        literal_column(CONTRACT_SEARCH_TABLE).match(fts_query),
+        contract_search.c.LoaiHD == loai_hd,
+    )
+
+
+def contract_search_filter(db: Session, model, loai_hd: str, search: str):
+    """
+    Điều kiện lọc hợp đồng theo chuỗi tìm kiếm (họ tên hoặc mã hợp đồng)
+
+    Dùng chỉ mục FTS5 (không dấu, theo tiền tố của từ) khi chạy trên SQLite;
+    với database khác hoặc chuỗi không có từ hợp lệ thì quay về ILIKE. Khớp
+    giữa chuỗi trên họ tên không dấu (hàm SQL fold_vietnamese) được dùng thêm
+    khi chuỗi chỉ gồm chữ số hoặc rất ngắn (needs_substring_search), như
+    "003" -> TC003, "an" -> "Lan", và khi FTS5 không tìm thấy hợp đồng nào,
+    như "guyen" -> "Nguyễn". Các trường hợp này quét bảng.
+
+    Args:
+        db: Database session
+        model: TinChap hoặc TraGop
+        loai_hd: "TC" hoặc "TG"
+        search: Chuỗi tìm kiếm
+
+    Returns:
+        Biểu thức điều kiện dùng cho query.filter()
+    """
+    like = f"%{search}%"
+
+    fts_query = build_fts_query(search)
+    if not fts_query or db.get_bind().dialect.name != "sqlite":
+        return or_(model.HoTen.ilike(like), model.MaHD.ilike(like))
+
+    substring = or_(
+        func.fold_vietnamese(model.HoTen).like(f"%{customer_name_key(search)}%"),
+        model.MaHD.ilike(like),
+    )
+    fts_ids = contract_search_ids(fts_query, loai_hd)
+    if needs_substring_search(search):
+        return or_(model.MaHD.in_(fts_ids), substring)
+    if not db.execute(select(fts_ids.exists())).scalar():
+        return substring
+    return model.MaHD.in_(fts_ids)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_contract_search(target, connection: Connection, **kw):
+    """Tạo bảng FTS5 + trigger sau create_all (chỉ áp dụng cho SQLite)"""
+    if connection.dialect.name != "sqlite":
+        return
+
+    existed = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": CONTRACT_SEARCH_TABLE},
+    ).first() is not None
+
+    for statement in _create_statements():
+        connection.execute(text(statement))
+
+    # Database đã có dữ liệu từ trước: đưa các hợp đồng hiện có vào chỉ mục
+    if not existed:
+        rebuild_contract_search(connection)
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def _drop_contract_search(target, connection: Connection, **kw):
+    """Xóa bảng FTS5 cùng với drop_all để lần tạo lại được đánh chỉ mục từ đầu"""
+    if connection.dialect.name != "sqlite":
+        return
+    connection.execute(text(f"DROP TABLE IF EXISTS {CONTRACT_SEARCH_TABLE}"))
@@ -0,0 +1,98 @@
+"""
+ContractVersion model - Phiên bản thay đổi của từng hợp đồng
+
+Version tăng mỗi khi hợp đồng hoặc một dòng LichSuTraLai của nó được
+thêm/sửa/xóa. Việc tăng được thực hiện bằng trigger SQLite nên mọi đường
+ghi (ORM, UPDATE hàng loạt, công cụ ngoài) đều được tính. Dùng để tạo ETag
+cho các API đọc hợp đồng.
+"""
+from sqlalchemy import Column, Integer, String, event, text
+from sqlalchemy.engine import Connection
+
+from app.core.database import Base
+
+
+class ContractVersion(Base):
+    """
+    Phiên bản thay đổi của hợp đồng
+    """
+    __tablename__ = "contract_version"
+
+    MaHD = Column(String, primary_key=True)  # Contract ID (TinChap hoặc TraGop)
+    Version = Column(Integer, nullable=False, default=1)  # Tăng sau mỗi lần ghi
+
+    def __repr__(self):
+        return f"<ContractVersion(MaHD='{self.MaHD}', Version={self.Version})>"
+
+
+# Các bảng mà mỗi lần ghi phải tăng version của hợp đồng liên quan
+_VERSIONED_TABLES = ("tin_chap", "tra_gop", "lich_su_tra_lai")
+
+
+def _bump_sql(ma_hd_expr: str) -> str:
+    """Câu lệnh UPSERT tăng version cho MaHD"""
+    return (
+        f"INSERT INTO contract_version(MaHD, Version) {ma_hd_expr} "
+        "ON CONFLICT(MaHD) DO UPDATE SET Version = Version + 1;"
+    )
+
+
+def _create_statements() -> list:
+    """Trigger tăng version cho insert/update/delete"""
+    statements = []
+    for source in _VERSIONED_TABLES:
+        statements += [
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {source}_version_ai AFTER INSERT ON {source}
+            BEGIN
+                {_bump_sql("SELECT new.MaHD, 1 WHERE true")}
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {source}_version_ad AFTER DELETE ON {source}
+            BEGIN
+                {_bump_sql("SELECT old.MaHD, 1 WHERE true")}
+            END
+            """,
+            # UNION gộp MaHD cũ/mới: đổi MaHD thì cả hai hợp đồng đều tăng version
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {source}_version_au AFTER UPDATE ON {source}
+            BEGIN
+                {_bump_sql("SELECT MaHD, 1 FROM (SELECT new.MaHD AS MaHD UNION SELECT old.MaHD) WHERE true")}
+            END
+            """,
+        ]
+    return statements
+
+
+def versions_are_maintained(bind) -> bool:
+    """
+    Version chỉ được tăng (bằng trigger) trên SQLite; trên database khác
+    không có version, các API đọc bỏ ETag thay vì trả ETag cũ
+
+    Args:
+        bind: Engine hoặc Connection
+    """
+    return bind.dialect.name == "sqlite"
+
+
+@event.listens_for(ContractVersion.__table__, "after_create")
+def _mark_contract_version_created(target, connection: Connection, **kw):
+    """Đánh dấu bảng vừa được tạo để điền version cho dữ liệu có sẵn"""
+    connection.info["contract_version_created"] = True
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_version_triggers(target, connection: Connection, **kw):
+    """Tạo trigger tăng version sau create_all (trigger chỉ áp dụng cho SQLite)"""
+    if not versions_are_maintained(connection):
+        connection.info.pop("contract_version_created", None)
+        return
+    if connection.info.pop("contract_version_created", False):
+        # Database đã có dữ liệu: mọi hợp đồng hiện có bắt đầu từ version 1
+        for source in ("tin_chap", "tra_gop"):
+            connection.execute(text(
+                f"INSERT INTO contract_version(MaHD, Version) SELECT MaHD, 1 FROM {source}"
+            ))
+    for statement in _create_statements():
+        connection.execute(text(statement))
@@ -0,0 +1,150 @@
+"""
+DailyCollectionRollup model - Tổng hợp thu tiền theo ngày
+
+Mỗi dòng là tổng hợp các kỳ LichSuTraLai của một ngày (Ngay) và một loại
+hợp đồng (LoaiHD: "TC"/"TG"): số kỳ đã trả/chưa trả, tổng tiền phải thu và
+đã thu. Bảng được cập nhật tăng dần bằng trigger SQLite trên lich_su_tra_lai,
+nên mọi đường ghi (pay_lich_su, tat_toan_hop_dong, auto_create_lich_su, UPDATE
+hàng loạt) đều được tính. Thống kê cả năm chỉ cần đọc ~365 dòng/loại.
+"""
+from sqlalchemy import Column, Date, Integer, String, event, text
+from sqlalchemy.engine import Connection
+
+from app.core.database import Base
+from app.core.enums import TrangThaiThanhToan
+
+
+class DailyCollectionRollup(Base):
+    """
+    Tổng hợp thu tiền theo (Ngay, LoaiHD)
+    """
+    __tablename__ = "daily_collection_rollup"
+
+    Ngay = Column(Date, primary_key=True)  # Ngày của kỳ thanh toán
+    LoaiHD = Column(String, primary_key=True)  # "TC" (Tín chấp) hoặc "TG" (Trả góp)
+    SoKyDaTra = Column(Integer, nullable=False, default=0)  # Số kỳ Đóng đủ / Đã tất toán
+    SoKyChuaTra = Column(Integer, nullable=False, default=0)  # Số kỳ còn lại
+    TongPhaiThu = Column(Integer, nullable=False, default=0)  # Tổng SoTien
+    TongDaThu = Column(Integer, nullable=False, default=0)  # Tổng TienDaTra
+
+    def __repr__(self):
+        return (
+            f"<DailyCollectionRollup(Ngay={self.Ngay}, LoaiHD='{self.LoaiHD}', "
+            f"SoKyDaTra={self.SoKyDaTra}, SoKyChuaTra={self.SoKyChuaTra})>"
+        )
+
+
+ROLLUP_TABLE = DailyCollectionRollup.__tablename__
+
+# Trạng thái được tính là "đã trả" (cùng quy tắc với crud.lich_su.get_lich_su)
+_PAID_STATUSES = (TrangThaiThanhToan.DONG_DU.value, TrangThaiThanhToan.DA_TAT_TOAN.value)
+
+
+def _is_paid_sql(row: str) -> str:
+    """Biểu thức SQL: 1 nếu dòng đã trả, ngược lại 0"""
+    statuses = ", ".join(f"'{status}'" for status in _PAID_STATUSES)
+    return f"({row}.TrangThaiThanhToan IN ({statuses}))"
+
+
+def _add_sql(row: str, sign: str) -> str:
+    """Cộng (sign="+") hoặc trừ (sign="-") một dòng lich_su_tra_lai vào tổng hợp"""
+    paid = _is_paid_sql(row)
+    return (
+        f"INSERT INTO {ROLLUP_TABLE}(Ngay, LoaiHD, SoKyDaTra, SoKyChuaTra, TongPhaiThu, TongDaThu) "
+        f"VALUES ({row}.Ngay, substr({row}.MaHD, 1, 2), {sign}{paid}, {sign}(1 - {paid}), "
+        f"{sign}{row}.SoTien, {sign}{row}.TienDaTra) "
+        "ON CONFLICT(Ngay, LoaiHD) DO UPDATE SET "
+        "SoKyDaTra = SoKyDaTra + excluded.SoKyDaTra, "
+        "SoKyChuaTra = SoKyChuaTra + excluded.SoKyChuaTra, "
+        "TongPhaiThu = TongPhaiThu + excluded.TongPhaiThu, "
+        "TongDaThu = TongDaThu + excluded.TongDaThu;"
+    )
+
+
+def _prune_sql(row: str) -> str:
+    """Xóa dòng tổng hợp không còn kỳ nào (giống thống kê tính từ dữ liệu gốc)"""
+    return (
+        f"DELETE FROM {ROLLUP_TABLE} "
+        f"WHERE Ngay = {row}.Ngay AND LoaiHD = substr({row}.MaHD, 1, 2) "
+        "AND SoKyDaTra = 0 AND SoKyChuaTra = 0;"
+    )
+
+
+def _create_statements() -> list:
+    """Trigger cập nhật tổng hợp khi lich_su_tra_lai thay đổi"""
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lich_su_tra_lai_rollup_ai AFTER INSERT ON lich_su_tra_lai
+        BEGIN
+            {_add_sql("new", "+")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lich_su_tra_lai_rollup_ad AFTER DELETE ON lich_su_tra_lai
+        BEGIN
+            {_add_sql("old", "-")}
+            {_prune_sql("old")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS lich_su_tra_lai_rollup_au
+        AFTER UPDATE OF MaHD, Ngay, SoTien, TienDaTra, TrangThaiThanhToan ON lich_su_tra_lai
+        BEGIN
+            {_add_sql("old", "-")}
+            {_add_sql("new", "+")}
+            {_prune_sql("old")}
+        END
+        """,
+    ]
+
+
+def rebuild_daily_collection_rollup(connection: Connection) -> int:
+    """
+    Tính lại toàn bộ bảng tổng hợp từ lich_su_tra_lai
+
+    Dùng khi khôi phục dữ liệu hoặc khi bảng tổng hợp bị lệch
+    (xem `python manage.py rebuild-rollup`).
+
+    Args:
+        connection: Kết nối database
+
+    Returns:
+        Số dòng tổng hợp sau khi tính lại
+    """
+    paid = _is_paid_sql("lich_su_tra_lai")
+    connection.execute(text(f"DELETE FROM {ROLLUP_TABLE}"))
+    result = connection.execute(text(
+        f"INSERT INTO {ROLLUP_TABLE}(Ngay, LoaiHD, SoKyDaTra, SoKyChuaTra, TongPhaiThu, TongDaThu) "
+        f"SELECT Ngay, substr(MaHD, 1, 2), SUM({paid}), SUM(1 - {paid}), SUM(SoTien), SUM(TienDaTra) "
+        "FROM lich_su_tra_lai GROUP BY Ngay, substr(MaHD, 1, 2)"
+    ))
+    return result.rowcount
+
+
+def rollup_is_maintained(bind) -> bool:
+    """
+    Bảng tổng hợp chỉ được cập nhật (bằng trigger) trên SQLite
+
+    Args:
+        bind: Engine hoặc Connection
+    """
+    return bind.dialect.name == "sqlite"
+
+
+@event.listens_for(DailyCollectionRollup.__table__, "after_create")
+def _mark_rollup_created(target, connection: Connection, **kw):
+    """Đánh dấu bảng vừa được tạo để tính tổng hợp cho dữ liệu có sẵn"""
+    connection.info["daily_collection_rollup_created"] = True
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_rollup_triggers(target, connection: Connection, **kw):
+    """Tạo trigger tổng hợp sau create_all (chỉ áp dụng cho SQLite)"""
+    if not rollup_is_maintained(connection):
+        connection.info.pop("daily_collection_rollup_created", None)
+        return
+    if connection.info.pop("daily_collection_rollup_created", False):
+        # Database đã có lịch sử từ trước: tính tổng hợp ban đầu
+        rebuild_daily_collection_rollup(connection)
+    for statement in _create_statements():
+        connection.execute(text(statement))
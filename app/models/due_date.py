@@ -0,0 +1,52 @@
+"""
+Điền NgayDenHanTiepTheo / KyHienTai cho hợp đồng có sẵn
+
+Hai cột được thêm vào database cũ bằng ALTER TABLE (xem
+app.core.database._ensure_columns) với giá trị rỗng; sau create_all, các hợp
+đồng chưa tất toán chưa có ngày đến hạn tiếp theo được tính từ lịch
+(NgayVay, KyDong). Các lần khởi động sau chỉ tra chỉ mục và không còn dòng
+nào cần điền.
+"""
+from datetime import timedelta
+
+from sqlalchemy import bindparam, event, select, update
+from sqlalchemy.engine import Connection
+
+from app.core import clock
+from app.core.database import Base
+from app.core.enums import TrangThaiThanhToan
+from app.models.tin_chap import TinChap
+from app.models.tra_gop import TraGop
+from app.utils.schedule import period_due_date, periods_due_by
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _backfill_due_dates(target, connection: Connection, **kw):
+    """Tính ngày đến hạn tiếp theo cho hợp đồng chưa tất toán còn thiếu"""
+    today = clock.today()
+    for model in (TinChap, TraGop):
+        table = model.__table__
+        rows = connection.execute(
+            select(table.c.MaHD, table.c.NgayVay, table.c.KyDong).where(
+                table.c.NgayDenHanTiepTheo.is_(None),
+                table.c.TrangThai != TrangThaiThanhToan.DA_TAT_TOAN.value,
+                table.c.KyDong > 0,
+            )
+        ).all()
+        if not rows:
+            continue
+        # Kỳ đến hạn đúng hôm nay vẫn chờ lần cộng dồn của hôm nay
+        values = []
+        for ma_hd, ngay_vay, ky_dong in rows:
+            ky_hien_tai = periods_due_by(ngay_vay, ky_dong, today - timedelta(days=1))
+            values.append({
+                "ma_hd": ma_hd,
+                "ky_hien_tai": ky_hien_tai,
+                "ngay_den_han": period_due_date(ngay_vay, ky_dong, ky_hien_tai + 1),
+            })
+        connection.execute(
+            update(table)
+            .where(table.c.MaHD == bindparam("ma_hd"))
+            .values(KyHienTai=bindparam("ky_hien_tai"), NgayDenHanTiepTheo=bindparam("ngay_den_han")),
+            values,
+        )
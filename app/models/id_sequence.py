@@ -0,0 +1,20 @@
+"""
+IdSequence model - Bộ đếm cấp mã hợp đồng
+"""
+from sqlalchemy import Column, Integer, String
+from app.core.database import Base
+
+
+class IdSequence(Base):
+    """
+    Bộ đếm mã hợp đồng theo tiền tố (TC, TG)
+
+    GiaTri là số thứ tự đã cấp gần nhất; cấp mã mới = tăng GiaTri nguyên tử.
+    """
+    __tablename__ = "id_sequence"
+
+    Ten = Column(String, primary_key=True)  # Tiền tố mã hợp đồng: "TC" hoặc "TG"
+    GiaTri = Column(Integer, nullable=False, default=0)  # Số thứ tự đã cấp gần nhất
+
+    def __repr__(self):
+        return f"<IdSequence(Ten='{self.Ten}', GiaTri={self.GiaTri})>"
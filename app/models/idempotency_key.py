@@ -0,0 +1,29 @@
+"""
+IdempotencyKey model - Kết quả đã lưu của request có header Idempotency-Key
+
+Client gửi lại cùng một request thanh toán / tất toán (mạng chập chờn) với
+cùng Idempotency-Key sẽ nhận lại kết quả đã lưu bằng một lần đọc theo khóa
+chính, không chạy lại thao tác. Dòng hết hạn (HetHan) bị xóa dần khi có
+request mới (xem crud.idempotency).
+"""
+import datetime
+
+from sqlalchemy import Column, DateTime, String, Text
+
+from app.core.database import Base
+
+
+class IdempotencyKey(Base):
+    """
+    Một Idempotency-Key đã dùng và kết quả của request đó
+    """
+    __tablename__ = "idempotency_key"
+
+    Khoa = Column(String, primary_key=True)  # Giá trị header Idempotency-Key
+    DauVet = Column(String, nullable=False)  # Thao tác + tham số (cùng khóa cho request khác: 422)
+    KetQua = Column(Text, nullable=False)  # Kết quả (JSON) trả lại cho các lần gửi lại
+    ThoiGian = Column(DateTime, nullable=False, default=datetime.datetime.now)  # Thời điểm thực hiện
+    HetHan = Column(DateTime, nullable=False, index=True)  # Sau thời điểm này khóa được dùng lại
+
+    def __repr__(self):
+        return f"<IdempotencyKey(Khoa='{self.Khoa}', DauVet='{self.DauVet}')>"
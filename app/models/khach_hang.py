@@ -0,0 +1,75 @@
+"""
+KhachHang model - Khách hàng (một người có thể có nhiều hợp đồng)
+"""
+from sqlalchemy import Column, Integer, String, bindparam, cast, event, func, select, update
+from sqlalchemy.engine import Connection
+
+from app.core.database import Base
+from app.models.id_sequence import IdSequence
+from app.models.tin_chap import TinChap
+from app.models.tra_gop import TraGop
+
+
+class KhachHang(Base):
+    """
+    Khách hàng - TinChap / TraGop trỏ tới qua cột MaKH
+    """
+    __tablename__ = "khach_hang"
+
+    MaKH = Column(String, primary_key=True, index=True)  # Format: KHXXX
+    HoTen = Column(String, nullable=False)
+    TenKhongDau = Column(String, nullable=False, index=True)  # Họ tên bỏ dấu, chữ thường: chỉ để tìm kiếm (xem customer_name_key)
+    SoDienThoai = Column(String, nullable=True, index=True)
+    CCCD = Column(String, nullable=True, unique=True)  # Số CCCD / CMND
+
+    def __repr__(self):
+        return f"<KhachHang(MaKH='{self.MaKH}', HoTen='{self.HoTen}')>"
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _link_existing_contracts(target, connection: Connection, **kw):
+    """
+    Tạo khách hàng cho các hợp đồng chưa có MaKH (database cũ)
+
+    Hợp đồng cũ chỉ có HoTen, không có số điện thoại / CCCD để nhận diện,
+    nên mỗi hợp đồng có một khách hàng riêng: họ tên giống nhau (hay cùng
+    khóa không dấu) chưa chắc là một người. Gộp khách hàng bằng cách đổi MaKH
+    của hợp đồng. Các lần khởi động sau không còn hợp đồng nào thiếu MaKH.
+    """
+    # Import muộn: app.utils nạp id_generator, vốn cần app.models đã đủ
+    from app.utils.search import customer_name, customer_name_key
+
+    pending = []
+    for model in (TinChap, TraGop):
+        table = model.__table__
+        rows = connection.execute(select(table.c.MaHD, table.c.HoTen).where(table.c.MaKH.is_(None))).all()
+        pending.extend((model, ma_hd, ho_ten) for ma_hd, ho_ten in rows)
+    if not pending:
+        return
+
+    # Cấp mã KH từ cùng bộ đếm với app.utils.id_generator
+    customers = KhachHang.__table__
+    sequence = IdSequence.__table__
+    last_number = connection.execute(select(sequence.c.GiaTri).where(sequence.c.Ten == "KH")).scalar()
+    if last_number is None:
+        last_number = connection.execute(
+            select(func.max(cast(func.substr(customers.c.MaKH, 3), Integer)))
+        ).scalar() or 0
+        connection.execute(sequence.insert().values(Ten="KH", GiaTri=last_number))
+    connection.execute(sequence.update().where(sequence.c.Ten == "KH").values(GiaTri=last_number + len(pending)))
+
+    new_customers = []
+    links = {TinChap: [], TraGop: []}
+    for number, (model, ma_hd, ho_ten) in enumerate(pending, start=last_number + 1):
+        ma_kh = f"KH{number:03d}"
+        new_customers.append({"MaKH": ma_kh, "HoTen": customer_name(ho_ten), "TenKhongDau": customer_name_key(ho_ten)})
+        links[model].append({"ma_hd": ma_hd, "ma_kh": ma_kh})
+    connection.execute(customers.insert(), new_customers)
+
+    for model, values in links.items():
+        if values:
+            table = model.__table__
+            connection.execute(
+                update(table).where(table.c.MaHD == bindparam("ma_hd")).values(MaKH=bindparam("ma_kh")),
+                values,
+            )
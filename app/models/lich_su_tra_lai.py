@@ -1,7 +1,7 @@
 """
 LichSuTraLai model - Lịch sử trả lãi (Payment history)
 """
-from sqlalchemy import Column, Integer, String, Date
+from sqlalchemy import Column, Integer, String, Date, Index
 from app.core.database import Base
 import datetime
 
@@ -11,10 +11,18 @@ class LichSuTraLai(Base):
     Lịch sử trả lãi - Payment history
     """
     __tablename__ = "lich_su_tra_lai"
+    __table_args__ = (
+        # Các kỳ theo trạng thái (còn nợ / đã trả), có thể kèm khoảng ngày: thống kê tài chính
+        Index("ix_lich_su_tra_lai_TrangThaiThanhToan_Ngay", "TrangThaiThanhToan", "Ngay"),
+        # Chuyển trạng thái ngày hàng loạt: chỉ chạm các kỳ cần đổi (xem transition_payment_statuses)
+        Index("ix_lich_su_tra_lai_TrangThaiNgayThanhToan_Ngay", "TrangThaiNgayThanhToan", "Ngay"),
+        # Không cấp lại Stt của dòng đã xóa / đã lưu trữ (bảng lưu trữ và sổ thu tiền giữ Stt cũ)
+        {"sqlite_autoincrement": True},
+    )
 
     Stt = Column(Integer, primary_key=True, autoincrement=True)
     MaHD = Column(String, nullable=False, index=True)  # Contract ID (can be from TinChap or TraGop)
-    Ngay = Column(Date, nullable=False, default=datetime.date.today)
+    Ngay = Column(Date, nullable=False, default=datetime.date.today, index=True)  # Lọc theo ngày: no-phai-thu, thống kê
     SoTien = Column(Integer, nullable=False)
     NoiDung = Column(String, nullable=True)
     TrangThaiThanhToan = Column(String, nullable=False)  # Trạng thái thanh toán
@@ -0,0 +1,102 @@
+"""
+PaymentLedger model - Sổ thu tiền (chỉ thêm, không sửa / xóa)
+
+Mỗi khoản tiền được ghi nhận (thanh toán kỳ, thanh toán hàng loạt, tất toán,
+trả gốc) là một dòng mới; TienDaTra của lich_su_tra_lai vẫn là trạng thái
+hiện tại, còn sổ cho biết đã thu bao nhiêu, vào ngày nào, qua đường nào.
+"Thu được bao nhiêu trong khoảng ngày" là tổng trên chỉ mục NgayThu, và tổng
+của một kỳ trong sổ phải bằng TienDaTra (xem crud.payment_ledger.verify_ledger).
+
+Trên SQLite, trigger chặn UPDATE / DELETE trên bảng.
+"""
+import datetime
+
+from sqlalchemy import Column, Date, DateTime, Index, Integer, String, event, literal, null, select, text
+from sqlalchemy.engine import Connection
+
+from app.core import clock
+from app.core.database import Base
+from app.core.enums import NguonThanhToan
+from app.models.lich_su_tra_lai import LichSuTraLai
+from app.models.tin_chap import TinChap
+
+
+class PaymentLedger(Base):
+    """
+    Sổ thu tiền - một dòng cho mỗi khoản thu
+    """
+    __tablename__ = "payment_ledger"
+    __table_args__ = (
+        # Báo cáo thu tiền theo khoảng ngày (gom theo ngày / nguồn)
+        Index("ix_payment_ledger_NgayThu_Nguon", "NgayThu", "Nguon"),
+    )
+
+    Id = Column(Integer, primary_key=True, autoincrement=True)
+    ThoiGian = Column(DateTime, nullable=False, default=datetime.datetime.now)  # Thời điểm ghi (giờ máy chủ)
+    NgayThu = Column(Date, nullable=False)  # Ngày nghiệp vụ của khoản thu (clock.today())
+    Stt = Column(Integer, nullable=True, index=True)  # Kỳ lich_su_tra_lai (None: trả gốc)
+    MaHD = Column(String, nullable=False, index=True)
+    SoTien = Column(Integer, nullable=False)
+    Nguon = Column(String, nullable=False)  # NguonThanhToan
+
+    def __repr__(self):
+        return f"<PaymentLedger(Id={self.Id}, MaHD='{self.MaHD}', SoTien={self.SoTien}, Nguon='{self.Nguon}')>"
+
+
+LEDGER_TABLE = PaymentLedger.__tablename__
+
+
+def _create_statements() -> list:
+    """Trigger giữ sổ ở dạng chỉ thêm"""
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {LEDGER_TABLE}_no_update BEFORE UPDATE ON {LEDGER_TABLE}
+        BEGIN
+            SELECT RAISE(ABORT, '{LEDGER_TABLE} chỉ được thêm dòng mới');
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {LEDGER_TABLE}_no_delete BEFORE DELETE ON {LEDGER_TABLE}
+        BEGIN
+            SELECT RAISE(ABORT, '{LEDGER_TABLE} chỉ được thêm dòng mới');
+        END
+        """,
+    ]
+
+
+def _record_opening_balances(connection: Connection, today: datetime.date) -> None:
+    """
+    Số đã trả có sẵn (database cũ) thành các dòng SO_DU_DAU
+
+    Ngày thu thật không còn biết: khoản đã trả của một kỳ được ghi vào ngày
+    đến hạn của kỳ đó, tiền gốc đã trả của Tín chấp vào ngày tạo sổ.
+    """
+    ledger = PaymentLedger.__table__
+    lich_su = LichSuTraLai.__table__
+    tin_chap = TinChap.__table__
+    columns = ["ThoiGian", "NgayThu", "Stt", "MaHD", "SoTien", "Nguon"]
+    now = literal(datetime.datetime.now(), DateTime)
+    nguon = literal(NguonThanhToan.SO_DU_DAU.value)
+    connection.execute(ledger.insert().from_select(columns, select(
+        now, lich_su.c.Ngay, lich_su.c.Stt, lich_su.c.MaHD, lich_su.c.TienDaTra, nguon,
+    ).where(lich_su.c.TienDaTra != 0)))
+    connection.execute(ledger.insert().from_select(columns, select(
+        now, literal(today, Date), null(), tin_chap.c.MaHD, tin_chap.c.SoTienTraGoc, nguon,
+    ).where(tin_chap.c.SoTienTraGoc != 0)))
+
+
+@event.listens_for(PaymentLedger.__table__, "after_create")
+def _mark_ledger_created(target, connection: Connection, **kw):
+    """Đánh dấu bảng vừa được tạo để ghi số dư đầu cho dữ liệu có sẵn"""
+    connection.info["payment_ledger_created"] = True
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _install_ledger_triggers(target, connection: Connection, **kw):
+    """Ghi số dư đầu (lần đầu tạo sổ) và tạo trigger chỉ thêm (SQLite)"""
+    if connection.info.pop("payment_ledger_created", False):
+        _record_opening_balances(connection, clock.today())
+    if connection.dialect.name != "sqlite":
+        return
+    for statement in _create_statements():
+        connection.execute(text(statement))
@@ -0,0 +1,36 @@
+"""
+ScheduleJob model - Job tạo lịch sử trả lãi ở nền
+
+Tạo hợp đồng với async_schedule=true chỉ thêm một dòng vào bảng này (cùng
+transaction với hợp đồng) rồi trả về ngay; worker trong process
+(crud.schedule_job.schedule_worker) tạo lịch sử sau. Job nằm trong database
+nên không mất khi khởi động lại: job còn chờ được xử lý ở lần chạy sau.
+"""
+import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+
+from app.core.database import Base
+from app.core.enums import TrangThaiTaoLichSu
+
+
+class ScheduleJob(Base):
+    """
+    Job tạo lịch sử trả lãi cho một hợp đồng
+    """
+    __tablename__ = "schedule_job"
+    __table_args__ = (
+        # Worker lấy các job đang chờ theo thứ tự tạo
+        Index("ix_schedule_job_TrangThai_ThoiGianTao", "TrangThai", "ThoiGianTao"),
+    )
+
+    MaHD = Column(String, primary_key=True)  # Contract ID (TinChap hoặc TraGop)
+    TrangThai = Column(String, nullable=False, default=TrangThaiTaoLichSu.CHO.value)  # TrangThaiTaoLichSu
+    SoLanThu = Column(Integer, nullable=False, default=0)  # Số lần chạy lỗi
+    SoKyDaTao = Column(Integer, nullable=True)  # records_created của create_lich_su
+    Loi = Column(Text, nullable=True)  # Lỗi của lần chạy gần nhất
+    ThoiGianTao = Column(DateTime, nullable=False, default=datetime.datetime.now)
+    ThoiGianXong = Column(DateTime, nullable=True)  # Thời điểm tạo xong / bỏ cuộc
+
+    def __repr__(self):
+        return f"<ScheduleJob(MaHD='{self.MaHD}', TrangThai='{self.TrangThai}')>"
@@ -20,6 +20,10 @@ class TinChap(Base):
     LaiSuat = Column(Integer, nullable=False)  # Fixed interest amount (VNĐ)
     SoTienTraGoc = Column(Integer, nullable=True, default=0)  # Số tiền trả gốc (nếu cần cho tất toán)
     TrangThai = Column(String, nullable=False)  # [TrangThaiThanhToan, TrangThaiNgayThanhToan]
+    # Vị trí trên lịch thanh toán (xem app.utils.schedule)
+    KyHienTai = Column(Integer, nullable=False, default=0, server_default="0")  # Kỳ mới nhất đã tính vào lịch sử
+    NgayDenHanTiepTheo = Column(Date, nullable=True, index=True)  # Ngày đến hạn kỳ tiếp theo (None: đã tất toán)
+    MaKH = Column(String, nullable=True, index=True)  # Khách hàng (khach_hang.MaKH)
 
     # def __repr__(self):
     #     return f"<TinChap(MaHD='{self.MaHD}', HoTen='{self.HoTen}', SoTienVay={self.SoTienVay})>"
@@ -20,4 +20,8 @@ class TraGop(Base):
     SoLanTra = Column(Integer, nullable=False, default=0)  # Number of times to pay - Tổng số lần phải trả
     LaiSuat = Column(Integer, nullable=False)  # Fixed interest amount (VNĐ)
     TrangThai = Column(String, nullable=False)  # [TrangThaiThanhToan, TrangThaiNgayThanhToan]
+    # Vị trí trên lịch thanh toán (xem app.utils.schedule)
+    KyHienTai = Column(Integer, nullable=False, default=0, server_default="0")  # Kỳ mới nhất đã tính vào lịch sử
+    NgayDenHanTiepTheo = Column(Date, nullable=True, index=True)  # Ngày đến hạn kỳ tiếp theo (None: đã tất toán)
+    MaKH = Column(String, nullable=True, index=True)  # Khách hàng (khach_hang.MaKH)
 
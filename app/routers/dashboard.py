@@ -1,11 +1,16 @@
 """
 Dashboard API routes
 """
-from fastapi import APIRouter, Depends, Query
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Response
 from app.schemas.response import ApiResponse
-from app.schemas.dashboard import DashboardResponse
-from app.core.database import get_db
-from app.core.enums import TimePeriod
+from app.schemas.dashboard import DashboardResponse, ForecastResponse
+from app.core import clock
+from app.core.cache import result_cache
+from app.core.replica import get_analytics_db
+from app.core.enums import ForecastGroupBy, TimePeriod
 from sqlalchemy.orm import Session
 from app.crud import dashboard as crud_dashboard
 
@@ -16,16 +21,48 @@ router = APIRouter(
 
 @router.get("", response_model=ApiResponse[DashboardResponse])
 async def get_dashboard(
+    response: Response,
     time_period: str = Query(
         default="all",
         description="Mốc thời gian: all, this_month, this_quarter, this_year"
     ),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_analytics_db)
 ):
-    """Get dashboard data with time period filter"""
+    """Get dashboard data with time period filter (đọc từ analytics replica nếu bật)"""
     # Validate time_period
     if time_period not in TimePeriod.list_values():
         time_period = TimePeriod.ALL.value
     
-    result = crud_dashboard.get_dashboard(db=db, time_period=time_period)
-    return ApiResponse.success_response(data=result, message="Lấy dữ liệu dashboard thành công")
\ No newline at end of file
+    # Replica chỉ đổi khi được chụp lại: thời điểm chụp là một phần của khóa
+    data_as_of = response.headers["X-Data-As-Of"] if response.headers.get("X-Data-Source") == "replica" else None
+    cache_key = ("dashboard", time_period, clock.today(), data_as_of)
+    result = result_cache.get_or_set(
+        cache_key,
+        lambda: crud_dashboard.get_dashboard(db=db, time_period=time_period),
+    )
+    return ApiResponse.success_response(data=result, message="Lấy dữ liệu dashboard thành công")
+
+
+@router.get("/forecast", response_model=ApiResponse[ForecastResponse])
+async def get_forecast(
+    response: Response,
+    as_of: Optional[date] = Query(default=None, description="Ngày bắt đầu dự báo (YYYY-MM-DD, mặc định: hôm nay)"),
+    days: int = Query(default=90, ge=1, le=366, description="Số ngày dự báo"),
+    group_by: ForecastGroupBy = Query(default=ForecastGroupBy.DAY, description="Gom theo: day, week, month"),
+    db: Session = Depends(get_analytics_db)
+):
+    """
+    Dự báo số tiền đến hạn trong các ngày tới (đọc từ analytics replica nếu bật)
+    
+    - **moc**: Tổng dự kiến trong 30/60/90 ngày đầu
+    - **periods**: Số tiền dự kiến theo ngày / tuần / tháng
+    """
+    as_of = as_of or clock.today()
+    data_as_of = response.headers["X-Data-As-Of"] if response.headers.get("X-Data-Source") == "replica" else None
+    # Kết quả được cache theo ngày dự báo (và bị xóa khi dữ liệu thay đổi)
+    cache_key = ("dashboard_forecast", as_of, days, group_by.value, data_as_of)
+    result = result_cache.get_or_set(
+        cache_key,
+        lambda: crud_dashboard.get_forecast(db=db, as_of=as_of, days=days, group_by=group_by.value),
+    )
+    return ApiResponse.success_response(data=result, message="Lấy dự báo số tiền đến hạn thành công")
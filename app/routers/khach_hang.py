@@ -0,0 +1,55 @@
+"""
+KhachHang API routes
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List
+
+from app.core.database import get_db
+from app.core.writer import run_write
+from app.schemas.khach_hang import KhachHangCreate, KhachHangUpdate, KhachHang, KhachHangOverview
+from app.schemas.response import ApiResponse
+from app.crud import khach_hang as crud_khach_hang
+
+router = APIRouter(
+    prefix="/customers",
+    tags=["Khách hàng"]
+)
+
+
+@router.post("", response_model=ApiResponse[KhachHang], status_code=201)
+async def create_khach_hang(khach_hang: KhachHangCreate, db: Session = Depends(get_db)):
+    """Create a new customer"""
+    result = await run_write(db, crud_khach_hang.create_khach_hang, khach_hang=khach_hang)
+    return ApiResponse.success_response(data=KhachHang.model_validate(result), message="Tạo khách hàng thành công")
+
+
+@router.get("", response_model=ApiResponse[List[KhachHang]])
+async def get_khach_hangs(
+    search: str | None = Query(default=None, description="Tiền tố họ tên (có/không dấu) hoặc số điện thoại"),
+    page: int = Query(default=1, ge=1),
+    page_size: int = Query(default=20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """Search customers by folded name or phone number"""
+    result = crud_khach_hang.get_khach_hangs(db=db, search=search, page=page, page_size=page_size)
+    data = [KhachHang.model_validate(khach_hang) for khach_hang in result]
+    return ApiResponse.success_response(data=data, message="Lấy danh sách khách hàng thành công")
+
+
+@router.get("/{ma_kh}", response_model=ApiResponse[KhachHangOverview])
+async def get_khach_hang(ma_kh: str, db: Session = Depends(get_db)):
+    """Get a customer with all their TinChap/TraGop contracts and balances"""
+    result = crud_khach_hang.get_khach_hang_overview(db=db, ma_kh=ma_kh)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy khách hàng")
+    return ApiResponse.success_response(data=result, message="Lấy thông tin khách hàng thành công")
+
+
+@router.put("/{ma_kh}", response_model=ApiResponse[KhachHang])
+async def update_khach_hang(ma_kh: str, khach_hang_update: KhachHangUpdate, db: Session = Depends(get_db)):
+    """Update a customer"""
+    result = await run_write(db, crud_khach_hang.update_khach_hang, ma_kh=ma_kh, khach_hang_update=khach_hang_update)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy khách hàng")
+    return ApiResponse.success_response(data=KhachHang.model_validate(result), message="Cập nhật khách hàng thành công")
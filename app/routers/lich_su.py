@@ -6,10 +6,14 @@ from sqlalchemy.orm import Session
 from datetime import datetime, date
 from typing import Optional, Literal
 
+from app.core import clock
 from app.core.database import get_db
-from app.schemas.lich_su import LichSuResponse
+from app.core.replica import get_analytics_db
+from app.schemas.lich_su import LichSuResponse, AgingResponse, CollectionReport, LedgerVerifyResponse
 from app.schemas.response import ApiResponse
 from app.crud import lich_su as crud_lich_su
+from app.crud import payment_ledger as crud_payment_ledger
+from app.core.enums import AgingBucket
 
 router = APIRouter(
     prefix="/lich-su",
@@ -52,6 +56,10 @@ async def get_lich_su(
         default=None,
         description="Đến ngày (format: DD-MM-YYYY, ví dụ: 31-01-2025)"
     ),
+    include_archived: bool = Query(
+        default=False,
+        description="Bao gồm hợp đồng đã tất toán đã được lưu trữ"
+    ),
     db: Session = Depends(get_db)
 ):
     """
@@ -59,6 +67,7 @@ async def get_lich_su(
     
     - **tu_ngay**: Filter from date (optional, format: DD-MM-YYYY)
     - **den_ngay**: Filter to date (optional, format: DD-MM-YYYY)
+    - **include_archived**: Include archived settled contracts (default: false)
     
     Returns:
     - **statistics**: List of statistics grouped by date (số người đã trả, số người chưa trả)
@@ -72,7 +81,8 @@ async def get_lich_su(
     result = crud_lich_su.get_lich_su(
         db=db,
         tu_ngay=tu_ngay_date,
-        den_ngay=den_ngay_date
+        den_ngay=den_ngay_date,
+        include_archived=include_archived
     )
     
     return ApiResponse.success_response(
@@ -95,7 +105,7 @@ async def financial_statistics(
         ...,
         description="Ngày kết thúc (format: DD-MM-YYYY)"
     ),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_analytics_db),
 ):
     """
     Get financial statistics with granularity (daily/weekly/monthly)
@@ -104,6 +114,9 @@ async def financial_statistics(
     - **start_date**: Start date (format: DD-MM-YYYY)
     - **end_date**: End date (format: DD-MM-YYYY)
     
+    Đọc từ analytics replica khi bật ANALYTICS_REPLICA_ENABLED; header
+    X-Data-As-Of / X-Data-Staleness cho biết dữ liệu được chụp lúc nào.
+    
     Returns:
     - **meta**: Metadata about the query (granularity, date range, bucket count)
     - **summary**: Overall summary (total disbursed, collected, interest, cash flow, contracts)
@@ -141,3 +154,108 @@ async def financial_statistics(
         message="Thống kê tài chính được tính toán thành công"
     )
 
+
+@router.get("/aging", response_model=ApiResponse[AgingResponse])
+async def aging_report(
+    as_of: Optional[str] = Query(
+        default=None,
+        description="Ngày báo cáo (format: DD-MM-YYYY, mặc định: hôm nay)"
+    ),
+    bucket: Optional[AgingBucket] = Query(
+        default=None,
+        description="Nhóm tuổi nợ cần xem chi tiết: 1-30, 31-60, 61-90, 90+"
+    ),
+    loai_hop_dong: Optional[Literal["tin_chap", "tra_gop"]] = Query(
+        default=None,
+        description="Lọc chi tiết theo loại hợp đồng"
+    ),
+    page: int = Query(default=1, ge=1, description="Trang chi tiết"),
+    page_size: int = Query(default=50, ge=1, le=500, description="Số dòng mỗi trang chi tiết"),
+    db: Session = Depends(get_analytics_db),
+):
+    """
+    Báo cáo tuổi nợ quá hạn
+    
+    - **as_of**: Ngày báo cáo; số ngày quá hạn = as_of - ngày đến hạn của kỳ
+    - **bucket**: Nếu có, trả thêm một trang chi tiết các kỳ của nhóm đó
+    
+    Returns:
+    - **buckets**: Tổng tiền còn nợ theo nhóm tuổi nợ (1-30, 31-60, 61-90, 90+)
+    - **rows**: Theo nhóm tuổi nợ, loại hợp đồng và trạng thái thanh toán
+    - **details**: Trang chi tiết của nhóm được chọn
+    """
+    as_of_parsed = parse_date_string(as_of) or clock.today()
+    
+    data = crud_lich_su.get_aging_report(
+        db,
+        as_of=as_of_parsed,
+        bucket=bucket.value if bucket else None,
+        loai_hop_dong=loai_hop_dong,
+        page=page,
+        page_size=page_size,
+    )
+    
+    return ApiResponse.success_response(
+        data=data,
+        message="Lấy báo cáo tuổi nợ thành công"
+    )
+
+
+@router.get("/collections", response_model=ApiResponse[CollectionReport])
+async def collection_report(
+    tu_ngay: Optional[str] = Query(
+        default=None,
+        description="Từ ngày thu (format: DD-MM-YYYY, mặc định: hôm nay)"
+    ),
+    den_ngay: Optional[str] = Query(
+        default=None,
+        description="Đến ngày thu (format: DD-MM-YYYY, mặc định: tu_ngay)"
+    ),
+    ma_hd: Optional[str] = Query(default=None, description="Chỉ tính một hợp đồng"),
+    db: Session = Depends(get_analytics_db),
+):
+    """
+    Báo cáo thu tiền theo ngày thu (từ sổ thu tiền payment_ledger)
+    
+    Khác với /statistics (theo ngày đến hạn của kỳ), báo cáo này cho biết
+    tiền thực sự được thu vào ngày nào và qua đường nào.
+    
+    Returns:
+    - **tong_thu**, **so_khoan_thu**, **theo_nguon**: Tổng của cả khoảng
+    - **theo_ngay**: Theo từng ngày có thu
+    """
+    tu_ngay_parsed = parse_date_string(tu_ngay) or clock.today()
+    den_ngay_parsed = parse_date_string(den_ngay) or tu_ngay_parsed
+    if den_ngay_parsed < tu_ngay_parsed:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="den_ngay must be greater than or equal to tu_ngay",
+        )
+    
+    data = crud_payment_ledger.get_collections(db, tu_ngay_parsed, den_ngay_parsed, ma_hd=ma_hd)
+    
+    return ApiResponse.success_response(
+        data=data,
+        message="Lấy báo cáo thu tiền thành công"
+    )
+
+
+@router.get("/ledger/verify", response_model=ApiResponse[LedgerVerifyResponse])
+async def verify_ledger(
+    ma_hd: Optional[str] = Query(default=None, description="Chỉ đối chiếu một hợp đồng (mặc định: toàn bộ)"),
+    limit: int = Query(default=100, ge=1, le=1000, description="Số dòng lệch tối đa trả về"),
+    db: Session = Depends(get_db),
+):
+    """
+    Đối chiếu sổ thu tiền với TienDaTra của từng kỳ và tiền gốc đã trả
+    
+    Returns:
+    - **ok**: true nếu mọi kỳ / hợp đồng khớp
+    - **lech**: Các dòng lệch (số hiện tại và tổng trong sổ)
+    """
+    data = crud_payment_ledger.verify_ledger(db, ma_hd=ma_hd, limit=limit)
+    
+    return ApiResponse.success_response(
+        data=data,
+        message="Đối chiếu sổ thu tiền thành công" if data.ok else "Sổ thu tiền lệch với số đã trả"
+    )
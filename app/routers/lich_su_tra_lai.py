@@ -1,20 +1,65 @@
 """
 LichSuTraLai API routes
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List, Any
+from typing import Callable, List, Any, Optional
+from datetime import date
 
+from app.core import clock, config
 from app.core.database import get_db
-from app.schemas.lich_su_tra_lai import LichSuTraLai
+from app.core.responses import success_json_response
+from app.core.writer import run_write, run_write_atomic
+from app.schemas.lich_su_tra_lai import LichSuTraLai, LichSuTraLaiPayBatch, ScheduleJobStatus
 from app.schemas.response import ApiResponse
+from app.crud import idempotency as crud_idempotency
 from app.crud import lich_su_tra_lai as crud_lich_su
+from app.crud import schedule_job as crud_schedule_job
+from app.utils.serialization import lich_su_to_dict, get_type_adapter
 
 router = APIRouter(
     prefix="/lich-su-tra-lai",
     tags=["Lịch sử trả lãi"]
 )
 
+IDEMPOTENCY_KEY_HEADER = Header(
+    default=None,
+    min_length=1,
+    max_length=255,
+    description="Khóa chống thực hiện lặp: gửi lại cùng khóa nhận kết quả đã lưu",
+)
+
+
+async def _run_payment(
+    db: Session,
+    response: Response,
+    idempotency_key: Optional[str],
+    thao_tac: str,
+    fn: Callable,
+    **params: Any
+) -> Any:
+    """
+    Chạy thao tác thanh toán / tất toán
+
+    Có Idempotency-Key: lần gửi lại trả kết quả đã lưu (một lần đọc theo khóa
+    chính, không vào hàng đợi ghi) kèm header Idempotent-Replayed: true.
+    """
+    if idempotency_key is None:
+        return await run_write(db, fn, **params)
+
+    dau_vet = crud_idempotency.request_fingerprint(thao_tac, params)
+    result = crud_idempotency.get_stored_result(db, idempotency_key, dau_vet)
+    # Kết quả là JSON thuần: trả kết nối về pool ngay, không giữ trong lúc chờ writer
+    db.close()
+    replayed = result is not None
+    if not replayed:
+        result, replayed = await run_write_atomic(
+            crud_idempotency.run_idempotent, khoa=idempotency_key, dau_vet=dau_vet, action=fn, params=params,
+        )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
 
 @router.post("", response_model=ApiResponse[Any], status_code=201)
 async def create_lich_su( 
@@ -22,7 +67,7 @@ async def create_lich_su(
     ma_hd: str = ""
 ):
     """Create payment history records for a contract"""
-    result = crud_lich_su.create_lich_su(db=db, ma_hd=ma_hd)
+    result = await run_write(db, crud_lich_su.create_lich_su, ma_hd=ma_hd)
     return ApiResponse.success_response(data=result, message="Tạo lịch sử trả lãi thành công")
 
 
@@ -30,9 +75,23 @@ async def create_lich_su(
 async def get_all_lich_su(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     """Get all payment history records"""
     result = crud_lich_su.get_lich_sus(db=db, skip=skip, limit=limit)
+    message = "Lấy danh sách lịch sử trả lãi thành công"
+    if config.FAST_RESPONSES:
+        return success_json_response(data=[lich_su_to_dict(ls) for ls in result], message=message)
     # Convert list of SQLAlchemy models to Pydantic schemas
-    lich_sus_response = [LichSuTraLai.model_validate(ls) for ls in result]
-    return ApiResponse.success_response(data=lich_sus_response, message="Lấy danh sách lịch sử trả lãi thành công")
+    lich_sus_response = get_type_adapter(List[LichSuTraLai]).validate_python(result, from_attributes=True)
+    return ApiResponse.success_response(data=lich_sus_response, message=message)
+
+
+@router.get("/schedule-status/{ma_hd}", response_model=ApiResponse[ScheduleJobStatus])
+async def get_schedule_status(ma_hd: str, db: Session = Depends(get_db)):
+    """Status of the background schedule job of a contract created with async_schedule=true"""
+    job = crud_schedule_job.get_schedule_job(db=db, ma_hd=ma_hd)
+    if not job:
+        raise HTTPException(status_code=404, detail="Hợp đồng không có job tạo lịch sử trả lãi")
+    return ApiResponse.success_response(
+        data=ScheduleJobStatus.model_validate(job), message="Lấy trạng thái tạo lịch sử trả lãi thành công"
+    )
 
 
 @router.get("/{stt}", response_model=ApiResponse[LichSuTraLai])
@@ -47,18 +106,25 @@ async def get_lich_su_by_id(stt: int, db: Session = Depends(get_db)):
 
 
 @router.get("/contract/{ma_hd}", response_model=ApiResponse[List[LichSuTraLai]])
-async def get_lich_su_by_contract(ma_hd: str, db: Session = Depends(get_db)):
+async def get_lich_su_by_contract(
+    ma_hd: str,
+    include_archived: bool = Query(default=False, description="Bao gồm lịch sử đã lưu trữ"),
+    db: Session = Depends(get_db)
+):
     """Get all payment history records for a specific contract"""
-    result = crud_lich_su.get_lich_sus_by_contract(db=db, ma_hd=ma_hd)
+    result = crud_lich_su.get_lich_sus_by_contract(db=db, ma_hd=ma_hd, include_archived=include_archived)
+    message = "Lấy lịch sử trả lãi theo hợp đồng thành công"
+    if config.FAST_RESPONSES:
+        return success_json_response(data=[lich_su_to_dict(ls) for ls in result], message=message)
     # Convert list of SQLAlchemy models to Pydantic schemas
-    lich_sus_response = [LichSuTraLai.model_validate(ls) for ls in result]
-    return ApiResponse.success_response(data=lich_sus_response, message="Lấy lịch sử trả lãi theo hợp đồng thành công")
+    lich_sus_response = get_type_adapter(List[LichSuTraLai]).validate_python(result, from_attributes=True)
+    return ApiResponse.success_response(data=lich_sus_response, message=message)
 
 
 @router.delete("/{stt}", response_model=ApiResponse[Any])
 async def delete_lich_su(stt: int, db: Session = Depends(get_db)):
     """Delete a payment history record"""
-    success = crud_lich_su.delete_lich_su(db=db, stt=stt)
+    success = await run_write(db, crud_lich_su.delete_lich_su, stt=stt)
     if not success:
         raise HTTPException(status_code=404, detail="Không tìm thấy lịch sử trả lãi")
     return ApiResponse.success_response(data={"Stt": stt}, message="Xóa lịch sử trả lãi thành công")
@@ -67,7 +133,7 @@ async def delete_lich_su(stt: int, db: Session = Depends(get_db)):
 @router.delete("/contract/{ma_hd}", response_model=ApiResponse[Any])
 async def delete_lich_su_by_contract(ma_hd: str, db: Session = Depends(get_db)):
     """Delete all payment history records for a specific contract"""
-    so_ban_ghi_da_xoa = crud_lich_su.delete_lich_sus_by_contract(db=db, ma_hd=ma_hd)
+    so_ban_ghi_da_xoa = await run_write(db, crud_lich_su.delete_lich_sus_by_contract, ma_hd=ma_hd)
     if so_ban_ghi_da_xoa == 0:
         raise HTTPException(status_code=404, detail="Không tìm thấy lịch sử trả lãi cho hợp đồng này")
     return ApiResponse.success_response(
@@ -79,26 +145,67 @@ async def delete_lich_su_by_contract(ma_hd: str, db: Session = Depends(get_db)):
 async def pay_lich_su(
     stt: int,
     so_tien: int,
+    response: Response,
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER,
     db: Session = Depends(get_db)
 ):
     """Pay a payment history record"""
-    result = crud_lich_su.pay_lich_su(db=db, stt=stt, so_tien=so_tien)
+    result = await _run_payment(
+        db, response, idempotency_key, "pay", crud_lich_su.pay_lich_su, stt=stt, so_tien=so_tien,
+    )
     if not result:
         raise HTTPException(status_code=404, detail="Không tìm thấy lịch sử trả lãi")
     return ApiResponse.success_response(data=result, message="Thanh toán lịch sử trả lãi thành công")
 
+@router.post("/pay-batch", response_model=ApiResponse[Any])
+async def pay_lich_su_batch(
+    payload: LichSuTraLaiPayBatch,
+    response: Response,
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER,
+    db: Session = Depends(get_db)
+):
+    """Pay many payment history records in one transaction (per-item result)"""
+    result = await _run_payment(
+        db, response, idempotency_key, "pay-batch", crud_lich_su.pay_lich_su_batch, items=payload.items,
+    )
+    return ApiResponse.success_response(
+        data=result,
+        message=f"Thanh toán hàng loạt: {result['succeeded']}/{result['total']} khoản thành công"
+    )
+
 @router.post("/auto-create-lich-su", response_model=ApiResponse[Any])
-async def auto_create_lich_su(db: Session = Depends(get_db)):
-    """Auto create payment history records for all contracts"""
-    result = crud_lich_su.auto_create_lich_su(db=db)
+async def auto_create_lich_su(
+    from_date: Optional[date] = Query(default=None, description="Chạy bù từ ngày (YYYY-MM-DD, mặc định: to_date)"),
+    to_date: Optional[date] = Query(default=None, description="Đến ngày (YYYY-MM-DD, mặc định: hôm nay)"),
+    db: Session = Depends(get_db)
+):
+    """Auto create payment history records for all contracts (catch-up over from_date..to_date)"""
+    result = await run_write(db, crud_lich_su.auto_create_lich_su, from_date=from_date, to_date=to_date)
     return ApiResponse.success_response(data=result, message="Tự động cập nhật lịch sử trả lãi thành công")
 
 
+@router.post("/transition-statuses", response_model=ApiResponse[Any])
+async def transition_payment_statuses(
+    as_of: Optional[date] = Query(default=None, description="Ngày xét (YYYY-MM-DD, mặc định: hôm nay)"),
+    db: Session = Depends(get_db)
+):
+    """Bulk move payment periods Chưa đến hạn -> Đến hạn -> Quá hạn as of a date"""
+    result = await run_write(db, crud_lich_su.transition_payment_statuses, as_of=as_of or clock.today())
+    return ApiResponse.success_response(
+        data=result,
+        message=f"Đã chuyển trạng thái {result['tong_so_ky']} kỳ thanh toán"
+    )
+
+
 @router.post("/pay-full/{ma_hd}", response_model=ApiResponse[Any])
 async def pay_full_lich_su(
     ma_hd: str,
+    response: Response,
+    idempotency_key: Optional[str] = IDEMPOTENCY_KEY_HEADER,
     db: Session = Depends(get_db)
 ):
     """Pay full payment history records for a specific contract"""
-    result = crud_lich_su.tat_toan_hop_dong(db=db, ma_hd=ma_hd)
+    result = await _run_payment(
+        db, response, idempotency_key, "pay-full", crud_lich_su.tat_toan_hop_dong, ma_hd=ma_hd,
+    )
     return ApiResponse.success_response(data=result, message="Tất toán hợp đồng thành công")
\ No newline at end of file
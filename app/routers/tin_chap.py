@@ -1,15 +1,23 @@
 """
 TinChap API routes
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Any
 
+from app.core import clock, config
+from app.core.cache import result_cache
 from app.core.database import get_db
+from app.core.enums import HistoryMode, TrangThaiTaoLichSu
+from app.core.responses import success_json_response
+from app.core.writer import run_write
 from app.schemas.tin_chap import TinChapCreate, TinChapResponse, TinChapUpdate, TinChap
 from app.schemas.response import ApiResponse
 from app.crud import tin_chap as crud_tin_chap
+from app.crud.schedule_job import schedule_worker
+from app.crud import contract_version as crud_contract_version
 from app.utils.id_generator import generate_tin_chap_id
+from app.utils.etag import make_contract_etag, make_list_etag, etag_matches
 
 router = APIRouter(
     prefix="/tin-chap",
@@ -18,29 +26,58 @@ router = APIRouter(
 
 
 @router.post("", response_model=ApiResponse[TinChap], status_code=201)
-async def create_tin_chap(tin_chap: TinChapCreate, db: Session = Depends(get_db)):
-    """Create a new TinChap contract"""
-    ma_hd = generate_tin_chap_id(db)
-    result = crud_tin_chap.create_tin_chap(db=db, tin_chap=tin_chap, ma_hd=ma_hd)
+async def create_tin_chap(
+    tin_chap: TinChapCreate,
+    async_schedule: bool = Query(
+        default=False,
+        description="Tạo lịch sử trả lãi ở nền (theo dõi: GET /lich-su-tra-lai/schedule-status/{ma_hd})",
+    ),
+    db: Session = Depends(get_db)
+):
+    """Create a new TinChap contract (optionally queue its payment schedule)"""
+    def _create(session: Session):
+        ma_hd = generate_tin_chap_id(session)
+        return crud_tin_chap.create_tin_chap(db=session, tin_chap=tin_chap, ma_hd=ma_hd, async_schedule=async_schedule)
+
+    result = await run_write(db, _create)
     # Convert SQLAlchemy model to Pydantic schema
     tin_chap_response = TinChap.model_validate(result)
+    if async_schedule:
+        schedule_worker.notify()
+        tin_chap_response.TrangThaiLichSu = TrangThaiTaoLichSu.CHO.value
     return ApiResponse.success_response(data=tin_chap_response, message="Tạo hợp đồng tín chấp thành công")
 
 
 @router.get("", response_model=ApiResponse[List[TinChapResponse]])
 async def get_all_tin_chap(
+    response: Response,
     status: str | None = None,
     page: int = 1,
     page_size: int = 10,
-    search: str | None = None,
+    search: str | None = Query(
+        default=None,
+        description=(
+            "Họ tên (có/không dấu) hoặc mã hợp đồng, khớp theo đầu từ; "
+            "chuỗi chỉ gồm chữ số, rất ngắn (<= 2 ký tự) hoặc không khớp đầu từ nào thì khớp giữa chuỗi"
+        ),
+    ),
     sort_by: str = "NgayVay",
     sort_dir: str = "desc",
     today_only: bool = False,
+    fields: str | None = Query(
+        default=None,
+        description="Các trường cần trả về, phân tách bằng dấu phẩy (MaHD luôn có)"
+    ),
+    include_history: HistoryMode = Query(
+        default=HistoryMode.ALL,
+        description="Lịch sử trả lãi: none, summary, last_n, all"
+    ),
+    history_n: int = Query(default=5, ge=1, le=500, description="Số kỳ gần nhất khi include_history=last_n"),
+    if_none_match: str | None = Header(default=None),
     db: Session = Depends(get_db)
     ):
     """Get all TinChap contracts with filter/search/sort/pagination"""
-    result = crud_tin_chap.get_tin_chaps(
-        db=db,
+    filters = dict(
         status=status,
         page=page,
         page_size=page_size,
@@ -49,22 +86,75 @@ async def get_all_tin_chap(
         sort_dir=sort_dir,
         today_only=today_only,
     )
-    return ApiResponse.success_response(data=result, message="Lấy danh sách hợp đồng tín chấp thành công")
+    # Mỗi cách chọn trường/lịch sử là một representation riêng
+    scope = f"tin-chap:{fields or ''}:{include_history.value}:{history_n}"
+
+    # ETag từ (MaHD, Version) của các hợp đồng trên trang: không cần đọc lịch sử,
+    # nên 304 được trả trước khi dựng danh sách (kể cả khi cache không có)
+    ma_hds = crud_tin_chap.get_tin_chap_ids(db=db, **filters)
+    versions = crud_contract_version.get_contract_versions(db=db, ma_hds=ma_hds)
+    etag = make_list_etag(ma_hds, versions, scope=scope)
+    if etag and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    def _load():
+        return crud_tin_chap.get_tin_chaps(
+            db=db,
+            fields=fields,
+            include_history=include_history.value,
+            history_n=history_n,
+            **filters,
+        )
+
+    # Trạng thái/today_only phụ thuộc ngày hiện tại: ngày là một phần của khóa;
+    # ETag gắn kết quả với đúng các version đã dùng để tính nó
+    cache_key = (scope, clock.today(), tuple(sorted(filters.items())), etag)
+    result = result_cache.get_or_set(cache_key, _load)
+
+    if etag:
+        response.headers["ETag"] = etag
+    message = "Lấy danh sách hợp đồng tín chấp thành công"
+    # Response đã chọn trường/lịch sử không khớp đầy đủ response_model
+    projected = fields is not None or include_history != HistoryMode.ALL
+    if config.FAST_RESPONSES or projected:
+        # Dữ liệu CRUD dựng từ database: trả thẳng JSON, không validate lại
+        return success_json_response(data=result, message=message, response=response)
+    return ApiResponse.success_response(data=result, message=message)
 
 
 @router.get("/{ma_hd}", response_model=ApiResponse[TinChapResponse])
-async def get_tin_chap_by_id(ma_hd: str, db: Session = Depends(get_db)):
+async def get_tin_chap_by_id(
+    ma_hd: str,
+    response: Response,
+    include_archived: bool = Query(default=False, description="Tìm cả trong hợp đồng đã lưu trữ"),
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
     """Get a specific TinChap contract by MaHD"""
-    tin_chap = crud_tin_chap.get_tin_chap_with_history(db=db, ma_hd=ma_hd)
+    # Version được đọc trước khi dựng response: nếu có ghi xen giữa, client
+    # nhận dữ liệu mới với ETag cũ và sẽ tải lại ở lần poll sau (an toàn).
+    # Lưu trữ xóa hợp đồng khỏi bảng chính nên version cũng tăng (trigger).
+    version = crud_contract_version.get_contract_version(db=db, ma_hd=ma_hd)
+    etag = make_contract_etag(ma_hd, version, include_archived) if version is not None else None
+    if etag and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    tin_chap = crud_tin_chap.get_tin_chap_with_history(db=db, ma_hd=ma_hd, include_archived=include_archived)
     if not tin_chap:
         raise HTTPException(status_code=404, detail="Không tìm thấy hợp đồng tín chấp")
-    return ApiResponse.success_response(data=tin_chap, message="Lấy thông tin hợp đồng tín chấp thành công")
+    if etag:
+        response.headers["ETag"] = etag
+    message = "Lấy thông tin hợp đồng tín chấp thành công"
+    if config.FAST_RESPONSES:
+        # Dữ liệu CRUD dựng từ database: trả thẳng JSON, không validate lại
+        return success_json_response(data=tin_chap, message=message, response=response)
+    return ApiResponse.success_response(data=tin_chap, message=message)
 
 
 @router.put("/{ma_hd}", response_model=ApiResponse[TinChap])
 async def update_tin_chap(ma_hd: str, tin_chap_update: TinChapUpdate, db: Session = Depends(get_db)):
     """Update a TinChap contract"""
-    db_tin_chap = crud_tin_chap.update_tin_chap(db=db, ma_hd=ma_hd, tin_chap_update=tin_chap_update)
+    db_tin_chap = await run_write(db, crud_tin_chap.update_tin_chap, ma_hd=ma_hd, tin_chap_update=tin_chap_update)
     if not db_tin_chap:
         raise HTTPException(status_code=404, detail="Không tìm thấy hợp đồng tín chấp")
     # Convert SQLAlchemy model to Pydantic schema
@@ -75,7 +165,7 @@ async def update_tin_chap(ma_hd: str, tin_chap_update: TinChapUpdate, db: Sessio
 @router.delete("/{ma_hd}", response_model=ApiResponse[Any])
 async def delete_tin_chap(ma_hd: str, db: Session = Depends(get_db)):
     """Delete a TinChap contract"""
-    success = crud_tin_chap.delete_tin_chap(db=db, ma_hd=ma_hd)
+    success = await run_write(db, crud_tin_chap.delete_tin_chap, ma_hd=ma_hd)
     if not success:
         raise HTTPException(status_code=404, detail="Không tìm thấy hợp đồng tín chấp")
     return ApiResponse.success_response(data={"MaHD": ma_hd}, message="Xóa hợp đồng tín chấp thành công")
@@ -86,7 +176,7 @@ async def tra_goc_tin_chap(
     so_tien_tra_goc: int,
     db: Session = Depends(get_db)):
     """Trả gốc hợp đồng tín chấp"""
-    success = crud_tin_chap.tra_goc_tin_chap(db=db, ma_hd=ma_hd, so_tien_tra_goc=so_tien_tra_goc)
+    success = await run_write(db, crud_tin_chap.tra_goc_tin_chap, ma_hd=ma_hd, so_tien_tra_goc=so_tien_tra_goc)
     if not success:
         raise HTTPException(status_code=404, detail="Không tìm thấy hợp đồng tín chấp")
     return ApiResponse.success_response(data={"MaHD": ma_hd}, message="Trả gốc hợp đồng tín chấp thành công")
\ No newline at end of file
@@ -11,7 +11,9 @@ from app.schemas.tra_gop import (
 )
 from app.schemas.lich_su_tra_lai import (
     LichSuTraLaiCreate,
-    LichSuTraLaiUpdate
+    LichSuTraLaiUpdate,
+    LichSuTraLaiPayItem,
+    LichSuTraLaiPayBatch
 )
 from app.schemas.response import ApiResponse
 from app.schemas.dashboard import (
@@ -30,6 +32,8 @@ __all__ = [
     # LichSuTraLai
     "LichSuTraLaiCreate",
     "LichSuTraLaiUpdate",
+    "LichSuTraLaiPayItem",
+    "LichSuTraLaiPayBatch",
     # Response
     "ApiResponse",
     # Dashboard
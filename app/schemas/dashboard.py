@@ -4,7 +4,8 @@ Dashboard schema
 
 from pydantic import BaseModel, Field
 from pydantic import ConfigDict
-from typing import List, Any
+from datetime import date
+from typing import Dict, List, Any
 
 class LoaiHinhVayDetail(BaseModel):
     """Chi tiết loại hình vay"""
@@ -38,4 +39,24 @@ class DashboardResponse(BaseModel):
     ti_le_lai_thu: TiLeLaiThu = Field(..., description="Tỷ lệ lãi thu")
     ti_le_loi_nhuan: TiLeLoiNhuan = Field(..., description="Tỷ lệ lợi nhuận")
     
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ForecastPeriod(BaseModel):
+    """Số tiền dự kiến đến hạn trong một khoảng (ngày / tuần / tháng)"""
+    tu_ngay: date = Field(..., description="Ngày đầu khoảng")
+    den_ngay: date = Field(..., description="Ngày cuối khoảng")
+    so_ky: int = Field(..., description="Số kỳ đến hạn")
+    so_tien_du_kien: int = Field(..., description="Số tiền dự kiến đến hạn")
+
+
+class ForecastResponse(BaseModel):
+    """Dự báo số tiền đến hạn của toàn bộ hợp đồng đang hoạt động"""
+    as_of: date = Field(..., description="Ngày bắt đầu dự báo")
+    days: int = Field(..., description="Số ngày dự báo")
+    group_by: str = Field(..., description="Cách gom: day, week, month")
+    so_hop_dong: int = Field(..., description="Số hợp đồng đang hoạt động")
+    tong_so_tien_du_kien: int = Field(..., description="Tổng số tiền dự kiến đến hạn")
+    tien_cong_don: int = Field(..., description="Nợ trước as_of được cộng dồn vào các kỳ trong khoảng")
+    moc: Dict[str, int] = Field(..., description="Tổng dự kiến trong 30/60/90 ngày đầu (mốc nằm trong khoảng)")
+    periods: List[ForecastPeriod] = Field(..., description="Theo từng khoảng")
@@ -0,0 +1,58 @@
+"""
+KhachHang schemas for API request/response validation
+"""
+from pydantic import BaseModel, Field, ConfigDict
+from datetime import date
+from typing import Optional, List
+
+
+class KhachHangCreate(BaseModel):
+    """Schema for creating KhachHang"""
+    HoTen: str = Field(..., min_length=1, description="Họ tên khách hàng")
+    SoDienThoai: Optional[str] = Field(default=None, description="Số điện thoại")
+    CCCD: Optional[str] = Field(default=None, description="Số CCCD / CMND")
+
+
+class KhachHangUpdate(BaseModel):
+    """Schema for updating KhachHang"""
+    HoTen: Optional[str] = Field(default=None, min_length=1)
+    SoDienThoai: Optional[str] = None
+    CCCD: Optional[str] = None
+
+
+class KhachHang(BaseModel):
+    """Schema for KhachHang response - can serialize from SQLAlchemy model"""
+    MaKH: str = Field(..., description="Mã khách hàng")
+    HoTen: str = Field(..., description="Họ tên khách hàng")
+    SoDienThoai: Optional[str] = Field(default=None, description="Số điện thoại")
+    CCCD: Optional[str] = Field(default=None, description="Số CCCD / CMND")
+    model_config = ConfigDict(from_attributes=True)
+
+
+class HopDongKhachHang(BaseModel):
+    """Một hợp đồng của khách hàng và số dư của nó"""
+    MaHD: str = Field(..., description="Mã hợp đồng")
+    LoaiHopDong: str = Field(..., description="tin_chap hoặc tra_gop")
+    HoTen: str = Field(..., description="Họ tên trên hợp đồng")
+    NgayVay: date = Field(..., description="Ngày vay")
+    SoTienVay: int = Field(..., description="Số tiền vay")
+    TrangThai: str = Field(..., description="Trạng thái")
+    SoKy: int = Field(..., description="Số kỳ đã có trong lịch sử")
+    TongSoTien: int = Field(..., description="Tổng số tiền các kỳ")
+    TongTienDaTra: int = Field(..., description="Tổng tiền đã trả")
+    ConNo: int = Field(..., description="Số tiền còn nợ của các kỳ chưa đóng đủ")
+    QuaHan: int = Field(..., description="Phần còn nợ của các kỳ đã quá hạn")
+
+
+class KhachHangOverview(BaseModel):
+    """Khách hàng cùng mọi hợp đồng (Tín chấp + Trả góp) và tổng số dư"""
+    MaKH: str = Field(..., description="Mã khách hàng")
+    HoTen: str = Field(..., description="Họ tên khách hàng")
+    SoDienThoai: Optional[str] = Field(default=None, description="Số điện thoại")
+    CCCD: Optional[str] = Field(default=None, description="Số CCCD / CMND")
+    SoHopDong: int = Field(..., description="Số hợp đồng")
+    TongTienVay: int = Field(..., description="Tổng số tiền vay")
+    TongTienDaTra: int = Field(..., description="Tổng tiền đã trả")
+    ConNo: int = Field(..., description="Tổng số tiền còn nợ")
+    QuaHan: int = Field(..., description="Tổng số tiền quá hạn")
+    HopDong: List[HopDongKhachHang] = Field(..., description="Các hợp đồng, mới nhất trước")
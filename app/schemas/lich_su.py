@@ -3,7 +3,7 @@ Lich Su (History) schemas for API request/response validation
 """
 from pydantic import BaseModel, Field, ConfigDict
 from datetime import date
-from typing import List
+from typing import Dict, List, Optional
 
 
 class LichSuStatisticsByDate(BaseModel):
@@ -30,3 +30,88 @@ class LichSuResponse(BaseModel):
     details: List[LichSuDetail] = Field(..., description="Chi tiết lịch sử")
     total_records: int = Field(..., description="Tổng số bản ghi")
 
+
+
+class AgingRow(BaseModel):
+    """Nợ quá hạn của một nhóm (tuổi nợ, loại hợp đồng, trạng thái)"""
+    bucket: str = Field(..., description="Nhóm tuổi nợ (1-30, 31-60, 61-90, 90+)")
+    loai_hop_dong: str = Field(..., description="Loại hợp đồng (tin_chap/tra_gop)")
+    trang_thai: str = Field(..., description="Trạng thái thanh toán")
+    so_tien_con_no: int = Field(..., description="Tổng SoTien - TienDaTra")
+    so_ky: int = Field(..., description="Số kỳ còn nợ")
+    so_hop_dong: int = Field(..., description="Số hợp đồng có kỳ còn nợ")
+
+
+class AgingBucketSummary(BaseModel):
+    """Tổng nợ quá hạn của một nhóm tuổi nợ"""
+    bucket: str = Field(..., description="Nhóm tuổi nợ")
+    so_tien_con_no: int = Field(..., description="Tổng tiền còn nợ")
+    so_ky: int = Field(..., description="Số kỳ còn nợ")
+    theo_loai_hop_dong: Dict[str, int] = Field(..., description="Tiền còn nợ theo loại hợp đồng")
+
+
+class AgingDetail(BaseModel):
+    """Một kỳ còn nợ trong nhóm tuổi nợ (drill-down)"""
+    stt: int = Field(..., description="Số thứ tự (Stt)")
+    ma_hd: str = Field(..., description="Mã hợp đồng")
+    ho_ten: str = Field(..., description="Họ tên")
+    loai_hop_dong: str = Field(..., description="Loại hợp đồng (tin_chap/tra_gop)")
+    ngay: date = Field(..., description="Ngày đến hạn của kỳ")
+    so_ngay_qua_han: int = Field(..., description="Số ngày quá hạn tính đến ngày báo cáo")
+    so_tien: int = Field(..., description="Số tiền phải trả của kỳ")
+    tien_da_tra: int = Field(..., description="Số tiền đã trả")
+    so_tien_con_no: int = Field(..., description="Số tiền còn nợ")
+    trang_thai: str = Field(..., description="Trạng thái thanh toán")
+
+
+class AgingDetailPage(BaseModel):
+    """Một trang chi tiết của nhóm tuổi nợ"""
+    bucket: str = Field(..., description="Nhóm tuổi nợ")
+    page: int = Field(..., description="Trang")
+    page_size: int = Field(..., description="Số dòng mỗi trang")
+    total: int = Field(..., description="Tổng số kỳ trong nhóm")
+    items: List[AgingDetail] = Field(..., description="Các kỳ trên trang")
+
+
+class AgingResponse(BaseModel):
+    """Báo cáo tuổi nợ quá hạn"""
+    as_of: date = Field(..., description="Ngày báo cáo")
+    tong_no_qua_han: int = Field(..., description="Tổng tiền nợ quá hạn")
+    buckets: List[AgingBucketSummary] = Field(..., description="Tổng theo nhóm tuổi nợ")
+    rows: List[AgingRow] = Field(..., description="Theo nhóm tuổi nợ, loại hợp đồng, trạng thái")
+    details: Optional[AgingDetailPage] = Field(default=None, description="Chi tiết nhóm được chọn (nếu có)")
+
+
+class CollectionByDate(BaseModel):
+    """Tiền thu được trong một ngày (theo sổ thu tiền)"""
+    ngay: date = Field(..., description="Ngày thu")
+    so_tien: int = Field(..., description="Tổng tiền thu")
+    so_khoan_thu: int = Field(..., description="Số khoản thu")
+    theo_nguon: Dict[str, int] = Field(..., description="Tiền thu theo nguồn (pay, pay_batch, tat_toan, ...)")
+
+
+class CollectionReport(BaseModel):
+    """Báo cáo thu tiền theo khoảng ngày"""
+    tu_ngay: date = Field(..., description="Từ ngày")
+    den_ngay: date = Field(..., description="Đến ngày")
+    tong_thu: int = Field(..., description="Tổng tiền thu")
+    so_khoan_thu: int = Field(..., description="Số khoản thu")
+    theo_nguon: Dict[str, int] = Field(..., description="Tiền thu theo nguồn")
+    theo_ngay: List[CollectionByDate] = Field(..., description="Theo từng ngày có thu")
+
+
+class LedgerMismatch(BaseModel):
+    """Một kỳ (hoặc tiền gốc) có số đã trả khác tổng trong sổ thu tiền"""
+    stt: Optional[int] = Field(default=None, description="Stt của kỳ (None: tiền gốc Tín chấp)")
+    ma_hd: str = Field(..., description="Mã hợp đồng")
+    so_tien_hien_tai: int = Field(..., description="TienDaTra của kỳ / SoTienTraGoc")
+    so_tien_trong_so: int = Field(..., description="Tổng các khoản trong sổ")
+
+
+class LedgerVerifyResponse(BaseModel):
+    """Kết quả đối chiếu sổ thu tiền với số đã trả hiện tại"""
+    ok: bool = Field(..., description="Không có dòng lệch")
+    so_ky_kiem_tra: int = Field(..., description="Số kỳ đã đối chiếu")
+    so_hop_dong_kiem_tra: int = Field(..., description="Số hợp đồng Tín chấp đã đối chiếu tiền gốc")
+    so_dong_lech: int = Field(..., description="Số dòng lệch")
+    lech: List[LedgerMismatch] = Field(..., description="Các dòng lệch (tối đa limit)")
@@ -2,8 +2,8 @@
 LichSuTraLai schemas for API request/response validation
 """
 from pydantic import BaseModel, Field, ConfigDict
-from datetime import date
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Optional
 
 
 class LichSuTraLaiBase(BaseModel):
@@ -45,3 +45,31 @@ class LichSuTraLai(BaseModel):
     TienDaTra: int = Field(..., description="Tổng tiền đã trả")
     
     model_config = ConfigDict(from_attributes=True)
+
+
+class LichSuTraLaiPayItem(BaseModel):
+    """Một khoản thanh toán trong thanh toán hàng loạt"""
+    stt: int = Field(..., description="Số thứ tự kỳ thanh toán")
+    so_tien: int = Field(..., description="Số tiền thanh toán")
+
+
+class LichSuTraLaiPayBatch(BaseModel):
+    """Schema for batch payment request"""
+    items: List[LichSuTraLaiPayItem] = Field(
+        ...,
+        min_length=1,
+        max_length=500,
+        description="Danh sách khoản thanh toán (tối đa 500)"
+    )
+
+
+class ScheduleJobStatus(BaseModel):
+    """Trạng thái job tạo lịch sử trả lãi ở nền của một hợp đồng"""
+    MaHD: str = Field(..., description="Mã hợp đồng")
+    TrangThai: str = Field(..., description="pending, ready hoặc failed")
+    SoLanThu: int = Field(..., description="Số lần chạy lỗi")
+    SoKyDaTao: Optional[int] = Field(default=None, description="Số kỳ đã tạo (khi ready)")
+    Loi: Optional[str] = Field(default=None, description="Lỗi của lần chạy gần nhất")
+    ThoiGianTao: datetime = Field(..., description="Thời điểm thêm job")
+    ThoiGianXong: Optional[datetime] = Field(default=None, description="Thời điểm tạo xong / bỏ cuộc")
+    model_config = ConfigDict(from_attributes=True)
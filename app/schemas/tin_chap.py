@@ -13,6 +13,9 @@ class TinChapCreate(BaseModel):
     SoTienVay: int = Field(..., gt=0, description="Số tiền vay")
     KyDong: int = Field(..., gt=0, description="Kỳ đóng (số ngày giữa các kỳ thanh toán)")
     LaiSuat: int = Field(..., ge=0, description="Lãi suất (số tiền cố định mỗi kỳ, VNĐ)")
+    MaKH: Optional[str] = Field(default=None, description="Mã khách hàng (bỏ trống: tìm theo CCCD hoặc SĐT + họ tên, nếu không có thì tạo mới)")
+    SoDienThoai: Optional[str] = Field(default=None, description="Số điện thoại khách hàng")
+    CCCD: Optional[str] = Field(default=None, description="Số CCCD / CMND khách hàng")
 
 
 class TinChapUpdate(BaseModel):
@@ -23,11 +26,13 @@ class TinChapUpdate(BaseModel):
     KyDong: Optional[int] = None
     LaiSuat: Optional[int] = None
     TrangThai: Optional[str] = None
+    MaKH: Optional[str] = Field(default=None, description="Chuyển hợp đồng sang khách hàng khác")
 
 
 class TinChap(BaseModel):
     """Schema for TinChap response - can serialize from SQLAlchemy model"""
     MaHD: str = Field(..., description="Mã hợp đồng")
+    MaKH: Optional[str] = Field(default=None, description="Mã khách hàng")
     HoTen: str = Field(..., description="Họ tên người vay")
     NgayVay: date = Field(..., description="Ngày vay")
     SoTienVay: int = Field(..., description="Số tiền vay")
@@ -35,12 +40,16 @@ class TinChap(BaseModel):
     LaiSuat: int = Field(..., description="Lãi suất (số tiền cố định mỗi kỳ, VNĐ)")
     TrangThai: str = Field(..., description="Trạng thái")
     SoTienTraGoc: int = Field(..., description="Số tiền trả gốc")
+    TrangThaiLichSu: Optional[str] = Field(
+        default=None, description="Job tạo lịch sử ở nền khi tạo với async_schedule (pending, ready, failed)"
+    )
     model_config = ConfigDict(from_attributes=True)
 
 
 class TinChapResponse(BaseModel):
     """Schema for TinChap response"""
     MaHD: str = Field(..., description="Mã hợp đồng")
+    MaKH: Optional[str] = Field(default=None, description="Mã khách hàng")
     HoTen: str = Field(..., description="Họ tên người vay")
     NgayVay: date = Field(..., description="Ngày vay")
     SoTienVay: int = Field(..., description="Số tiền vay")
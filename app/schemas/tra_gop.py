@@ -14,6 +14,9 @@ class TraGopCreate(BaseModel):
     KyDong: int = Field(...,gt=0, description="Kỳ đóng (số ngày giữa các kỳ thanh toán)")
     SoLanTra: int = Field(...,gt=0, description="Tổng số lần phải trả")
     LaiSuat: int = Field(..., description="Lãi suất (tổng lãi cả kỳ hạn, VNĐ)")
+    MaKH: Optional[str] = Field(default=None, description="Mã khách hàng (bỏ trống: tìm theo CCCD hoặc SĐT + họ tên, nếu không có thì tạo mới)")
+    SoDienThoai: Optional[str] = Field(default=None, description="Số điện thoại khách hàng")
+    CCCD: Optional[str] = Field(default=None, description="Số CCCD / CMND khách hàng")
 
 
 class TraGopUpdate(BaseModel):
@@ -25,11 +28,13 @@ class TraGopUpdate(BaseModel):
     SoLanTra: Optional[int] = None
     LaiSuat: Optional[int] = None
     TrangThai: Optional[str] = None
+    MaKH: Optional[str] = Field(default=None, description="Chuyển hợp đồng sang khách hàng khác")
 
 
 class TraGop(BaseModel):
     """Schema for TraGop response - can serialize from SQLAlchemy model"""
     MaHD: str = Field(..., description="Mã hợp đồng")
+    MaKH: Optional[str] = Field(default=None, description="Mã khách hàng")
     HoTen: str = Field(..., description="Họ tên người vay")
     NgayVay: date = Field(..., description="Ngày vay")
     SoTienVay: int = Field(..., description="Số tiền vay")
@@ -37,12 +42,16 @@ class TraGop(BaseModel):
     SoLanTra: int = Field(..., description="Tổng số lần phải trả")
     LaiSuat: int = Field(..., description="Lãi suất (tổng lãi cả kỳ hạn, VNĐ)")
     TrangThai: str = Field(..., description="Trạng thái")
+    TrangThaiLichSu: Optional[str] = Field(
+        default=None, description="Job tạo lịch sử ở nền khi tạo với async_schedule (pending, ready, failed)"
+    )
     
     model_config = ConfigDict(from_attributes=True)
 
 class TraGopResponse(BaseModel):
     """Schema for TraGop response"""
     MaHD: str = Field(..., description="Mã hợp đồng")
+    MaKH: Optional[str] = Field(default=None, description="Mã khách hàng")
     HoTen: str = Field(..., description="Họ tên người vay")
     NgayVay: date = Field(..., description="Ngày vay")
     SoTienVay: int = Field(..., description="Số tiền vay")
@@ -0,0 +1,134 @@
+"""
+Archive service - Chuyển hợp đồng đã tất toán sang bảng lưu trữ
+
+Một hợp đồng được lưu trữ khi:
+- TrangThai là Đã tất toán, và
+- kỳ thanh toán cuối cùng (hoặc ngày vay, nếu không có lịch sử) cũ hơn
+  `older_than_days` ngày.
+
+Việc chuyển chạy theo từng lô (batch_size hợp đồng / transaction) để khóa ghi
+chỉ bị giữ trong thời gian ngắn: các request ghi khác xen vào giữa các lô.
+Trigger trên bảng nguồn tự cập nhật chỉ mục tìm kiếm, contract_version và
+daily_collection_rollup (thống kê mặc định chỉ tính dữ liệu đang dùng).
+"""
+from datetime import date, timedelta
+from typing import List, Optional
+
+from sqlalchemy import Date, delete, exists, insert, literal, select
+from sqlalchemy.orm import Session
+
+from app.core import config
+from app.core.enums import TrangThaiThanhToan
+from app.models import TinChap, TraGop, LichSuTraLai
+from app.models.archive import ARCHIVE_MODELS
+
+
+def find_archivable_contracts(db: Session, model, cutoff: date, limit: int) -> List[str]:
+    """
+    Tìm các hợp đồng đủ điều kiện lưu trữ
+
+    Args:
+        db: Database session
+        model: TinChap hoặc TraGop
+        cutoff: Kỳ cuối cùng phải không muộn hơn ngày này
+        limit: Số hợp đồng tối đa
+
+    Returns:
+        Danh sách MaHD
+    """
+    has_recent_history = exists().where(
+        LichSuTraLai.MaHD == model.MaHD,
+        LichSuTraLai.Ngay > cutoff,
+    )
+    rows = db.execute(
+        select(model.MaHD)
+        .where(
+            model.TrangThai == TrangThaiThanhToan.DA_TAT_TOAN.value,
+            model.NgayVay <= cutoff,
+            ~has_recent_history,
+        )
+        .order_by(model.MaHD)
+        .limit(limit)
+    ).all()
+    return [row[0] for row in rows]
+
+
+def _move_rows(db: Session, model, ma_hds: List[str], archived_on: date) -> int:
+    """Chép các dòng của ma_hds sang bảng lưu trữ rồi xóa khỏi bảng nguồn"""
+    source = model.__table__
+    archive = ARCHIVE_MODELS[model].__table__
+    column_names = [column.name for column in source.columns]
+
+    db.execute(
+        insert(archive).from_select(
+            column_names + ["NgayLuuTru"],
+            select(*source.columns, literal(archived_on, Date)).where(source.c.MaHD.in_(ma_hds)),
+        )
+    )
+    result = db.execute(delete(source).where(source.c.MaHD.in_(ma_hds)))
+    return result.rowcount
+
+
+def archive_contracts(db: Session, model, ma_hds: List[str], archived_on: Optional[date] = None) -> dict:
+    """
+    Lưu trữ một lô hợp đồng cùng lịch sử trả lãi (chưa commit)
+
+    Args:
+        db: Database session
+        model: TinChap hoặc TraGop
+        ma_hds: Các hợp đồng cần lưu trữ
+        archived_on: Ngày lưu trữ (mặc định hôm nay)
+
+    Returns:
+        dict số hợp đồng và số dòng lịch sử đã chuyển
+    """
+    archived_on = archived_on or date.today()
+    if not ma_hds:
+        return {"contracts": 0, "histories": 0}
+    histories = _move_rows(db, LichSuTraLai, ma_hds, archived_on)
+    contracts = _move_rows(db, model, ma_hds, archived_on)
+    return {"contracts": contracts, "histories": histories}
+
+
+def archive_settled_contracts(
+    db: Session,
+    older_than_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    max_batches: Optional[int] = None,
+) -> dict:
+    """
+    Lưu trữ các hợp đồng đã tất toán theo từng lô
+
+    Mỗi lô được commit riêng; chạy lại an toàn (chỉ hợp đồng còn trong bảng
+    đang dùng mới được chọn).
+
+    Args:
+        db: Database session
+        older_than_days: Số ngày sau kỳ cuối cùng (mặc định ARCHIVE_AFTER_DAYS)
+        batch_size: Số hợp đồng mỗi lô (mặc định ARCHIVE_BATCH_SIZE)
+        max_batches: Giới hạn số lô cho một lần chạy (None: chạy đến hết)
+
+    Returns:
+        dict tổng số hợp đồng, số dòng lịch sử và số lô đã xử lý
+    """
+    older_than_days = config.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    batch_size = max(1, batch_size or config.ARCHIVE_BATCH_SIZE)
+    today = date.today()
+    cutoff = today - timedelta(days=older_than_days)
+
+    summary = {"contracts": 0, "histories": 0, "batches": 0, "cutoff": cutoff.isoformat()}
+    for model in (TinChap, TraGop):
+        while max_batches is None or summary["batches"] < max_batches:
+            ma_hds = find_archivable_contracts(db, model, cutoff, batch_size)
+            if not ma_hds:
+                break
+            try:
+                moved = archive_contracts(db, model, ma_hds, archived_on=today)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            summary["contracts"] += moved["contracts"]
+            summary["histories"] += moved["histories"]
+            summary["batches"] += 1
+    return summary
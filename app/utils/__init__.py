@@ -1,7 +1,12 @@
 """
 Utility functions package
 """
-from app.utils.id_generator import generate_tin_chap_id, generate_tra_gop_id
+from app.utils.id_generator import (
+    generate_tin_chap_id,
+    generate_tra_gop_id,
+    reserve_tin_chap_ids,
+    reserve_tra_gop_ids,
+)
 from app.utils.calculations import (
     calculate_monthly_payment,
     calculate_total_payment,
@@ -11,6 +16,8 @@ from app.utils.calculations import (
 __all__ = [
     "generate_tin_chap_id",
     "generate_tra_gop_id",
+    "reserve_tin_chap_ids",
+    "reserve_tra_gop_ids",
     "calculate_monthly_payment",
     "calculate_total_payment",
     "calculate_remaining_amount",
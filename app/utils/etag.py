@@ -0,0 +1,53 @@
+"""
+ETag helpers for conditional GET (If-None-Match -> 304)
+"""
+import hashlib
+from typing import Dict, List, Optional
+
+
+def make_contract_etag(ma_hd: str, version: int, include_archived: bool = False) -> str:
+    """
+    Strong ETag of one contract, e.g. "TC001-7"
+
+    Reads with include_archived get their own tag ("TC001-7-archived"): for an
+    archived contract the two reads return different representations (404
+    vs. 200).
+    """
+    suffix = "-archived" if include_archived else ""
+    return f'"{ma_hd}-{version}{suffix}"'
+
+
+def make_list_etag(ma_hds: List[str], versions: Dict[str, int], scope: str) -> Optional[str]:
+    """
+    Strong ETag of a list page: hash of the ordered (MaHD, Version) pairs
+
+    Args:
+        ma_hds: Contract IDs on the page, in response order
+        versions: MaHD -> Version
+        scope: Resource name (tin-chap, tra-gop) to keep ETags distinct
+
+    Returns:
+        ETag or None if a contract on the page has no version
+    """
+    if any(ma_hd not in versions for ma_hd in ma_hds):
+        return None
+    payload = "|".join(f"{ma_hd}:{versions[ma_hd]}" for ma_hd in ma_hds)
+    digest = hashlib.sha1(f"{scope}|{payload}".encode("utf-8")).hexdigest()
+    return f'"{scope}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag (weak comparison, RFC 9110)
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
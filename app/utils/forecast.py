@@ -0,0 +1,125 @@
+"""
+Forecast helpers - Dự báo số tiền đến hạn theo ngày cho toàn bộ hợp đồng
+
+Mỗi hợp đồng được mô tả bằng vài cột số (một phần tử mỗi hợp đồng), và lịch
+của cả danh mục được tính một lần bằng phép toán trên mảng NumPy (dependency
+trong pyproject.toml); môi trường cài thiếu NumPy vẫn chạy được bằng vòng lặp
+Python, cùng kết quả.
+
+Các kỳ đã có dòng lịch sử (kỳ đã cộng dồn, kỳ Trả Góp tạo sẵn) được tính từ
+database; ở đây chỉ sinh các kỳ chưa có dòng, theo cùng quy tắc với lần cộng
+dồn (xem app.crud.lich_su_tra_lai.auto_create_lich_su):
+- Tín Chấp: mỗi kỳ mới = LaiSuat
+- Trả Góp: sau SoLanTra kỳ, kỳ mới chỉ gồm phần cộng dồn (0 đồng mới)
+- Cộng dồn số tiền còn nợ của các kỳ trước as_of:
+  - Tín Chấp: toàn bộ (cùng các kỳ chưa có dòng đã qua) vào kỳ chưa cộng dồn
+    đầu tiên trong khoảng dự báo
+  - Trả Góp: mỗi kỳ trong lịch chỉ nhận phần còn nợ của kỳ ngay trước nó, nên
+    chuỗi kỳ từ KyHienTai vào kỳ chưa cộng dồn đầu tiên; nợ cũ hơn chỉ được
+    gom ở kỳ đầu tiên ngoài lịch (sau SoLanTra kỳ)
+"""
+from datetime import date
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # cài thiếu NumPy: dùng vòng lặp Python
+    np = None
+
+# Cột mô tả hợp đồng, mỗi cột là một list (một phần tử mỗi hợp đồng)
+TERM_COLUMNS = (
+    "ngay_vay",        # NgayVay (date.toordinal())
+    "ky_dong",         # KyDong (> 0)
+    "ky_hien_tai",     # KyHienTai: kỳ mới nhất đã cộng dồn
+    "so_ky_co_dong",   # Số kỳ đầu đã có dòng lịch sử tạo sẵn (Trả Góp: SoLanTra)
+    "so_tien_ky_moi",  # Số tiền mới của một kỳ chưa có dòng
+    "cong_don",        # Nợ trước as_of cộng dồn vào kỳ chưa cộng dồn đầu tiên
+    "no_cu",           # Nợ trước as_of chỉ được gom ở kỳ đầu tiên ngoài lịch
+)
+
+
+def project_due_amounts(terms: Dict[str, list], as_of: date, days: int) -> Tuple[List[int], List[int], int]:
+    """
+    Số tiền đến hạn của các kỳ chưa có dòng lịch sử, theo từng ngày
+
+    Args:
+        terms: Các cột TERM_COLUMNS
+        as_of: Ngày đầu của khoảng dự báo
+        days: Số ngày dự báo (as_of .. as_of + days - 1)
+
+    Returns:
+        (số tiền theo ngày, số kỳ theo ngày, tổng tiền cộng dồn đã đưa vào khoảng)
+    """
+    if not terms["ngay_vay"]:
+        return [0] * days, [0] * days, 0
+    if np is not None:
+        return _project_numpy(terms, as_of.toordinal(), days)
+    return _project_python(terms, as_of.toordinal(), days)
+
+
+def _project_numpy(terms: Dict[str, list], start: int, days: int) -> Tuple[List[int], List[int], int]:
+    ngay_vay, ky_dong, ky_hien_tai, so_ky_co_dong, so_tien_ky_moi, cong_don, no_cu = (
+        np.asarray(terms[name], dtype=np.int64) for name in TERM_COLUMNS
+    )
+    end = start + days - 1
+    # Kỳ đầu tiên đến hạn từ as_of (ceil) và kỳ cuối cùng trong khoảng (floor)
+    ky_dau = np.maximum(1, -((ngay_vay - start) // ky_dong))
+    ky_cuoi = (end - ngay_vay) // ky_dong
+    ky_chua_co_dong = np.maximum(ky_hien_tai, so_ky_co_dong) + 1
+
+    # Các kỳ chưa có dòng trong khoảng: trải ra thành một mảng (hợp đồng, kỳ)
+    tu_ky = np.maximum(ky_chua_co_dong, ky_dau)
+    so_ky = np.clip(ky_cuoi - tu_ky + 1, 0, None)
+    hop_dong = np.repeat(np.arange(len(so_ky)), so_ky)
+    ky = tu_ky[hop_dong] + np.arange(len(hop_dong)) - np.repeat(np.cumsum(so_ky) - so_ky, so_ky)
+    offsets = ngay_vay[hop_dong] + ky * ky_dong[hop_dong] - start
+
+    amounts = np.zeros(days, dtype=np.int64)
+    np.add.at(amounts, offsets, so_tien_ky_moi[hop_dong])
+    counts = np.bincount(offsets, minlength=days)
+
+    # Cộng dồn: nợ trước as_of + các kỳ chưa có dòng đã qua -> kỳ chưa cộng dồn đầu tiên
+    ky_da_qua = np.clip(ky_dau - ky_chua_co_dong, 0, None)
+    ky_nhan = np.maximum(ky_hien_tai + 1, ky_dau)
+    # Nợ cũ -> kỳ đầu tiên ngoài lịch (trùng kỳ trên nếu kỳ đó đã ngoài lịch)
+    ky_nhan_no_cu = np.maximum(so_ky_co_dong + 1, ky_nhan)
+    tong_cong_don = 0
+    for ky_nhan_tien, so_tien in (
+        (ky_nhan, cong_don + ky_da_qua * so_tien_ky_moi),
+        (ky_nhan_no_cu, no_cu),
+    ):
+        co_ky_nhan = (ky_nhan_tien <= ky_cuoi) & (so_tien != 0)
+        np.add.at(
+            amounts,
+            ngay_vay[co_ky_nhan] + ky_nhan_tien[co_ky_nhan] * ky_dong[co_ky_nhan] - start,
+            so_tien[co_ky_nhan],
+        )
+        tong_cong_don += int(so_tien[co_ky_nhan].sum())
+    return amounts.tolist(), counts.tolist(), tong_cong_don
+
+
+def _project_python(terms: Dict[str, list], start: int, days: int) -> Tuple[List[int], List[int], int]:
+    end = start + days - 1
+    amounts = [0] * days
+    counts = [0] * days
+    cong_don_trong_khoang = 0
+    for ngay_vay, ky_dong, ky_hien_tai, so_ky_co_dong, so_tien_ky_moi, cong_don, no_cu in zip(
+        *(terms[name] for name in TERM_COLUMNS)
+    ):
+        ky_dau = max(1, -((ngay_vay - start) // ky_dong))
+        ky_cuoi = (end - ngay_vay) // ky_dong
+        ky_chua_co_dong = max(ky_hien_tai, so_ky_co_dong) + 1
+        for ky in range(max(ky_chua_co_dong, ky_dau), ky_cuoi + 1):
+            offset = ngay_vay + ky * ky_dong - start
+            amounts[offset] += so_tien_ky_moi
+            counts[offset] += 1
+
+        ky_nhan = max(ky_hien_tai + 1, ky_dau)
+        for ky_nhan_tien, so_tien in (
+            (ky_nhan, cong_don + max(ky_dau - ky_chua_co_dong, 0) * so_tien_ky_moi),
+            (max(so_ky_co_dong + 1, ky_nhan), no_cu),
+        ):
+            if ky_nhan_tien <= ky_cuoi and so_tien != 0:
+                amounts[ngay_vay + ky_nhan_tien * ky_dong - start] += so_tien
+                cong_don_trong_khoang += so_tien
+    return amounts, counts, cong_don_trong_khoang
@@ -1,8 +1,109 @@
 """
 ID Generator utility functions
+
+Mã hợp đồng (và mã khách hàng) được cấp từ bảng id_sequence: mỗi lần cấp là một câu
+UPDATE ... SET GiaTri = GiaTri + n RETURNING GiaTri, nên không phải quét
+bảng hợp đồng và hai request đồng thời không thể nhận cùng một mã. Database
+không có UPDATE ... RETURNING (MySQL) khóa dòng bộ đếm bằng SELECT ... FOR
+UPDATE rồi mới UPDATE.
 """
+from typing import List
+
+from sqlalchemy import Integer, cast, func, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.models import TinChap, TraGop
+
+from app.models import TinChap, TraGop, KhachHang, IdSequence
+from app.models.archive import ARCHIVE_MODELS
+
+
+# Tiền tố mã -> model tương ứng
+_PREFIX_MODELS = {
+    "TC": TinChap,
+    "TG": TraGop,
+    "KH": KhachHang,
+}
+
+
+def _format_id(prefix: str, number: int) -> str:
+    """Format with leading zeros (e.g., TC001, TC002, ..., TC1000)"""
+    return f"{prefix}{number:03d}"
+
+
+def _ensure_sequence(db: Session, prefix: str) -> None:
+    """
+    Tạo dòng bộ đếm cho tiền tố nếu chưa có
+
+    Lần đầu tiên (database cũ chưa có bộ đếm), giá trị khởi tạo là số lớn nhất
+    đang có trong bảng hợp đồng (kể cả bảng lưu trữ) - so sánh theo số nên
+    TC1000 > TC999.
+    """
+    if db.get(IdSequence, prefix) is not None:
+        return
+
+    # Tính cả hợp đồng đã lưu trữ để không cấp lại mã cũ
+    model = _PREFIX_MODELS[prefix]
+    id_column = model.__table__.primary_key.columns[0].name
+    last_number = max(
+        db.execute(
+            select(func.max(cast(func.substr(getattr(table, id_column), len(prefix) + 1), Integer)))
+        ).scalar() or 0
+        for table in (model, ARCHIVE_MODELS.get(model))
+        if table is not None
+    )
+
+    try:
+        # Savepoint: request khác có thể vừa tạo cùng dòng bộ đếm
+        with db.begin_nested():
+            db.add(IdSequence(Ten=prefix, GiaTri=last_number or 0))
+    except IntegrityError:
+        pass
+
+
+def reserve_ids(db: Session, prefix: str, count: int = 1) -> List[str]:
+    """
+    Cấp một khối mã hợp đồng liên tiếp
+
+    Bộ đếm được tăng trong transaction hiện tại; nếu transaction bị rollback
+    thì khối mã cũng được trả lại.
+
+    Args:
+        db: Database session
+        prefix: Tiền tố mã ("TC", "TG" hoặc "KH")
+        count: Số mã cần cấp (dùng cho import hàng loạt)
+
+    Returns:
+        Danh sách mã hợp đồng theo thứ tự tăng dần
+    """
+    if prefix not in _PREFIX_MODELS:
+        raise ValueError(f"Tiền tố mã không hợp lệ: {prefix}")
+    if count < 1:
+        raise ValueError("count phải lớn hơn 0")
+
+    _ensure_sequence(db, prefix)
+
+    if db.get_bind().dialect.update_returning:
+        last_number = db.execute(
+            update(IdSequence)
+            .where(IdSequence.Ten == prefix)
+            .values(GiaTri=IdSequence.GiaTri + count)
+            .returning(IdSequence.GiaTri)
+            .execution_options(synchronize_session=False)
+        ).scalar_one()
+    else:
+        # Khóa dòng bộ đếm tới hết transaction: request khác chờ ở câu SELECT này
+        last_number = db.execute(
+            select(IdSequence.GiaTri).where(IdSequence.Ten == prefix).with_for_update()
+        ).scalar_one() + count
+        db.execute(
+            update(IdSequence)
+            .where(IdSequence.Ten == prefix)
+            .values(GiaTri=last_number)
+            .execution_options(synchronize_session=False)
+        )
+
+    first_number = last_number - count + 1
+    return [_format_id(prefix, number) for number in range(first_number, last_number + 1)]
 
 
 def generate_tin_chap_id(db: Session) -> str:
@@ -10,18 +111,7 @@ def generate_tin_chap_id(db: Session) -> str:
     Generate TinChap contract ID in format TCXXX
     XXX is an auto-incrementing integer
     """
-    # Get the last TinChap record
-    last_record = db.query(TinChap).order_by(TinChap.MaHD.desc()).first()
-    
-    if last_record:
-        # Extract the number from the last MaHD (e.g., TC001 -> 001)
-        last_number = int(last_record.MaHD[2:])
-        new_number = last_number + 1
-    else:
-        new_number = 1
-    
-    # Format with leading zeros (e.g., TC001, TC002, ..., TC100)
-    return f"TC{new_number:03d}"
+    return reserve_ids(db, "TC")[0]
 
 
 def generate_tra_gop_id(db: Session) -> str:
@@ -29,16 +119,42 @@ def generate_tra_gop_id(db: Session) -> str:
     Generate TraGop contract ID in format TGXXX
     XXX is an auto-incrementing integer
     """
-    # Get the last TraGop record
-    last_record = db.query(TraGop).order_by(TraGop.MaHD.desc()).first()
-    
-    if last_record:
-        # Extract the number from the last MaHD (e.g., TG001 -> 001)
-        last_number = int(last_record.MaHD[2:])
-        new_number = last_number + 1
-    else:
-        new_number = 1
-    
-    # Format with leading zeros (e.g., TG001, TG002, ..., TG100)
-    return f"TG{new_number:03d}"
+    return reserve_ids(db, "TG")[0]
+
+
+def generate_khach_hang_id(db: Session) -> str:
+    """
+    Generate customer ID in format KHXXX
+    XXX is an auto-incrementing integer
+    """
+    return reserve_ids(db, "KH")[0]
 
+
+def reserve_tin_chap_ids(db: Session, count: int) -> List[str]:
+    """Reserve a block of TinChap contract IDs for bulk imports"""
+    return reserve_ids(db, "TC", count)
+
+
+def reserve_tra_gop_ids(db: Session, count: int) -> List[str]:
+    """Reserve a block of TraGop contract IDs for bulk imports"""
+    return reserve_ids(db, "TG", count)
+
+
+def ma_hd_order_by(column, descending: bool = False) -> tuple:
+    """
+    Sắp xếp mã hợp đồng theo số thứ tự, không phụ thuộc độ rộng
+
+    So sánh chuỗi thuần sẽ xếp "TC1000" trước "TC999"; sắp theo độ dài trước
+    rồi mới theo chuỗi cho kết quả đúng thứ tự số (cùng tiền tố).
+
+    Args:
+        column: Cột MaHD
+        descending: Sắp xếp giảm dần
+
+    Returns:
+        Tuple biểu thức dùng cho order_by(*...)
+    """
+    length = func.length(column)
+    if descending:
+        return length.desc(), column.desc()
+    return length.asc(), column.asc()
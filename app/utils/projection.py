@@ -0,0 +1,36 @@
+"""
+Sparse fieldsets - chọn trường trả về theo tham số `fields=`
+"""
+from typing import Iterable, Optional, Set
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[Set[str]]:
+    """
+    Phân tích tham số fields dạng "MaHD,HoTen,TrangThai"
+
+    Args:
+        fields: Chuỗi tên trường, phân tách bằng dấu phẩy (None: trả mọi trường)
+        allowed: Các tên trường hợp lệ
+
+    Returns:
+        Tập tên trường được chọn, hoặc None nếu không giới hạn
+
+    Raises:
+        ValueError: Nếu có tên trường không hợp lệ
+    """
+    if fields is None:
+        return None
+    selected = {name.strip() for name in fields.split(",") if name.strip()}
+    if not selected:
+        return None
+    unknown = selected - set(allowed)
+    if unknown:
+        raise ValueError(f"Trường không hợp lệ: {', '.join(sorted(unknown))}")
+    return selected
+
+
+def project(payload: dict, keep: Optional[Set[str]]) -> dict:
+    """Giữ lại các khóa trong keep (None: giữ nguyên payload)"""
+    if keep is None:
+        return payload
+    return {key: value for key, value in payload.items() if key in keep}
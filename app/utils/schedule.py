@@ -0,0 +1,91 @@
+"""
+Schedule helpers - Vị trí của hợp đồng trên lịch thanh toán
+
+Kỳ thứ k (k >= 1) đến hạn vào NgayVay + k * KyDong (cộng số ngày, nên đúng
+qua ranh giới tháng/năm). Mỗi hợp đồng lưu:
+- KyHienTai: kỳ mới nhất đã được tính vào lịch sử (0: chưa có kỳ nào)
+- NgayDenHanTiepTheo: ngày đến hạn của kỳ KyHienTai + 1, tức ngày mà lần
+  cộng dồn tiếp theo phải xử lý; None khi hợp đồng đã tất toán
+
+"Hợp đồng nào đến hạn vào ngày D" vì vậy là một phép tra chỉ mục
+NgayDenHanTiepTheo <= D thay vì duyệt từng hợp đồng.
+"""
+from datetime import date, timedelta
+from typing import Optional
+
+from app.core.enums import TrangThaiThanhToan
+
+
+def period_due_date(ngay_vay: date, ky_dong: int, ky: int) -> Optional[date]:
+    """
+    Ngày đến hạn của kỳ thứ ky
+
+    Args:
+        ngay_vay: Ngày vay
+        ky_dong: Số ngày giữa các kỳ
+        ky: Số thứ tự kỳ (bắt đầu từ 1)
+
+    Returns:
+        Ngày đến hạn, hoặc None nếu hợp đồng không có lịch (KyDong <= 0)
+    """
+    if not ky_dong or ky_dong <= 0:
+        return None
+    return ngay_vay + timedelta(days=ky_dong * ky)
+
+
+def periods_due_by(ngay_vay: date, ky_dong: int, on_date: date) -> int:
+    """
+    Số kỳ có ngày đến hạn <= on_date
+
+    Args:
+        ngay_vay: Ngày vay
+        ky_dong: Số ngày giữa các kỳ
+        on_date: Ngày xét
+
+    Returns:
+        Số kỳ (0 nếu chưa đến kỳ đầu tiên hoặc KyDong <= 0)
+    """
+    if not ky_dong or ky_dong <= 0 or on_date <= ngay_vay:
+        return 0
+    return (on_date - ngay_vay).days // ky_dong
+
+
+def set_current_period(contract, ky_hien_tai: int) -> None:
+    """
+    Đặt kỳ hiện tại và ngày đến hạn tiếp theo của hợp đồng (chưa commit)
+
+    Args:
+        contract: TinChap hoặc TraGop
+        ky_hien_tai: Kỳ mới nhất đã được tính vào lịch sử
+    """
+    contract.KyHienTai = ky_hien_tai
+    if contract.TrangThai == TrangThaiThanhToan.DA_TAT_TOAN.value:
+        contract.NgayDenHanTiepTheo = None
+    else:
+        contract.NgayDenHanTiepTheo = period_due_date(contract.NgayVay, contract.KyDong, ky_hien_tai + 1)
+
+
+def reset_schedule_position(contract, as_of: date) -> None:
+    """
+    Tính lại vị trí trên lịch khi không biết kỳ nào đã được tính (đổi ngày
+    vay / kỳ đóng, mở lại hợp đồng): các kỳ trước as_of coi như đã tính, kỳ
+    đến hạn đúng ngày as_of vẫn chờ lần cộng dồn của ngày đó
+
+    Args:
+        contract: TinChap hoặc TraGop
+        as_of: Ngày xét (thường là hôm nay)
+    """
+    set_current_period(contract, periods_due_by(contract.NgayVay, contract.KyDong, as_of - timedelta(days=1)))
+
+
+def refresh_due_date(contract, as_of: date) -> None:
+    """
+    Đồng bộ ngày đến hạn tiếp theo sau khi đổi trạng thái hợp đồng (chưa commit)
+
+    Đã tất toán: không còn kỳ nào đến hạn. Hợp đồng được mở lại (trước đó đã
+    tất toán): tính lại vị trí trên lịch từ as_of.
+    """
+    if contract.TrangThai == TrangThaiThanhToan.DA_TAT_TOAN.value:
+        contract.NgayDenHanTiepTheo = None
+    elif contract.NgayDenHanTiepTheo is None:
+        reset_schedule_position(contract, as_of)
@@ -0,0 +1,105 @@
+"""
+Search helpers - chuẩn hóa tiếng Việt và tạo câu truy vấn FTS5
+"""
+import re
+import unicodedata
+from typing import Optional
+
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Từ tìm kiếm dài tối đa chừng này ký tự được coi là ngắn (xem needs_substring_search)
+_SHORT_TOKEN_LENGTH = 2
+
+
+def fold_vietnamese(text: str) -> str:
+    """
+    Bỏ dấu tiếng Việt và chuyển về chữ thường
+
+    Ví dụ: "Nguyễn Đức" -> "nguyen duc"
+
+    Args:
+        text: Chuỗi cần chuẩn hóa
+
+    Returns:
+        Chuỗi không dấu, chữ thường
+    """
+    # "đ/Đ" không phải ký tự tổ hợp nên NFKD không tách được dấu
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return stripped.lower()
+
+
+def customer_name(ho_ten: str) -> str:
+    """
+    Họ tên của khách hàng đã chuẩn hóa: dạng Unicode NFC, gộp khoảng trắng
+
+    Giữ nguyên dấu: dùng để nhận diện khách hàng (xem customer_name_key cho
+    tìm kiếm).
+
+    Ví dụ: "  Nguyễn  Văn An " -> "Nguyễn Văn An"
+
+    Args:
+        ho_ten: Họ tên
+
+    Returns:
+        Họ tên lưu trong khach_hang.HoTen
+    """
+    return " ".join(unicodedata.normalize("NFC", ho_ten).split())
+
+
+def customer_name_key(ho_ten: str) -> str:
+    """
+    Khóa họ tên của khách hàng: bỏ dấu, chữ thường, gộp khoảng trắng
+
+    Ví dụ: "  Nguyễn  Văn An " -> "nguyen van an"
+
+    Args:
+        ho_ten: Họ tên
+
+    Returns:
+        Khóa so khớp / tìm kiếm (TenKhongDau)
+    """
+    return " ".join(fold_vietnamese(ho_ten).split())
+
+
+def build_fts_query(search: str) -> Optional[str]:
+    """
+    Tạo câu truy vấn FTS5 dạng tiền tố từ chuỗi người dùng nhập
+
+    Mỗi từ được bỏ dấu, đặt trong dấu nháy kép (tránh cú pháp FTS5)
+    và thêm "*" để tìm theo tiền tố. Các từ được nối theo AND.
+
+    Ví dụ: "nguyen van" -> '"nguyen"* "van"*'
+
+    Args:
+        search: Chuỗi tìm kiếm
+
+    Returns:
+        Câu truy vấn MATCH hoặc None nếu không có từ nào hợp lệ
+    """
+    tokens = _TOKEN_PATTERN.findall(fold_vietnamese(search))
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def needs_substring_search(search: str) -> bool:
+    """
+    Chuỗi tìm kiếm cần khớp cả giữa chuỗi (ILIKE) ngoài FTS5
+
+    FTS5 chỉ khớp theo đầu từ: "003" không khớp "TC003", "an" không khớp
+    "Lan". Chuỗi chỉ gồm chữ số (mã hợp đồng) hoặc mọi từ đều ngắn
+    (<= 2 ký tự) vẫn được khớp giữa chuỗi như trước khi có FTS5.
+
+    Args:
+        search: Chuỗi tìm kiếm
+
+    Returns:
+        True nếu cần thêm điều kiện ILIKE
+    """
+    tokens = _TOKEN_PATTERN.findall(fold_vietnamese(search))
+    if not tokens:
+        return False
+    return all(token.isdigit() for token in tokens) or all(len(token) <= _SHORT_TOKEN_LENGTH for token in tokens)
@@ -0,0 +1,61 @@
+"""
+Serialization helpers - chuyển dòng ORM sang dict không qua Pydantic
+
+Dữ liệu đọc từ database là dữ liệu tin cậy (kiểu cột đã đúng), nên các
+response danh sách đọc thẳng thuộc tính thay vì
+Schema.model_validate(row).model_dump() cho từng dòng.
+"""
+from functools import lru_cache
+from typing import Any
+
+from pydantic import TypeAdapter
+
+
+# Các trường của một dòng lịch sử trong response (cùng thứ tự với schema LichSuTraLai)
+LICH_SU_FIELDS = (
+    "Stt",
+    "MaHD",
+    "Ngay",
+    "SoTien",
+    "NoiDung",
+    "TrangThaiThanhToan",
+    "TrangThaiNgayThanhToan",
+    "TienDaTra",
+)
+
+
+def lich_su_to_dict(lich_su) -> dict:
+    """
+    Chuyển một dòng LichSuTraLai (ORM object hoặc Row) sang dict
+
+    Args:
+        lich_su: Dòng lịch sử trả lãi
+
+    Returns:
+        dict cùng khóa với LichSuTraLai schema
+    """
+    # Object ORM đã load: đọc thẳng __dict__ (bỏ qua descriptor của SQLAlchemy);
+    # thuộc tính đã expire hoặc Row thì quay về getattr
+    values = getattr(lich_su, "__dict__", None)
+    if values is not None:
+        try:
+            return {field: values[field] for field in LICH_SU_FIELDS}
+        except KeyError:
+            pass
+    return {field: getattr(lich_su, field) for field in LICH_SU_FIELDS}
+
+
+@lru_cache(maxsize=None)
+def get_type_adapter(tp: Any) -> TypeAdapter:
+    """
+    TypeAdapter dùng chung cho một kiểu
+
+    Tạo TypeAdapter tốn chi phí build schema; cache lại để chỉ build một lần.
+
+    Args:
+        tp: Kiểu cần validate/serialize (vd: List[TinChapResponse])
+
+    Returns:
+        TypeAdapter của kiểu đó
+    """
+    return TypeAdapter(tp)
@@ -8,7 +8,7 @@ import os
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app.core.database import init_db, DATABASE_PATH, engine
+from app.core.database import init_db, engine
 from sqlalchemy import inspect
 
 
@@ -24,7 +24,7 @@ def main():
     print("="*60)
     print("🗄️  Database Initialization")
     print("="*60)
-    print(f"\nDatabase location: {DATABASE_PATH}\n")
+    print(f"\nDatabase location: {engine.url.render_as_string(hide_password=True)}\n")
     
     # Check if tables exist
     if check_tables_exist():
@@ -0,0 +1,116 @@
+"""
+Management commands
+
+    python manage.py rebuild-rollup   # Tính lại bảng daily_collection_rollup
+    python manage.py rebuild-search   # Xây dựng lại chỉ mục tìm kiếm hợp đồng (FTS5)
+    python manage.py verify-ledger    # Đối chiếu sổ thu tiền với số đã trả
+    python manage.py archive [--older-than-days N] [--batch-size N] [--max-batches N]
+                                      # Lưu trữ hợp đồng đã tất toán
+"""
+import argparse
+import os
+import sys
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import engine, Base
+
+
+def rebuild_rollup() -> None:
+    """Tính lại bảng tổng hợp thu tiền theo ngày từ lich_su_tra_lai"""
+    from app.models.daily_collection_rollup import rebuild_daily_collection_rollup, rollup_is_maintained
+
+    if not rollup_is_maintained(engine):
+        print(f"⚠️  Bảng tổng hợp chỉ được dùng trên SQLite (đang dùng {engine.dialect.name})")
+        return
+    with engine.begin() as connection:
+        rows = rebuild_daily_collection_rollup(connection)
+    print(f"✅ Đã tính lại daily_collection_rollup: {rows} dòng")
+
+
+def rebuild_search() -> None:
+    """Xây dựng lại chỉ mục tìm kiếm hợp đồng"""
+    from app.models.contract_search import rebuild_contract_search
+
+    if engine.dialect.name != "sqlite":
+        print(f"⚠️  Chỉ mục FTS5 chỉ được dùng trên SQLite (đang dùng {engine.dialect.name})")
+        return
+    with engine.begin() as connection:
+        total = rebuild_contract_search(connection)
+    print(f"✅ Đã đánh chỉ mục lại {total} hợp đồng")
+
+
+def verify_ledger() -> None:
+    """Đối chiếu payment_ledger với TienDaTra / SoTienTraGoc; exit code 1 nếu lệch"""
+    from app.core.database import SessionLocal
+    from app.crud.payment_ledger import verify_ledger as verify
+
+    db = SessionLocal()
+    try:
+        result = verify(db)
+    finally:
+        db.close()
+    for item in result.lech:
+        target = f"kỳ {item.stt}" if item.stt is not None else "tiền gốc"
+        print(f"❌ {item.ma_hd} {target}: hiện tại {item.so_tien_hien_tai}, trong sổ {item.so_tien_trong_so}")
+    print(
+        f"{'✅' if result.ok else '❌'} Đã đối chiếu {result.so_ky_kiem_tra} kỳ, "
+        f"{result.so_hop_dong_kiem_tra} hợp đồng tín chấp: {result.so_dong_lech} dòng lệch"
+    )
+    if not result.ok:
+        sys.exit(1)
+
+
+def archive(older_than_days=None, batch_size=None, max_batches=None) -> None:
+    """Chuyển hợp đồng đã tất toán (và lịch sử) sang bảng lưu trữ theo từng lô"""
+    from app.core.database import SessionLocal
+    from app.services.archive import archive_settled_contracts
+
+    db = SessionLocal()
+    try:
+        result = archive_settled_contracts(
+            db,
+            older_than_days=older_than_days,
+            batch_size=batch_size,
+            max_batches=max_batches,
+        )
+    finally:
+        db.close()
+    print(
+        f"✅ Đã lưu trữ {result['contracts']} hợp đồng, {result['histories']} dòng lịch sử "
+        f"trong {result['batches']} lô (kỳ cuối trước {result['cutoff']})"
+    )
+
+
+COMMANDS = {
+    "rebuild-rollup": rebuild_rollup,
+    "rebuild-search": rebuild_search,
+    "verify-ledger": verify_ledger,
+    "archive": archive,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="API App Credit management commands")
+    parser.add_argument("command", choices=sorted(COMMANDS), help="Lệnh cần chạy")
+    parser.add_argument("--older-than-days", type=int, default=None,
+                        help="archive: số ngày sau kỳ cuối cùng (mặc định ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="archive: số hợp đồng mỗi transaction (mặc định ARCHIVE_BATCH_SIZE)")
+    parser.add_argument("--max-batches", type=int, default=None,
+                        help="archive: số lô tối đa cho lần chạy này")
+    args = parser.parse_args()
+
+    print(f"Database location: {engine.url.render_as_string(hide_password=True)}")
+    # Đảm bảo bảng/trigger đã được tạo trước khi chạy lệnh
+    import app.models  # noqa: F401 - đăng ký model với Base
+    Base.metadata.create_all(bind=engine)
+    if args.command == "archive":
+        archive(args.older_than_days, args.batch_size, args.max_batches)
+    else:
+        COMMANDS[args.command]()
+
+
+if __name__ == "__main__":
+    main()
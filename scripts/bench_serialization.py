@@ -0,0 +1,128 @@
+"""
+Benchmark: chi phí serialize response danh sách hợp đồng, tính trên 1.000 dòng lịch sử
+
+So sánh hai đường:
+
+- pydantic: đường cũ - model_validate(ls).model_dump() cho từng dòng, dựng
+  TinChapResponse, rồi validate + serialize lại theo response_model
+  ApiResponse[List[TinChapResponse]] và json.dumps (như FastAPI làm)
+- fast: dict dựng thẳng từ dòng ORM + FastJSONResponse (orjson nếu có)
+
+Không cần database: dùng object ORM tạm trong bộ nhớ.
+
+    python scripts/bench_serialization.py --contracts 50 --rows 40 --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.enums import TrangThaiThanhToan, TrangThaiNgayThanhToan
+from app.core.responses import FastJSONResponse, orjson
+from app.crud.lich_su_tra_lai import summarize_lich_sus
+from app.crud.tin_chap import _tin_chap_to_dict, _calculate_payment_info
+from app.models import TinChap, LichSuTraLai
+from app.schemas.lich_su_tra_lai import LichSuTraLai as LichSuTraLaiSchema
+from app.schemas.response import ApiResponse
+from app.schemas.tin_chap import TinChapResponse
+from app.utils.serialization import get_type_adapter
+
+
+def _make_data(contracts: int, rows: int) -> list:
+    """Tạo (hợp đồng, lịch sử) trong bộ nhớ"""
+    data = []
+    stt = 0
+    for i in range(1, contracts + 1):
+        ma_hd = f"TC{i:03d}"
+        tin_chap = TinChap(
+            MaHD=ma_hd, HoTen=f"Nguyễn Văn {i}", NgayVay=date(2025, 1, 1),
+            SoTienVay=10_000_000, KyDong=30, LaiSuat=100_000, SoTienTraGoc=0,
+            TrangThai=TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+        )
+        lich_sus = []
+        for k in range(rows):
+            stt += 1
+            lich_sus.append(LichSuTraLai(
+                Stt=stt, MaHD=ma_hd, Ngay=date(2025, 1, 1) + timedelta(days=30 * (k + 1)),
+                SoTien=100_000, NoiDung=f"Trả lãi kỳ {k + 1}",
+                TrangThaiThanhToan=TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+                TrangThaiNgayThanhToan=TrangThaiNgayThanhToan.CHUA_DEN_HAN.value,
+                TienDaTra=0,
+            ))
+        data.append((tin_chap, lich_sus))
+    return data
+
+
+def _pydantic_path(data: list) -> bytes:
+    """Đường cũ: nhiều lượt Pydantic trên mỗi dòng"""
+    results = []
+    for tin_chap, lich_sus in data:
+        lich_su_schemas = [LichSuTraLaiSchema.model_validate(ls).model_dump() for ls in lich_sus]
+        payment_info = _calculate_payment_info(tin_chap, summarize_lich_sus(lich_sus))
+        results.append(TinChapResponse(
+            MaHD=tin_chap.MaHD, HoTen=tin_chap.HoTen, NgayVay=tin_chap.NgayVay,
+            SoTienVay=tin_chap.SoTienVay, KyDong=tin_chap.KyDong, LaiSuat=tin_chap.LaiSuat,
+            SoTienTraGoc=tin_chap.SoTienTraGoc, TrangThai=tin_chap.TrangThai,
+            LichSuTraLai=lich_su_schemas,
+            LaiDaTra=payment_info["lai_da_tra"],
+            GocConLai=payment_info["goc_con_lai"],
+            LaiConLai=payment_info["lai_con_lai"],
+        ))
+    envelope = ApiResponse.success_response(data=results, message="ok")
+
+    # FastAPI: validate theo response_model rồi serialize sang JSON
+    adapter = get_type_adapter(ApiResponse[List[TinChapResponse]])
+    validated = adapter.validate_python(envelope, from_attributes=True)
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _fast_path(data: list) -> bytes:
+    """Đường mới: dict trực tiếp + FastJSONResponse"""
+    results = [
+        _tin_chap_to_dict(tin_chap, lich_sus, summarize_lich_sus(lich_sus))
+        for tin_chap, lich_sus in data
+    ]
+    return FastJSONResponse({"success": True, "data": results, "message": "ok", "error": None}).body
+
+
+def _measure(fn, data: list, repeat: int) -> float:
+    """Thời gian trung bình (giây) cho một lần gọi fn(data)"""
+    fn(data)  # warm-up (build schema, cache adapter)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(data)
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contracts", type=int, default=50, help="Số hợp đồng trên một trang")
+    parser.add_argument("--rows", type=int, default=40, help="Số dòng lịch sử mỗi hợp đồng")
+    parser.add_argument("--repeat", type=int, default=20, help="Số lần lặp mỗi đường")
+    args = parser.parse_args()
+
+    data = _make_data(args.contracts, args.rows)
+    total_rows = args.contracts * args.rows
+
+    # Hai đường phải cho cùng nội dung JSON
+    assert json.loads(_pydantic_path(data)) == json.loads(_fast_path(data)), "Kết quả hai đường khác nhau"
+
+    print(f"{args.contracts} hợp đồng x {args.rows} dòng lịch sử = {total_rows} dòng "
+          f"(encoder: {'orjson' if orjson is not None else 'json'})")
+    timings = {}
+    for name, fn in (("pydantic", _pydantic_path), ("fast", _fast_path)):
+        seconds = _measure(fn, data, args.repeat)
+        timings[name] = seconds
+        print(f"  {name:<9} {seconds * 1000:8.2f} ms/response  "
+              f"{seconds * 1000 * 1000 / total_rows:8.2f} ms / 1.000 dòng")
+    print(f"  speedup   {timings['pydantic'] / timings['fast']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
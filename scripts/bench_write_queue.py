@@ -0,0 +1,158 @@
+"""
+Benchmark: payments/sec với commit riêng lẻ và với single-writer queue (group commit)
+
+- Baseline: engine như trước khi có writer (journal mặc định, pysqlite tự
+  quản transaction, busy timeout mặc định 5s), mỗi thanh toán một commit
+- Commit từng thanh toán trên engine hiện tại (WAL, BEGIN IMMEDIATE khi ghi)
+- Single-writer queue (group commit)
+
+Chạy trên một database SQLite tạm (không đụng credit_app.sqlite3):
+
+    python scripts/bench_write_queue.py --payments 2000 --clients 16
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core import config
+from app.core.database import Base, configure_sqlite_engine
+from app.core.enums import TrangThaiThanhToan, TrangThaiNgayThanhToan
+from app.core.writer import create_write_queue
+from app.crud import lich_su_tra_lai as crud_lich_su
+from app.models import TinChap, LichSuTraLai
+
+
+def _make_baseline_engine(path: str):
+    """Engine như trước khi có writer"""
+    return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+
+def _make_engine(path: str):
+    return configure_sqlite_engine(create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False, "timeout": config.SQLITE_BUSY_TIMEOUT},
+    ))
+
+
+def _seed(engine, contracts: int) -> list:
+    """Tạo hợp đồng, mỗi hợp đồng một kỳ đến hạn với số tiền lớn"""
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    for i in range(1, contracts + 1):
+        ma_hd = f"TC{i:03d}"
+        session.add(TinChap(
+            MaHD=ma_hd, HoTen=f"Khach hang {i}", NgayVay=date(2025, 1, 1),
+            SoTienVay=10_000_000, KyDong=30, LaiSuat=100_000,
+            TrangThai=TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+        ))
+        session.add(LichSuTraLai(
+            MaHD=ma_hd, Ngay=date(2025, 1, 31), SoTien=10_000_000, NoiDung="Trả lãi kỳ 1",
+            TrangThaiThanhToan=TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+            TrangThaiNgayThanhToan=TrangThaiNgayThanhToan.DEN_HAN.value, TienDaTra=0,
+        ))
+    session.commit()
+    stts = [row[0] for row in session.query(LichSuTraLai.Stt).all()]
+    session.close()
+    return stts
+
+
+def _run_clients(clients: int, payments: int, pay_one) -> float:
+    """Chạy `payments` lần pay_one(stt) trên `clients` thread, trả về payments/sec"""
+    per_client = payments // clients
+    errors = []
+
+    def worker(seed: int):
+        rnd = random.Random(seed)
+        for _ in range(per_client):
+            try:
+                pay_one(rnd)
+            except Exception as exc:  # pragma: no cover - chỉ để báo cáo
+                errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        print(f"   ⚠️  {len(errors)} lỗi, ví dụ: {errors[0]!r}")
+    return (per_client * clients - len(errors)) / elapsed
+
+
+def bench_direct(engine, stts: list, clients: int, payments: int) -> float:
+    """Mỗi thanh toán một session + một commit (WRITE_QUEUE_ENABLED=0)"""
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+
+    def pay_one(rnd):
+        session = SessionLocal()
+        try:
+            crud_lich_su.pay_lich_su(session, rnd.choice(stts), 1)
+        finally:
+            session.close()
+
+    try:
+        return _run_clients(clients, payments, pay_one)
+    finally:
+        engine.dispose()
+
+
+def bench_queue(path: str, stts: list, clients: int, payments: int) -> tuple:
+    """Thanh toán qua single-writer queue (group commit), trả về (payments/sec, writer.stats)"""
+    engine = _make_engine(path)
+    writer = create_write_queue(engine)
+    writer.start()
+
+    def pay_one(rnd):
+        writer.submit(crud_lich_su.pay_lich_su, rnd.choice(stts), 1).result()
+
+    try:
+        return _run_clients(clients, payments, pay_one), writer.stats
+    finally:
+        writer.stop()
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--payments", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--contracts", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        # Seed trên engine baseline: file còn ở journal mặc định cho lần đo đầu
+        stts = _seed(_make_baseline_engine(path), args.contracts)
+
+        print(f"journal_mode={config.SQLITE_JOURNAL_MODE}, clients={args.clients}, payments={args.payments}")
+        baseline = bench_direct(_make_baseline_engine(path), stts, args.clients, args.payments)
+        print(f"   Baseline (trước writer): {baseline:10.1f} payments/sec")
+        direct = bench_direct(_make_engine(path), stts, args.clients, args.payments)
+        print(f"   Commit từng thanh toán : {direct:10.1f} payments/sec  (x{direct / baseline:.1f})")
+        grouped, stats = bench_queue(path, stts, args.clients, args.payments)
+        print(f"   Single-writer queue    : {grouped:10.1f} payments/sec  (x{grouped / baseline:.1f})")
+        print(
+            f"      {stats['batches']} transaction cho {stats['intents']} thanh toán: "
+            f"trung bình {stats['avg_batch']:.1f}, lớn nhất {stats['max_batch']} thanh toán/commit"
+        )
+        busy = stats["busy_seconds"] or 1.0
+        print(
+            f"      thread ghi: {1000 * busy / stats['intents']:.2f} ms/thanh toán, "
+            f"COMMIT chiếm {100 * stats['commit_seconds'] / busy:.0f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Load test: phát lại một tập request (ghi sẵn hoặc tổng hợp) vào API và báo
+cáo throughput, độ trễ (p50/p90/p99/max) và tỉ lệ lỗi theo từng endpoint.
+
+Hai chế độ:
+- Trong process (mặc định): chạy app qua ASGI (httpx.ASGITransport) trên một
+  database SQLite tạm, được tạo sẵn --seed hợp đồng.
+- --base-url http://127.0.0.1:8000: gửi tới một server đang chạy (uvicorn,
+  gunicorn nhiều worker...). Dữ liệu có sẵn trên server được dùng lại.
+
+Tải:
+- --concurrency: số request đồng thời tối đa.
+- --rate: số request đến mỗi giây (phân phối Poisson, open-loop). Độ trễ được
+  tính từ thời điểm request lẽ ra được gửi, nên thời gian chờ do server quá
+  tải cũng được tính. --rate 0 (mặc định): closed-loop, gửi nhanh nhất có thể.
+
+Traffic:
+- Mặc định: hỗn hợp tổng hợp theo --mix (list, detail, pay, dashboard,
+  no-phai-thu).
+- --traffic FILE: file JSONL, mỗi dòng một request:
+      {"name": "detail", "method": "GET", "path": "/tin-chap/{tc}"}
+      {"name": "pay", "method": "POST", "path": "/lich-su-tra-lai/pay/{stt}", "params": {"so_tien": 1000}}
+  `path`, `params` và `json` có thể chứa {tc}, {tg}, {ma_hd}, {stt}: được
+  thay bằng một hợp đồng / kỳ đến hạn ngẫu nhiên lúc gửi.
+  --dump-traffic FILE ghi traffic tổng hợp ra file để sửa lại và phát lại.
+  (requests.jsonl ở thư mục gốc là danh sách yêu cầu công việc, không phải
+  traffic.)
+
+    python scripts/load_test.py --requests 2000 --concurrency 32
+    python scripts/load_test.py --rate 200 --requests 5000 --mix list=50,pay=30,dashboard=20
+    python scripts/load_test.py --base-url http://127.0.0.1:8000 --traffic traffic.jsonl --json report.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+
+# Request tổng hợp theo tên endpoint
+SYNTHETIC_REQUESTS = {
+    "list": {"method": "GET", "path": "/tin-chap", "params": {"page_size": 20}},
+    "list-tra-gop": {"method": "GET", "path": "/tra-gop", "params": {"page_size": 20}},
+    "search": {"method": "GET", "path": "/tin-chap", "params": {"search": "nguyen"}},
+    "detail": {"method": "GET", "path": "/tin-chap/{tc}"},
+    "detail-tra-gop": {"method": "GET", "path": "/tra-gop/{tg}"},
+    "history": {"method": "GET", "path": "/lich-su-tra-lai/contract/{ma_hd}"},
+    "pay": {"method": "POST", "path": "/lich-su-tra-lai/pay/{stt}", "params": {"so_tien": 1000}},
+    "dashboard": {"method": "GET", "path": "/dashboard"},
+    "no-phai-thu": {"method": "GET", "path": "/no-phai-thu"},
+}
+
+DEFAULT_MIX = "list=30,detail=25,pay=15,dashboard=10,no-phai-thu=10,history=10"
+
+HO = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Võ", "Đặng", "Bùi"]
+TEN = ["Văn An", "Thị Bình", "Văn Cường", "Thị Dung", "Văn Đức", "Thị Hoa", "Minh Khoa", "Thu Lan"]
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """"list=30,pay=15" -> {"list": 30.0, "pay": 15.0}"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in SYNTHETIC_REQUESTS:
+            raise SystemExit(f"Endpoint không hợp lệ trong --mix: {name} (có: {', '.join(SYNTHETIC_REQUESTS)})")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def synthetic_traffic(mix: Dict[str, float], count: int, rng: random.Random) -> List[dict]:
+    """Sinh `count` request theo tỉ lệ của mix"""
+    names = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    return [dict(SYNTHETIC_REQUESTS[name], name=name) for name in names]
+
+
+def load_traffic(path: str) -> List[dict]:
+    """Đọc file traffic JSONL"""
+    traffic = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if "path" not in item:
+                raise SystemExit(f"{path}:{line_no}: thiếu 'path' (file traffic, không phải requests.jsonl?)")
+            item.setdefault("method", "GET")
+            item.setdefault("name", f"{item['method']} {item['path']}")
+            traffic.append(item)
+    return traffic
+
+
+class TargetPool:
+    """Hợp đồng và kỳ đến hạn dùng để điền {tc}, {tg}, {ma_hd}, {stt}"""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.values: Dict[str, List] = {"tc": [], "tg": [], "stt": []}
+
+    async def discover(self, client: httpx.AsyncClient) -> None:
+        """Đọc danh sách hợp đồng (kèm lịch sử) từ API"""
+        for key, path in (("tc", "/tin-chap"), ("tg", "/tra-gop")):
+            response = await client.get(path, params={"page_size": 1000})
+            response.raise_for_status()
+            for contract in response.json()["data"]:
+                self.values[key].append(contract["MaHD"])
+                for ky in contract.get("LichSuTraLai") or []:
+                    if ky["TrangThaiNgayThanhToan"] == "Đến hạn" and ky["SoTien"] > ky["TienDaTra"]:
+                        self.values["stt"].append(ky["Stt"])
+
+    def missing(self, traffic: List[dict]) -> List[str]:
+        """Các placeholder được dùng trong traffic nhưng không có giá trị nào"""
+        text = json.dumps(traffic)
+        names = {"tc": "tín chấp", "tg": "trả góp", "stt": "kỳ đến hạn"}
+        return [names[key] for key in names if "{" + key + "}" in text and not self.values[key]]
+
+    def fill(self, value):
+        """Thay placeholder trong path/params/json"""
+        if isinstance(value, str) and "{" in value:
+            fields = {}
+            for key in ("tc", "tg", "stt"):
+                if "{" + key + "}" in value:
+                    fields[key] = self._pick(key)
+            if "{ma_hd}" in value:
+                fields["ma_hd"] = self.rng.choice(self.values["tc"] + self.values["tg"] or [""])
+            return value.format(**fields)
+        if isinstance(value, dict):
+            return {k: self.fill(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.fill(v) for v in value]
+        return value
+
+    def _pick(self, key: str):
+        return self.rng.choice(self.values[key]) if self.values[key] else 0
+
+
+async def seed(client: httpx.AsyncClient, contracts: int, rng: random.Random) -> None:
+    """Tạo hợp đồng + lịch sử trả lãi cho database tạm"""
+    today = date.today()
+    for i in range(contracts):
+        ky_dong = rng.choice([7, 10, 15, 30])
+        body = {
+            "HoTen": f"{rng.choice(HO)} {rng.choice(TEN)}",
+            # Ngày vay cách hôm nay đúng một số kỳ: có một kỳ đến hạn hôm nay để trả
+            "NgayVay": (today - timedelta(days=ky_dong * rng.randint(1, 6))).isoformat(),
+            "SoTienVay": rng.choice([5, 10, 20, 50]) * 1_000_000,
+            "KyDong": ky_dong,
+            "LaiSuat": rng.choice([50, 100, 200]) * 1_000,
+        }
+        path = "/tin-chap" if i % 2 == 0 else "/tra-gop"
+        if path == "/tra-gop":
+            body["SoLanTra"] = rng.randint(3, 12)
+        response = await client.post(path, json=body)
+        response.raise_for_status()
+        ma_hd = response.json()["data"]["MaHD"]
+        (await client.post("/lich-su-tra-lai", params={"ma_hd": ma_hd})).raise_for_status()
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    traffic: List[dict],
+    pool: TargetPool,
+    concurrency: int,
+    rate: float,
+    rng: random.Random,
+) -> dict:
+    """
+    Gửi traffic và thu thập độ trễ
+
+    Returns:
+        dict báo cáo (tổng và theo endpoint)
+    """
+    samples = defaultdict(list)  # name -> [(latency_s, ok)]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    started = time.perf_counter()
+
+    async def send(item: dict, scheduled: float) -> None:
+        async with semaphore:
+            request = {
+                "method": item.get("method", "GET"),
+                "url": pool.fill(item["path"]),
+                "params": pool.fill(item.get("params")),
+                "json": pool.fill(item.get("json")),
+                "headers": item.get("headers"),
+            }
+            try:
+                response = await client.request(**request)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            samples[item["name"]].append((time.perf_counter() - scheduled, ok))
+
+    tasks = []
+    if rate > 0:
+        # Open-loop: thời điểm đến theo phân phối Poisson, không chờ response
+        next_at = started
+        for item in traffic:
+            next_at += rng.expovariate(rate)
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(item, next_at)))
+        await asyncio.gather(*tasks)
+    else:
+        # Closed-loop: `concurrency` client gửi liên tục
+        queue = list(reversed(traffic))
+
+        async def client_loop():
+            while queue:
+                item = queue.pop()
+                await send(item, time.perf_counter())
+
+        await asyncio.gather(*(client_loop() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for name, rows in sorted(samples.items()):
+        latencies = sorted(latency for latency, _ in rows)
+        errors = sum(1 for _, ok in rows if not ok)
+        endpoints[name] = {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows),
+            "throughput_rps": len(rows) / elapsed,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p90_ms": percentile(latencies, 90) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000,
+        }
+    all_latencies = sorted(latency for rows in samples.values() for latency, _ in rows)
+    total_errors = sum(e["errors"] for e in endpoints.values())
+    return {
+        "elapsed_s": elapsed,
+        "concurrency": concurrency,
+        "rate": rate,
+        "total": {
+            "requests": len(all_latencies),
+            "errors": total_errors,
+            "error_rate": total_errors / len(all_latencies) if all_latencies else 0.0,
+            "throughput_rps": len(all_latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(all_latencies, 50) * 1000,
+            "p90_ms": percentile(all_latencies, 90) * 1000,
+            "p99_ms": percentile(all_latencies, 99) * 1000,
+            "max_ms": (all_latencies[-1] * 1000) if all_latencies else 0.0,
+        },
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: dict) -> None:
+    header = f"{'endpoint':<18}{'req':>7}{'err%':>7}{'req/s':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+    for name, row in rows:
+        print(
+            f"{name:<18}{row['requests']:>7}{row['error_rate'] * 100:>6.1f}%{row['throughput_rps']:>9.1f}"
+            f"{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}"
+        )
+    mode = f"open-loop {report['rate']:.0f} req/s" if report["rate"] > 0 else "closed-loop"
+    print(f"\n{mode}, concurrency {report['concurrency']}, {report['elapsed_s']:.2f}s (độ trễ tính bằng ms)")
+
+
+class AsgiLifespan:
+    """Chạy startup/shutdown của app ASGI (write queue, snapshotter...)"""
+
+    def __init__(self, app):
+        self._app = app
+
+    async def __aenter__(self):
+        self._receive: asyncio.Queue = asyncio.Queue()
+        self._send: asyncio.Queue = asyncio.Queue()
+        scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+        self._task = asyncio.create_task(self._app(scope, self._receive.get, self._send.put))
+        await self._receive.put({"type": "lifespan.startup"})
+        message = await self._send.get()
+        if message["type"] != "lifespan.startup.complete":
+            raise RuntimeError(f"App startup failed: {message}")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._receive.put({"type": "lifespan.shutdown"})
+        await self._send.get()
+        await self._task
+
+
+def _warn_missing(pool: TargetPool, traffic: List[dict]) -> None:
+    for name in pool.missing(traffic):
+        print(f"⚠️  Không có {name} nào: các request dùng placeholder này sẽ lỗi")
+
+
+async def main_async(args) -> dict:
+    rng = random.Random(args.random_seed)
+    if args.traffic:
+        traffic = load_traffic(args.traffic)
+        if args.requests:
+            traffic = [traffic[i % len(traffic)] for i in range(args.requests)]
+    else:
+        traffic = synthetic_traffic(parse_mix(args.mix), args.requests or 1000, rng)
+    if args.dump_traffic:
+        with open(args.dump_traffic, "w", encoding="utf-8") as f:
+            for item in traffic:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        print(f"Đã ghi {len(traffic)} request vào {args.dump_traffic}")
+
+    pool = TargetPool(rng)
+    limits = httpx.Limits(max_connections=max(1, args.concurrency))
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+            await pool.discover(client)
+            _warn_missing(pool, traffic)
+            return await run_load(client, traffic, pool, args.concurrency, args.rate, rng)
+
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with AsgiLifespan(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout) as client:
+            if args.seed:
+                await seed(client, args.seed, rng)
+            await pool.discover(client)
+            print(f"{len(pool.values['tc'])} tín chấp, {len(pool.values['tg'])} trả góp, "
+                  f"{len(pool.values['stt'])} kỳ đến hạn")
+            _warn_missing(pool, traffic)
+            return await run_load(client, traffic, pool, args.concurrency, args.rate, rng)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=None, help="Server đang chạy (mặc định: app trong process)")
+    parser.add_argument("--traffic", default=None, help="File traffic JSONL (mặc định: traffic tổng hợp)")
+    parser.add_argument("--dump-traffic", default=None, help="Ghi traffic sẽ gửi ra file JSONL")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Tỉ lệ traffic tổng hợp (mặc định {DEFAULT_MIX})")
+    parser.add_argument("--requests", type=int, default=None, help="Số request (mặc định 1000 / cả file traffic)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Số request đồng thời tối đa")
+    parser.add_argument("--rate", type=float, default=0.0, help="Request/giây (0: closed-loop)")
+    parser.add_argument("--seed", type=int, default=200, help="Trong process: số hợp đồng tạo trước")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout mỗi request (giây)")
+    parser.add_argument("--json", default=None, help="Ghi báo cáo ra file JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.base_url:
+            # Database tạm: DATABASE_URL phải có trước khi import app
+            os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'load_test.sqlite3')}"
+        report = asyncio.run(main_async(args))
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
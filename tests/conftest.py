@@ -0,0 +1,108 @@
+"""
+Fixture dùng chung cho bộ test
+
+DATABASE_URL được đặt sang một file SQLite tạm trước khi import app (engine
+được tạo lúc import), nên bộ test không đụng credit_app.sqlite3. Mỗi test
+cần dữ liệu riêng dùng fixture `db_engine`: các bảng được xóa và tạo lại.
+
+    uv run pytest
+"""
+import os
+import shutil
+import tempfile
+from datetime import date
+from typing import Callable, Dict
+
+import pytest
+from sqlalchemy.engine import Engine
+
+_TMP_DIR = tempfile.mkdtemp(prefix="api_app_credit_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.sqlite3')}"
+
+import app.models  # noqa: E402,F401 - đăng ký model với Base
+from app.core.database import Base, DATABASE_PATH, SessionLocal, engine  # noqa: E402
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Đóng kết nối và xóa database tạm"""
+    engine.dispose()
+    shutil.rmtree(_TMP_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def database_path() -> str:
+    """File SQLite tạm của bộ test (app.core.database.DATABASE_PATH)"""
+    return DATABASE_PATH
+
+
+@pytest.fixture(scope="session")
+def reset_database() -> Callable[[], Engine]:
+    """
+    Hàm xóa và tạo lại toàn bộ bảng, trả về engine của app
+
+    Dùng trong fixture scope="module" tạo dữ liệu một lần cho cả module. Các
+    kết nối trong pool được đóng sau đó: câu lệnh pysqlite đã chuẩn bị trên
+    bảng cũ có thể lỗi "no such table" với bảng vừa tạo lại.
+    """
+    def reset() -> Engine:
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        engine.dispose()
+        return engine
+
+    return reset
+
+
+@pytest.fixture
+def db_engine(reset_database) -> Engine:
+    """Engine của app trên database trống"""
+    return reset_database()
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    """SessionLocal của app, trên database trống"""
+    return SessionLocal
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient của app (startup/shutdown chạy một lần cho cả bộ test)"""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def seed_due_contracts(session_factory) -> Callable[..., Dict[str, int]]:
+    """
+    Hàm tạo hợp đồng Tín chấp TC001.., mỗi hợp đồng một kỳ đến hạn đủ lớn để
+    trả nhiều lần; trả về {MaHD: Stt}
+    """
+    from app.core.enums import TrangThaiThanhToan, TrangThaiNgayThanhToan
+    from app.models import TinChap, LichSuTraLai
+
+    def seed(contracts: int = 1, so_tien: int = 10_000_000) -> Dict[str, int]:
+        session = session_factory()
+        try:
+            for i in range(1, contracts + 1):
+                ma_hd = f"TC{i:03d}"
+                session.add(TinChap(
+                    MaHD=ma_hd, HoTen=f"Khach hang {i}", NgayVay=date(2025, 1, 1),
+                    SoTienVay=10_000_000, KyDong=30, LaiSuat=100_000,
+                    TrangThai=TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+                ))
+                session.add(LichSuTraLai(
+                    MaHD=ma_hd, Ngay=date(2025, 1, 31), SoTien=so_tien, NoiDung="Trả lãi kỳ 1",
+                    TrangThaiThanhToan=TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+                    TrangThaiNgayThanhToan=TrangThaiNgayThanhToan.DEN_HAN.value, TienDaTra=0,
+                ))
+            session.commit()
+            return {ma_hd: stt for stt, ma_hd in session.query(LichSuTraLai.Stt, LichSuTraLai.MaHD)}
+        finally:
+            session.close()
+
+    return seed
@@ -0,0 +1,127 @@
+"""
+Lưu trữ hợp đồng đã tất toán chạy được nhiều lô nối tiếp
+
+Sau khi một lô được lưu trữ, lịch sử trả lãi của hợp đồng mới không được
+nhận lại Stt đã chuyển sang bảng lưu trữ (lich_su_tra_lai dùng AUTOINCREMENT).
+Mỗi kịch bản: lưu trữ TC001, tạo TC002, lưu trữ TC002.
+
+- Database mới
+- Database tạo trước khi có AUTOINCREMENT và đã lưu trữ TC001: khi khởi
+  động, bảng được tạo lại (giữ dữ liệu, chỉ mục, trigger) và bộ đếm được
+  nâng lên trên Stt lớn nhất đã lưu trữ
+
+Mỗi kịch bản dùng một file SQLite riêng (không phải database của bộ test).
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import MetaData, func, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base, create_app_engine
+from app.core.enums import TrangThaiThanhToan, TrangThaiNgayThanhToan
+from app.models import TinChap, LichSuTraLai, LichSuTraLaiArchive
+from app.services.archive import archive_settled_contracts
+
+PERIODS = 5
+
+
+def _seed_settled(session, ma_hd: str) -> list:
+    """Hợp đồng đã tất toán từ lâu với PERIODS kỳ đã trả đủ, trả về các Stt"""
+    ngay_vay = date.today() - timedelta(days=400)
+    session.add(TinChap(
+        MaHD=ma_hd, HoTen=f"Khach hang {ma_hd}", NgayVay=ngay_vay,
+        SoTienVay=10_000_000, KyDong=30, LaiSuat=100_000,
+        TrangThai=TrangThaiThanhToan.DA_TAT_TOAN.value,
+    ))
+    for ky in range(1, PERIODS + 1):
+        session.add(LichSuTraLai(
+            MaHD=ma_hd, Ngay=ngay_vay + timedelta(days=30 * ky), SoTien=100_000, NoiDung=f"Trả lãi kỳ {ky}",
+            TrangThaiThanhToan=TrangThaiThanhToan.DONG_DU.value,
+            TrangThaiNgayThanhToan=TrangThaiNgayThanhToan.QUA_HAN.value, TienDaTra=100_000,
+        ))
+    session.commit()
+    return list(session.execute(select(LichSuTraLai.Stt).where(LichSuTraLai.MaHD == ma_hd)).scalars())
+
+
+def _archive(session) -> dict:
+    result = archive_settled_contracts(session, older_than_days=0)
+    assert result["contracts"] == 1 and result["histories"] == PERIODS, result
+    return result
+
+
+def _archived_stts(session) -> list:
+    return list(session.execute(select(LichSuTraLaiArchive.Stt).order_by(LichSuTraLaiArchive.Stt)).scalars())
+
+
+def test_archive_twice_on_fresh_database(tmp_path):
+    """Database mới: hai lần lưu trữ nối tiếp"""
+    engine = create_app_engine(f"sqlite:///{tmp_path / 'archive.sqlite3'}")
+    try:
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            first = _seed_settled(session, "TC001")
+            _archive(session)
+            second = _seed_settled(session, "TC002")
+            assert not set(first) & set(second), f"Stt bị cấp lại: {sorted(set(first) & set(second))}"
+            _archive(session)
+            assert len(set(_archived_stts(session))) == 2 * PERIODS
+        finally:
+            session.close()
+    finally:
+        engine.dispose()
+
+
+def test_archive_after_autoincrement_upgrade(tmp_path):
+    """Database cũ (không AUTOINCREMENT) đã lưu trữ TC001 rồi mới nâng cấp"""
+    engine = create_app_engine(f"sqlite:///{tmp_path / 'archive.sqlite3'}")
+    try:
+        # Lược đồ cũ: cùng các bảng, lich_su_tra_lai không có AUTOINCREMENT, chưa có trigger
+        old_metadata = MetaData()
+        for table in Base.metadata.sorted_tables:
+            table.to_metadata(old_metadata)
+        old_metadata.tables[LichSuTraLai.__tablename__].dialect_options["sqlite"]["autoincrement"] = False
+        old_metadata.create_all(bind=engine)
+
+        session = sessionmaker(bind=engine)()
+        try:
+            first = _seed_settled(session, "TC001")
+            _archive(session)
+        finally:
+            session.close()
+
+        with engine.connect() as connection:
+            indexes_before = set(connection.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'lich_su_tra_lai' "
+                "AND name NOT LIKE 'sqlite_%'"
+            )).scalars())
+
+        # Khởi động bản mới: tạo lại bảng, nâng bộ đếm, cài trigger
+        Base.metadata.create_all(bind=engine)
+
+        with engine.connect() as connection:
+            create_sql = connection.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'lich_su_tra_lai'"
+            )).scalar()
+            assert "AUTOINCREMENT" in create_sql.upper(), create_sql
+            indexes_after = set(connection.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'lich_su_tra_lai' "
+                "AND name NOT LIKE 'sqlite_%'"
+            )).scalars())
+            assert indexes_before <= indexes_after, f"mất chỉ mục: {indexes_before - indexes_after}"
+            triggers = connection.execute(text(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'lich_su_tra_lai'"
+            )).scalar()
+            assert triggers > 0, "không có trigger trên lich_su_tra_lai"
+
+        session = sessionmaker(bind=engine)()
+        try:
+            second = _seed_settled(session, "TC002")
+            assert min(second) > max(first), f"Stt bị cấp lại: {second} (đã lưu trữ {first})"
+            _archive(session)
+            assert len(set(_archived_stts(session))) == 2 * PERIODS
+            assert session.execute(select(func.count()).select_from(LichSuTraLai)).scalar() == 0
+        finally:
+            session.close()
+    finally:
+        engine.dispose()
@@ -0,0 +1,132 @@
+"""
+Result cache nhiều process và ETag của danh sách hợp đồng
+
+- Mỗi worker giữ ResultCache riêng, một process khác ghi vào database; sau
+  mỗi lần ghi, mọi worker phải thấy dữ liệu mới (không đọc kết quả cũ từ
+  cache), và giữa hai lần ghi phải đọc từ cache.
+- If-None-Match khớp trả 304 mà không dựng danh sách, kể cả khi cache không
+  có kết quả (sau khi ghi, hoặc cache tắt).
+"""
+import multiprocessing
+import os
+from datetime import date
+from unittest import mock
+
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from app.core import config
+from app.core.cache import DataVersionWatcher, ResultCache, result_cache
+from app.core.database import configure_sqlite_engine
+from app.crud import lich_su_tra_lai as crud_lich_su
+from app.crud import tin_chap as crud_tin_chap
+from app.crud import tra_gop as crud_tra_gop
+from app.models import LichSuTraLai
+
+PAYMENT = 1_000
+WORKERS = 4
+ROUNDS = 20
+
+
+def _make_engine(path: str):
+    return configure_sqlite_engine(create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False, "timeout": config.SQLITE_BUSY_TIMEOUT},
+    ))
+
+
+def _worker(path: str, requests, results) -> None:
+    """Đọc tổng tiền đã trả qua ResultCache mỗi khi nhận được một vòng"""
+    engine = _make_engine(path)
+    Session = sessionmaker(bind=engine)
+    cache = ResultCache(DataVersionWatcher(path))
+
+    def _total_paid():
+        session = Session()
+        try:
+            return session.query(func.sum(LichSuTraLai.TienDaTra)).scalar() or 0
+        finally:
+            session.close()
+
+    while True:
+        round_no = requests.get()
+        if round_no is None:
+            break
+        # Đọc hai lần: lần thứ hai phải lấy từ cache
+        first = cache.get_or_set("total_paid", _total_paid)
+        second = cache.get_or_set("total_paid", _total_paid)
+        results.put((os.getpid(), round_no, first, second, cache.hits, cache.misses))
+    engine.dispose()
+
+
+def test_workers_see_every_write(database_path, session_factory, seed_due_contracts):
+    stt = seed_due_contracts()["TC001"]
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    queues = [ctx.Queue() for _ in range(WORKERS)]
+    workers = [ctx.Process(target=_worker, args=(database_path, queue, results)) for queue in queues]
+    for worker in workers:
+        worker.start()
+
+    stale = []
+    try:
+        for round_no in range(ROUNDS):
+            # Vòng chẵn: ghi trước khi đọc; vòng lẻ: không ghi (phải đọc từ cache)
+            if round_no % 2 == 0:
+                session = session_factory()
+                try:
+                    crud_lich_su.pay_lich_su(session, stt, PAYMENT)
+                finally:
+                    session.close()
+            expected = PAYMENT * (round_no // 2 + 1)
+
+            for queue in queues:
+                queue.put(round_no)
+            for _ in workers:
+                pid, got_round, first, second, hits, misses = results.get(timeout=30)
+                if first != expected or second != expected:
+                    stale.append(f"worker {pid} vòng {got_round}: đọc {first}/{second}, mong đợi {expected}")
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for worker in workers:
+            worker.join(timeout=30)
+
+    assert not stale
+    writes = (ROUNDS + 1) // 2
+    assert (hits, misses) == (2 * ROUNDS - writes, writes)
+
+
+def _contract(ho_ten: str, **extra) -> dict:
+    body = {"HoTen": ho_ten, "NgayVay": date.today().isoformat(), "SoTienVay": 1_000_000, "KyDong": 30, "LaiSuat": 10_000}
+    body.update(extra)
+    return body
+
+
+@pytest.mark.parametrize("cache_enabled", [True, False], ids=["cache", "no-cache"])
+@pytest.mark.parametrize("path, crud, load, extra, other_path, other_extra", [
+    ("/tin-chap", crud_tin_chap, "get_tin_chaps", {}, "/tra-gop", {"SoLanTra": 3}),
+    ("/tra-gop", crud_tra_gop, "get_tra_gops", {"SoLanTra": 3}, "/tin-chap", {}),
+], ids=["tin-chap", "tra-gop"])
+def test_list_304_skips_list_load(
+    client, db_engine, monkeypatch, cache_enabled, path, crud, load, extra, other_path, other_extra
+):
+    if not cache_enabled:
+        monkeypatch.setattr(result_cache, "_watcher", None)
+    for i in range(3):
+        assert client.post(path, json=_contract(f"Khach hang {i}", **extra)).status_code == 201
+    etag = client.get(path).headers["ETag"]
+
+    # Ghi vào hợp đồng loại khác: trang không đổi nhưng cache bị xóa
+    assert client.post(other_path, json=_contract("Khach hang khac", **other_extra)).status_code == 201
+    with mock.patch.object(crud, load, side_effect=AssertionError("304 không được dựng danh sách")):
+        response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    # Trang đổi: ETag mới, trả dữ liệu
+    assert client.post(path, json=_contract("Khach hang moi", **extra)).status_code == 201
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
@@ -0,0 +1,167 @@
+"""
+Idempotency-Key cho thanh toán / tất toán khi client gửi lại đồng thời
+
+- Qua API (writer đang chạy): nhiều request song song cùng Idempotency-Key
+  cho POST /lich-su-tra-lai/pay/{stt} chỉ trả tiền một lần, mọi response có
+  cùng dữ liệu; cùng khóa nhưng số tiền khác bị từ chối (422); pay-full gửi
+  lại không ghi thêm vào sổ thu tiền.
+- Không qua writer (mỗi thread một kết nối): cùng một khóa chỉ một lần thanh
+  toán được áp dụng.
+- Khóa hết hạn được xóa và dùng lại được.
+"""
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from app.core.database import engine
+from app.core.writer import create_write_queue
+from app.crud import idempotency as crud_idempotency
+from app.crud import lich_su_tra_lai as crud_lich_su
+from app.models import IdempotencyKey, LichSuTraLai, PaymentLedger
+
+PAYMENT = 1_000
+CLIENTS = 16
+
+
+def _concurrently(clients: int, fn) -> list:
+    """Chạy fn(i) trên `clients` thread cùng lúc, trả về kết quả theo thứ tự"""
+    barrier = threading.Barrier(clients)
+    results = [None] * clients
+
+    def worker(i):
+        barrier.wait()
+        try:
+            results[i] = fn(i)
+        except Exception as exc:  # noqa: BLE001 - so sánh cả lỗi
+            results[i] = exc
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _paid(session_factory, stt: int) -> tuple:
+    """(TienDaTra, số dòng trong sổ thu tiền) của một kỳ"""
+    session = session_factory()
+    try:
+        tien_da_tra = session.execute(select(LichSuTraLai.TienDaTra).where(LichSuTraLai.Stt == stt)).scalar()
+        so_dong = session.execute(
+            select(func.count()).select_from(PaymentLedger).where(PaymentLedger.Stt == stt)
+        ).scalar()
+        return tien_da_tra, so_dong
+    finally:
+        session.close()
+
+
+def _pay(client, stt: int, key: str, so_tien: int = PAYMENT):
+    return client.post(f"/lich-su-tra-lai/pay/{stt}?so_tien={so_tien}", headers={"Idempotency-Key": key})
+
+
+def test_concurrent_retries_pay_once(client, session_factory, seed_due_contracts):
+    stt = seed_due_contracts()["TC001"]
+    responses = _concurrently(CLIENTS, lambda i: _pay(client, stt, "retry-TC001"))
+
+    errors = [r for r in responses if isinstance(r, Exception) or r.status_code != 200]
+    assert not errors, f"request lỗi: {errors[:3]}"
+    assert len({r.text for r in responses}) == 1, "response khác nhau"
+    replayed = sum(r.headers.get("Idempotent-Replayed") == "true" for r in responses)
+    assert replayed == CLIENTS - 1
+    assert _paid(session_factory, stt) == (PAYMENT, 1)
+
+
+def test_retry_after_completion_replays(client, session_factory, seed_due_contracts):
+    stt = seed_due_contracts()["TC001"]
+    first = _pay(client, stt, "retry-TC001")
+    assert first.status_code == 200 and "Idempotent-Replayed" not in first.headers, first.text[:200]
+
+    again = _pay(client, stt, "retry-TC001")
+    assert again.status_code == 200 and again.headers.get("Idempotent-Replayed") == "true", again.text[:200]
+    assert again.text == first.text
+    assert _paid(session_factory, stt) == (PAYMENT, 1)
+
+
+def test_same_key_different_request_rejected(client, session_factory, seed_due_contracts):
+    stt = seed_due_contracts()["TC001"]
+    assert _pay(client, stt, "retry-TC001").status_code == 200
+
+    response = _pay(client, stt, "retry-TC001", so_tien=2 * PAYMENT)
+    assert response.status_code == 422, f"{response.status_code} {response.text[:200]}"
+    assert _paid(session_factory, stt) == (PAYMENT, 1)
+
+
+def test_new_key_or_no_key_is_new_payment(client, session_factory, seed_due_contracts):
+    stt = seed_due_contracts()["TC001"]
+    assert _pay(client, stt, "retry-TC001").status_code == 200
+    assert _pay(client, stt, "retry-TC001-b").status_code == 200
+    assert client.post(f"/lich-su-tra-lai/pay/{stt}?so_tien={PAYMENT}").status_code == 200
+    assert _paid(session_factory, stt) == (3 * PAYMENT, 3)
+
+
+def test_failed_payment_not_stored(client, session_factory, seed_due_contracts):
+    stt = seed_due_contracts()["TC001"]
+    response = _pay(client, stt, "retry-TC001", so_tien=-1)
+    assert response.status_code == 400, f"{response.status_code} {response.text[:200]}"
+
+    session = session_factory()
+    try:
+        assert session.get(IdempotencyKey, "retry-TC001") is None, "kết quả lỗi đã bị lưu"
+    finally:
+        session.close()
+
+
+def test_concurrent_pay_full_retries(client, session_factory, seed_due_contracts):
+    stt = seed_due_contracts()["TC001"]
+    url = "/lich-su-tra-lai/pay-full/TC001"
+    responses = _concurrently(CLIENTS, lambda i: client.post(url, headers={"Idempotency-Key": "full-TC001"}))
+
+    errors = [r if isinstance(r, Exception) else r.text[:200] for r in responses if isinstance(r, Exception) or r.status_code != 200]
+    assert not errors, f"request lỗi: {errors[:3]}"
+    assert len({r.text for r in responses}) == 1, "response khác nhau"
+    assert _paid(session_factory, stt) == (10_000_000, 1)
+
+
+def test_separate_connections_apply_once(session_factory, seed_due_contracts):
+    stt = seed_due_contracts()["TC001"]
+    queues = [create_write_queue(engine) for _ in range(CLIENTS)]
+    dau_vet = crud_idempotency.request_fingerprint("pay", {"stt": stt, "so_tien": PAYMENT})
+    outcomes = _concurrently(CLIENTS, lambda i: queues[i].apply(
+        crud_idempotency.run_idempotent, khoa="direct-TC001", dau_vet=dau_vet,
+        action=crud_lich_su.pay_lich_su, params={"stt": stt, "so_tien": PAYMENT},
+    ))
+
+    errors = [o for o in outcomes if isinstance(o, Exception)]
+    assert not errors, f"lỗi: {errors[:3]}"
+    assert sum(not replayed for _, replayed in outcomes) == 1, "thanh toán được áp dụng nhiều lần"
+    assert len({str(result) for result, _ in outcomes}) == 1, "kết quả khác nhau"
+    assert _paid(session_factory, stt) == (PAYMENT, 1)
+
+
+def test_expired_key_purged_and_reusable(client, session_factory, seed_due_contracts):
+    stt = seed_due_contracts()["TC001"]
+    assert _pay(client, stt, "ttl-TC001").status_code == 200
+    session = session_factory()
+    try:
+        session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.Khoa == "ttl-TC001")
+            .values(HetHan=datetime.now() - timedelta(seconds=1))
+        )
+        session.commit()
+    finally:
+        session.close()
+
+    response = _pay(client, stt, "ttl-TC001")
+    assert response.status_code == 200 and "Idempotent-Replayed" not in response.headers, response.text[:200]
+    assert _paid(session_factory, stt) == (2 * PAYMENT, 2)
+    session = session_factory()
+    try:
+        expired = session.execute(
+            select(func.count()).select_from(IdempotencyKey).where(IdempotencyKey.HetHan <= datetime.now())
+        ).scalar()
+        assert expired == 0, f"còn {expired} khóa hết hạn"
+    finally:
+        session.close()
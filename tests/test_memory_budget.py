@@ -0,0 +1,152 @@
+"""
+Ngân sách bộ nhớ của các đường tổng hợp chỉ đọc (dashboard, thống kê, nợ
+phải thu, dự báo) trên database có bảng lịch sử lớn
+
+Mỗi hàm CRUD được gọi với một session mới; đỉnh bộ nhớ Python trong lúc chạy
+(tracemalloc) phải nằm dưới ngân sách của nó. Các đường này đọc tuple / kết
+quả GROUP BY theo lô, nên đỉnh bộ nhớ gần như không phụ thuộc số dòng lịch sử
+(trừ nợ phải thu: response chứa lịch sử các hợp đồng đến hạn).
+
+Mặc định tạo 200.000 dòng lịch sử; đặt MEMORY_BUDGET_ROWS=1000000 để đo ở
+đúng cỡ dữ liệu của ngân sách (chậm hơn nhiều):
+
+    MEMORY_BUDGET_ROWS=1000000 uv run pytest tests/test_memory_budget.py
+"""
+import gc
+import os
+import random
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import pytest
+
+from app.core.database import SessionLocal
+
+# Số dòng lịch sử tạo trước
+ROWS = int(os.getenv("MEMORY_BUDGET_ROWS", "200000"))
+
+# Số kỳ trung bình mỗi hợp đồng (số hợp đồng = số dòng / số kỳ)
+PERIODS_PER_CONTRACT = 40
+
+# Ngân sách đỉnh bộ nhớ (MB) cho 1.000.000 dòng lịch sử
+BUDGETS_MB = {
+    "dashboard": 4,
+    "dashboard(this_year)": 4,
+    "statistics(daily, 1 năm)": 8,
+    "statistics(monthly, toàn bộ)": 8,
+    "no-phai-thu(today)": 96,
+    "forecast(90 ngày)": 16,
+}
+
+
+def _seed(engine, rows: int, rng: random.Random) -> int:
+    """
+    Hợp đồng + lịch sử bằng Core insert (nhanh, không qua ORM)
+
+    Ngày vay được rải ngẫu nhiên nên chỉ một phần hợp đồng có kỳ đến hạn hôm
+    nay, giống dữ liệu thật.
+    """
+    from app.core.enums import TrangThaiThanhToan, TrangThaiNgayThanhToan
+    from app.models import TinChap, TraGop, LichSuTraLai
+
+    today = date.today()
+    contracts = max(1, rows // PERIODS_PER_CONTRACT)
+    tin_chaps, tra_gops, history = [], [], []
+    inserted = 0
+
+    def flush(connection):
+        if tin_chaps:
+            connection.execute(TinChap.__table__.insert(), tin_chaps)
+        if tra_gops:
+            connection.execute(TraGop.__table__.insert(), tra_gops)
+        if history:
+            connection.execute(LichSuTraLai.__table__.insert(), history)
+        tin_chaps.clear()
+        tra_gops.clear()
+        history.clear()
+
+    with engine.begin() as connection:
+        for i in range(1, contracts + 1):
+            is_tc = i % 2 == 1
+            ma_hd = f"{'TC' if is_tc else 'TG'}{i:07d}"
+            ky_dong = rng.choice([7, 10, 15, 30])
+            so_ky = PERIODS_PER_CONTRACT
+            ngay_vay = today - timedelta(days=rng.randint(0, ky_dong * so_ky))
+            common = dict(
+                MaHD=ma_hd, HoTen=f"Khach hang {i}", NgayVay=ngay_vay, SoTienVay=10_000_000,
+                KyDong=ky_dong, LaiSuat=100_000, TrangThai=TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+            )
+            if is_tc:
+                tin_chaps.append(dict(SoTienTraGoc=0, **common))
+            else:
+                tra_gops.append(dict(SoLanTra=so_ky, **common))
+            for ky in range(1, so_ky + 1):
+                ngay = ngay_vay + timedelta(days=ky_dong * ky)
+                paid = ngay < today and rng.random() < 0.8
+                history.append(dict(
+                    MaHD=ma_hd, Ngay=ngay, SoTien=100_000, NoiDung=f"Kỳ {ky}",
+                    TrangThaiThanhToan=(TrangThaiThanhToan.DONG_DU if paid else TrangThaiThanhToan.CHUA_THANH_TOAN).value,
+                    TrangThaiNgayThanhToan=(
+                        TrangThaiNgayThanhToan.DEN_HAN if ngay == today else
+                        TrangThaiNgayThanhToan.QUA_HAN if ngay < today else
+                        TrangThaiNgayThanhToan.CHUA_DEN_HAN
+                    ).value,
+                    TienDaTra=100_000 if paid else 0,
+                ))
+                inserted += 1
+            if len(history) >= 20_000:
+                flush(connection)
+        flush(connection)
+    return inserted
+
+
+def _scenarios():
+    """(nhãn, hàm nhận session) cho từng đường tổng hợp"""
+    from app.crud import dashboard as crud_dashboard
+    from app.crud import lich_su as crud_lich_su
+    from app.crud import no_phai_thu as crud_no_phai_thu
+
+    today = date.today()
+    return [
+        ("dashboard", lambda db: crud_dashboard.get_dashboard(db)),
+        ("dashboard(this_year)", lambda db: crud_dashboard.get_dashboard(db, time_period="this_year")),
+        ("statistics(daily, 1 năm)", lambda db: crud_lich_su.get_financial_statistics(
+            db, "daily", today - timedelta(days=365), today)),
+        ("statistics(monthly, toàn bộ)", lambda db: crud_lich_su.get_financial_statistics(
+            db, "monthly", today - timedelta(days=5 * 365), today + timedelta(days=5 * 365))),
+        ("no-phai-thu(today)", lambda db: crud_no_phai_thu.get_no_phai_thus(db, time="today")),
+        ("forecast(90 ngày)", lambda db: crud_dashboard.get_forecast(db, today, days=90)),
+    ]
+
+
+def _measure(session_factory, fn) -> tuple:
+    """(đỉnh bộ nhớ MB, thời gian s) khi chạy fn với một session mới"""
+    session = session_factory()
+    try:
+        gc.collect()
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = fn(session)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+    finally:
+        session.close()
+    return peak / (1024 * 1024), elapsed
+
+
+
+@pytest.fixture(scope="module")
+def large_history(reset_database) -> int:
+    """Database với ROWS dòng lịch sử, trả về số dòng đã tạo"""
+    return _seed(reset_database(), ROWS, random.Random(7))
+
+
+@pytest.mark.parametrize("label, fn", _scenarios(), ids=[label for label, _ in _scenarios()])
+def test_peak_memory_within_budget(large_history, label, fn):
+    peak_mb, elapsed = _measure(SessionLocal, fn)
+    assert peak_mb <= BUDGETS_MB[label], (
+        f"{label}: đỉnh {peak_mb:.1f} MB / ngân sách {BUDGETS_MB[label]} MB ({elapsed:.2f}s, {large_history} dòng)"
+    )
@@ -0,0 +1,220 @@
+"""
+Query plan của các đường CRUD chính
+
+Chạy các hàm CRUD trên một database đã có dữ liệu, ghi lại mọi câu SQL chúng
+phát ra, rồi chạy EXPLAIN QUERY PLAN cho từng câu. Một câu đọc bảng lớn
+(lich_su_tra_lai) bằng cách quét toàn bộ bảng thay vì dùng chỉ mục là lỗi,
+trừ các câu trong ALLOWED_SCANS.
+
+    uv run pytest tests/test_query_plans.py
+"""
+import random
+import re
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app.core.database import SessionLocal, engine
+
+# Số hợp đồng tạo trước
+CONTRACTS = 500
+
+# Bảng mà mọi truy vấn phải đi qua chỉ mục (bảng tăng theo số kỳ thanh toán)
+GUARDED_TABLES = ("lich_su_tra_lai",)
+
+# Câu SQL được phép quét toàn bảng: (nhãn hàm CRUD, regex trên câu SQL, lý do).
+# Chỉ thêm khi việc quét là cố ý (vd. báo cáo trên toàn bộ lịch sử).
+ALLOWED_SCANS = [
+    ("verify_ledger", r"FROM lich_su_tra_lai LEFT OUTER JOIN", "đối chiếu toàn bộ sổ thu tiền với mọi kỳ"),
+]
+
+_SCAN = re.compile(r"^SCAN (\w+)\b")
+
+
+def _plan_scans(connection, statement: str, parameters) -> list:
+    """
+    Các bảng được bảo vệ bị quét toàn bộ trong plan của câu SQL
+
+    "SCAN t USING INDEX i" vẫn đọc mọi dòng (theo thứ tự chỉ mục) nên cũng
+    bị tính là quét; chỉ SEARCH mới là tra cứu theo chỉ mục.
+    """
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    details = [row[-1] for row in rows]
+    scanned = []
+    for detail in details:
+        match = _SCAN.match(detail.strip())
+        if match and match.group(1) in GUARDED_TABLES:
+            scanned.append(match.group(1))
+    return scanned, details
+
+
+def _is_allowed(label: str, statement: str) -> bool:
+    flat = " ".join(statement.split())
+    return any(label == allowed_label and re.search(pattern, flat) for allowed_label, pattern, _ in ALLOWED_SCANS)
+
+
+def _seed(session, contracts: int, rng: random.Random) -> list:
+    """Hợp đồng + lịch sử: nhiều kỳ đã qua, một số kỳ đến hạn hôm nay"""
+    from app.core.enums import TrangThaiThanhToan, TrangThaiNgayThanhToan
+    from app.models import TinChap, TraGop, LichSuTraLai, KhachHang
+
+    today = date.today()
+    for i in range(1, contracts + 1):
+        is_tc = i % 2 == 1
+        ma_hd = f"{'TC' if is_tc else 'TG'}{i:04d}"
+        # Mỗi khách hàng có một hợp đồng Tín chấp và một hợp đồng Trả góp
+        ma_kh = f"KH{(i + 1) // 2:04d}"
+        if is_tc:
+            session.add(KhachHang(MaKH=ma_kh, HoTen=f"Khach hang {i}", TenKhongDau=f"khach hang {i}"))
+        ky_dong = rng.choice([7, 10, 15, 30])
+        so_ky = rng.randint(4, 24)
+        ngay_vay = today - timedelta(days=ky_dong * so_ky)
+        common = dict(
+            MaHD=ma_hd, MaKH=ma_kh, HoTen=f"Khach hang {i}", NgayVay=ngay_vay, SoTienVay=10_000_000,
+            KyDong=ky_dong, LaiSuat=100_000, TrangThai=TrangThaiThanhToan.CHUA_THANH_TOAN.value,
+        )
+        session.add(TinChap(**common) if is_tc else TraGop(SoLanTra=so_ky, **common))
+        for ky in range(1, so_ky + 1):
+            ngay = ngay_vay + timedelta(days=ky_dong * ky)
+            paid = ngay < today and rng.random() < 0.8
+            session.add(LichSuTraLai(
+                MaHD=ma_hd, Ngay=ngay, SoTien=100_000, NoiDung=f"Kỳ {ky}",
+                TrangThaiThanhToan=(TrangThaiThanhToan.DONG_DU if paid else TrangThaiThanhToan.CHUA_THANH_TOAN).value,
+                TrangThaiNgayThanhToan=(
+                    TrangThaiNgayThanhToan.DEN_HAN if ngay == today else
+                    TrangThaiNgayThanhToan.QUA_HAN if ngay < today else
+                    TrangThaiNgayThanhToan.CHUA_DEN_HAN
+                ).value,
+                TienDaTra=100_000 if paid else 0,
+            ))
+    session.commit()
+    return [row[0] for row in session.query(LichSuTraLai.Stt).filter(LichSuTraLai.Ngay == today).all()]
+
+
+def _scenarios(due_stts: list):
+    """(nhãn, hàm nhận session) cho từng đường CRUD cần kiểm tra"""
+    from app.crud import dashboard as crud_dashboard
+    from app.crud import idempotency as crud_idempotency
+    from app.crud import khach_hang as crud_khach_hang
+    from app.crud import lich_su as crud_lich_su
+    from app.crud import lich_su_tra_lai as crud_lich_su_tra_lai
+    from app.crud import no_phai_thu as crud_no_phai_thu
+    from app.crud import payment_ledger as crud_payment_ledger
+    from app.crud import schedule_job as crud_schedule_job
+    from app.crud import tin_chap as crud_tin_chap
+    from app.crud import tra_gop as crud_tra_gop
+    from app.schemas.lich_su_tra_lai import LichSuTraLaiPayItem
+
+    today = date.today()
+    return [
+        ("get_tin_chaps", lambda db: crud_tin_chap.get_tin_chaps(db)),
+        ("get_tin_chaps(status)", lambda db: crud_tin_chap.get_tin_chaps(db, status="Chưa thanh toán")),
+        ("get_tin_chaps(search)", lambda db: crud_tin_chap.get_tin_chaps(db, search="khach 12")),
+        ("get_tin_chaps(today_only)", lambda db: crud_tin_chap.get_tin_chaps(db, today_only=True)),
+        ("get_tin_chaps(summary)", lambda db: crud_tin_chap.get_tin_chaps(db, include_history="summary")),
+        ("get_tin_chaps(last_n)", lambda db: crud_tin_chap.get_tin_chaps(db, include_history="last_n", history_n=3)),
+        ("get_tra_gops", lambda db: crud_tra_gop.get_tra_gops(db)),
+        ("get_tin_chap_with_history", lambda db: crud_tin_chap.get_tin_chap_with_history(db, "TC0001")),
+        ("get_khach_hangs(search)", lambda db: crud_khach_hang.get_khach_hangs(db, search="Khách hàng 1")),
+        ("get_khach_hang_overview", lambda db: crud_khach_hang.get_khach_hang_overview(db, "KH0001")),
+        ("get_no_phai_thus(today)", lambda db: crud_no_phai_thu.get_no_phai_thus(db, time="today")),
+        ("get_dashboard", lambda db: crud_dashboard.get_dashboard(db)),
+        ("get_dashboard(this_month)", lambda db: crud_dashboard.get_dashboard(db, time_period="this_month")),
+        ("get_forecast", lambda db: crud_dashboard.get_forecast(db, today, days=90, group_by="week")),
+        ("get_lich_su", lambda db: crud_lich_su.get_lich_su(db, tu_ngay=today - timedelta(days=30), den_ngay=today)),
+        ("get_financial_statistics", lambda db: crud_lich_su.get_financial_statistics(
+            db, "daily", today - timedelta(days=30), today)),
+        ("get_aging_report", lambda db: crud_lich_su.get_aging_report(db, today)),
+        ("get_aging_report(drill-down)", lambda db: crud_lich_su.get_aging_report(
+            db, today, bucket="31-60", loai_hop_dong="tin_chap", page=2, page_size=10)),
+        ("pay_lich_su", lambda db: crud_lich_su_tra_lai.pay_lich_su(db, due_stts[0], 1_000)),
+        ("pay_lich_su_batch", lambda db: crud_lich_su_tra_lai.pay_lich_su_batch(
+            db, [LichSuTraLaiPayItem(stt=stt, so_tien=1_000) for stt in due_stts[1:4]])),
+        ("tat_toan_hop_dong", lambda db: crud_lich_su_tra_lai.tat_toan_hop_dong(db, "TC0003")),
+        ("run_idempotent", lambda db: crud_idempotency.run_idempotent(
+            db, "plan-check", "pay-full:plan-check", crud_lich_su_tra_lai.tat_toan_hop_dong, {"ma_hd": "TC0005"})),
+        ("get_collections", lambda db: crud_payment_ledger.get_collections(db, today - timedelta(days=30), today)),
+        ("get_collections(ma_hd)", lambda db: crud_payment_ledger.get_collections(
+            db, today - timedelta(days=30), today, ma_hd="TC0001")),
+        ("verify_ledger(ma_hd)", lambda db: crud_payment_ledger.verify_ledger(db, ma_hd="TC0001")),
+        ("verify_ledger", lambda db: crud_payment_ledger.verify_ledger(db)),
+        ("enqueue_schedule_job", lambda db: (crud_schedule_job.enqueue_schedule_job(db, "TG0002"), db.commit())),
+        ("get_pending_schedule_jobs", lambda db: crud_schedule_job.get_pending_schedule_jobs(db, 20)),
+        ("run_schedule_job", lambda db: crud_schedule_job.run_schedule_job(db, "TG0002")),
+        ("transition_payment_statuses", lambda db: crud_lich_su_tra_lai.transition_payment_statuses(db, today)),
+        ("auto_create_lich_su", lambda db: crud_lich_su_tra_lai.auto_create_lich_su(db)),
+        ("auto_create_lich_su(catch-up)", lambda db: crud_lich_su_tra_lai.auto_create_lich_su(
+            db, from_date=today + timedelta(days=1), to_date=today + timedelta(days=30))),
+    ]
+
+
+
+SCENARIO_LABELS = [label for label, _ in _scenarios([0])]
+
+
+@pytest.fixture(scope="module")
+def captured(reset_database) -> dict:
+    """
+    Chạy mọi đường CRUD theo thứ tự trên database vừa tạo dữ liệu
+
+    Returns:
+        {nhãn: ([(câu SQL, tham số)], lỗi hoặc None)}
+    """
+    reset_database()
+    session = SessionLocal()
+    try:
+        due_stts = _seed(session, CONTRACTS, random.Random(7))
+    finally:
+        session.close()
+
+    current = {"label": None}
+    statements = {label: [] for label in SCENARIO_LABELS}
+    errors = {}
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if current["label"] is None:
+            return
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        statements[current["label"]].append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _capture)
+    try:
+        for label, fn in _scenarios(due_stts):
+            session = SessionLocal()
+            current["label"] = label
+            try:
+                fn(session)
+            except Exception as exc:  # noqa: BLE001 - báo cáo theo từng đường
+                errors[label] = f"{type(exc).__name__}: {exc}"
+            finally:
+                current["label"] = None
+                session.close()
+    finally:
+        event.remove(engine, "before_cursor_execute", _capture)
+    return {label: (statements[label], errors.get(label)) for label in SCENARIO_LABELS}
+
+
+@pytest.mark.parametrize("label", SCENARIO_LABELS)
+def test_no_full_table_scan(captured, label):
+    statements, error = captured[label]
+    assert error is None, error
+    assert statements, "không có câu SQL nào"
+
+    failures = []
+    seen = set()
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            keyword = statement.lstrip().split(None, 1)[0].upper()
+            if keyword not in ("SELECT", "UPDATE", "DELETE", "WITH", "INSERT"):
+                continue
+            if keyword == "INSERT" and "SELECT" not in statement.upper():
+                continue
+            if statement in seen:
+                continue
+            seen.add(statement)
+            scanned, details = _plan_scans(connection, statement, parameters)
+            if scanned and not _is_allowed(label, statement):
+                failures.append(f"{' '.join(statement.split())[:300]}\n      " + "\n      ".join(details))
+    assert not failures, "quét toàn bảng:\n    " + "\n    ".join(failures)